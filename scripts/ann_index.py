@@ -0,0 +1,165 @@
+import os
+import pickle
+import time
+import numpy as np
+import scipy.sparse as sp
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+from blocked_knn import blocked_kneighbors
+
+ANN_INDEX_FILE = 'ivf_index.pkl'
+
+# Parâmetros padrão (recall x velocidade)
+DEFAULT_N_PROBE = 8         # quantas listas cada consulta visita (mais = mais recall, mais lento)
+DEFAULT_N_COMPONENTS = 64   # dimensão do espaço reduzido usado só pelo quantizador grosso
+
+
+class IVFIndex:
+    """
+    Índice aproximado estilo IVF (inverted file) para similaridade de cossenos.
+
+    Um quantizador grosso (KMeans sobre o TF-IDF reduzido por SVD) divide o catálogo
+    em n_lists listas. Cada consulta visita apenas as n_probe listas mais próximas
+    e reordena os candidatos com o cosseno exato no TF-IDF original.
+    """
+
+    def __init__(self, n_lists=None, n_probe=DEFAULT_N_PROBE, n_components=DEFAULT_N_COMPONENTS, random_state=42):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_components = n_components
+        self.random_state = random_state
+
+    def fit(self, X):
+        X = normalize(X, norm='l2', copy=True)
+        if sp.issparse(X):
+            X = X.tocsr()
+        n_rows = X.shape[0]
+        if self.n_lists is None:
+            self.n_lists = max(1, int(np.sqrt(n_rows)))
+        self.n_lists = min(self.n_lists, n_rows)
+
+        n_components = min(self.n_components, X.shape[1] - 1)
+        self.svd_ = TruncatedSVD(n_components=n_components, random_state=self.random_state) if n_components > 0 else None
+        reduced = self._reduce(X, fit=True)
+
+        kmeans = MiniBatchKMeans(n_clusters=self.n_lists, random_state=self.random_state,
+                                 batch_size=4096, n_init=3)
+        labels = kmeans.fit_predict(reduced)
+        self.centroids_ = normalize(kmeans.cluster_centers_)
+
+        # Listas invertidas em formato CSR: membros ordenados por lista + offsets
+        self.list_members_ = np.argsort(labels, kind='stable').astype(np.int64)
+        self.list_offsets_ = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=self.n_lists))])
+        self._data = X
+        return self
+
+    def _reduce(self, X, fit=False):
+        if self.svd_ is None:
+            reduced = X.toarray() if sp.issparse(X) else np.asarray(X)
+        else:
+            reduced = self.svd_.fit_transform(X) if fit else self.svd_.transform(X)
+        return normalize(reduced)
+
+    def attach(self, X):
+        """Reconecta a matriz de dados (não é salva junto com o índice)."""
+        X = normalize(X, norm='l2', copy=True)
+        self._data = X.tocsr() if sp.issparse(X) else X
+        return self
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_data', None)
+        return state
+
+    def search(self, Q, k, n_probe=None, query_ids=None):
+        """
+        Retorna (distances, indices) dos k vizinhos aproximados de cada linha de Q.
+        Com query_ids (consulta = linha do próprio catálogo), o próprio jogo vem
+        sempre na posição 0 com distância 0, como no kNN exato.
+        """
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        Q = normalize(Q, norm='l2', copy=True)
+        X = self._data
+        n_queries = Q.shape[0]
+
+        # Listas mais próximas de cada consulta
+        centroid_scores = self._reduce(Q) @ self.centroids_.T
+        if n_probe < self.n_lists:
+            probes = np.argpartition(-centroid_scores, n_probe - 1, axis=1)[:, :n_probe]
+        else:
+            probes = np.tile(np.arange(self.n_lists), (n_queries, 1))
+
+        best_scores = np.full((n_queries, k), -np.inf)
+        best_indices = np.full((n_queries, k), -1, dtype=np.int64)
+        if query_ids is not None:
+            query_ids = np.asarray(query_ids)
+            best_scores[:, 0] = np.inf
+            best_indices[:, 0] = query_ids
+
+        # Agrupa as consultas por lista: um produto esparso por lista visitada
+        query_of = np.repeat(np.arange(n_queries), n_probe)
+        list_of = probes.ravel()
+        order = np.argsort(list_of, kind='stable')
+        query_of, list_of = query_of[order], list_of[order]
+        splits = np.flatnonzero(np.diff(list_of)) + 1
+
+        starts = np.concatenate([[0], splits])
+        for start, queries in zip(starts, np.split(query_of, splits)):
+            lst = list_of[start]
+            members = self.list_members_[self.list_offsets_[lst]:self.list_offsets_[lst + 1]]
+            if len(members) == 0:
+                continue
+
+            scores = Q[queries] @ X[members].T
+            scores = scores.toarray() if sp.issparse(scores) else np.asarray(scores)
+            if query_ids is not None:
+                scores[query_ids[queries][:, None] == members[None, :]] = -np.inf
+
+            # Junta os k melhores atuais com os novos candidatos (seleção parcial)
+            cand_scores = np.hstack([best_scores[queries], scores])
+            cand_indices = np.hstack([best_indices[queries], np.broadcast_to(members, scores.shape)])
+            top = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+            rows = np.arange(len(queries))[:, None]
+            best_scores[queries] = cand_scores[rows, top]
+            best_indices[queries] = cand_indices[rows, top]
+
+        rows = np.arange(n_queries)[:, None]
+        order = np.lexsort((best_indices, -best_scores), axis=-1)
+        best_scores = best_scores[rows, order]
+        best_indices = best_indices[rows, order]
+
+        distances = np.clip(1 - best_scores, 0, 2)
+        distances[best_indices < 0] = np.inf
+        return distances, best_indices
+
+    def kneighbors_all(self, k, n_probe=None):
+        """kNN aproximado de todo o catálogo contra ele mesmo (substitui o all-pairs exato)."""
+        X = self._data
+        distances, indices = self.search(X, k, n_probe=n_probe, query_ids=np.arange(X.shape[0]))
+
+        # Linhas cujas listas visitadas não tinham k candidatos: completa com a busca exata
+        incomplete = np.flatnonzero((indices < 0).any(axis=1))
+        if len(incomplete) > 0:
+            distances[incomplete], indices[incomplete] = blocked_kneighbors(
+                X[incomplete], n_neighbors=k, X_index=X, query_ids=incomplete)
+        return distances, indices
+
+
+def save_ann_index(index, models_dir='models'):
+    if not os.path.exists(models_dir):
+        os.makedirs(models_dir)
+    with open(os.path.join(models_dir, ANN_INDEX_FILE), 'wb') as f:
+        pickle.dump(index, f)
+
+
+def load_ann_index(tfidf_matrix, models_dir='models'):
+    with open(os.path.join(models_dir, ANN_INDEX_FILE), 'rb') as f:
+        index = pickle.load(f)
+    return index.attach(tfidf_matrix)
+
+
+def build_ann_index(X, n_lists=None, n_probe=DEFAULT_N_PROBE, n_components=DEFAULT_N_COMPONENTS):
+    start = time.perf_counter()
+    index = IVFIndex(n_lists=n_lists, n_probe=n_probe, n_components=n_components).fit(X)
+    return index, time.perf_counter() - start
@@ -1,47 +1,16 @@
-import os
 import pandas as pd
-import pickle
 import streamlit as st
 import time
-from model_training import train_model
-from db_setup import init_db
-from etl_steam import run_etl
-
-# Adicionando explicabilidade
-def normalize_tag(tag_string: str) -> str:
-    """Transforma a tag string de tags em um set limpo."""
-
-    if pd.isna(tag_string) or tag_string is None or str(tag_string).strip() == "":
-        return set()
-
-    s = str(tag_string)
-
-    # Remove chaves se vier no formato de dicionário
-    s = s.replace("{", "").replace("}", "")
-
-    tags = set()
-    for item in s.split(","):
-        item = item.strip()
-        if not item:
-            continue
-        if ":" in item:
-            item = item.split(":")[0].strip()
-        tag = item.lower()
-        if tag and tag != "nan":
-            tags.add(tag)
-    return tags
-
-def top_common_tags(tags_a: str, tags_b: str, k = 5) -> list[str]:
-    a = normalize_tag(tags_a)
-    b = normalize_tag(tags_b)
-    common = sorted(a.intersection(b))
-    return common[:k]
-
-def safe_first_genre(genres: str) -> str | None:
-    if pd.isna(genres) or genres is None or str(genres).strip() == "":
-        return None
-    g = str(genres).split(",")[0].strip()
-    return g if g else None
+# Só o caminho de serving é importado aqui: ETL/treino (scikit-learn, SQLAlchemy) só no botão de instalação
+from filters import os_mask, OS_ALL
+from recommender import RecommendationEngine, engine_artifacts_exist, safe_first_genre
+from model_bundle import HotReloader
+from result_cache import ResultCache
+from library import parse_appids
+from perf import metrics
+
+# Valores iniciais da barra lateral (também usados para pré-aquecer o cache)
+DEFAULT_APP_FILTERS = {'max_age': 18, 'min_score': 50, 'os_bits': OS_ALL}
 
 
 st.set_page_config(
@@ -116,25 +85,39 @@ def load_data():
     path_models = 'models'
 
     # Verifica se existem
-    required_files = ['neighbors_indices.pkl', 'neighbors_distances.pkl', 'dataframe.pkl', 'indices_map.pkl']
-    if not all([os.path.exists(os.path.join(path_models, f)) for f in required_files]):
-        return None, None, None, None
+    if not engine_artifacts_exist(path_models):
+        return None
 
     try:
-        with open(os.path.join(path_models, 'neighbors_indices.pkl'), 'rb') as f:
-            knn_indices = pickle.load(f)
-        with open(os.path.join(path_models, 'neighbors_distances.pkl'), 'rb') as f:
-            knn_distances = pickle.load(f)
-        with open(os.path.join(path_models, 'dataframe.pkl'), 'rb') as f:
-            df = pickle.load(f)
-        with open(os.path.join(path_models, 'indices_map.pkl'), 'rb') as f:
-            indices_map = pickle.load(f)
-        return knn_indices, knn_distances, df, indices_map
+        # Vizinhos via mmap, filtros em arrays compactos, tags como IDs inteiros;
+        # a matriz TF-IDF só é carregada quando os filtros esgotam os 50 vizinhos pré-computados.
+        # O HotReloader troca o engine em segundo plano quando um bundle novo é publicado
+        reloader = HotReloader(RecommendationEngine.from_models_dir, path_models).start()
+        engine = reloader.engine
+        print(f"⚡ Modelo {engine.version} carregado em {sum(engine.load_times.values()) * 1000:.0f} ms "
+              f"({', '.join(f'{name}: {t * 1000:.0f} ms' for name, t in engine.load_times.items())})")
+        return reloader
     except Exception:
-        return None, None, None, None
+        return None
+
+# Latência por fase de cada recomendação em metrics/requests.jsonl (rotacionado em MAX_LOG_MB)
+# + snapshot metrics/metrics.prom a cada PROMETHEUS_INTERVAL_S, numa thread só para o processo inteiro
+metrics.configure()
+metrics.start_prometheus_writer()
+
+@st.cache_resource
+def get_result_cache():
+    # Um cache por processo: todas as sessões (e todos os reruns) compartilham as listas já calculadas
+    return ResultCache()
 
-# Tenta carregar
-knn_indices, knn_distances, df_games, indices_map = load_data()
+# Tenta carregar (a cada execução do script pega o engine mais recente do reloader)
+reloader = load_data()
+engine = reloader.engine if reloader is not None else None
+df_games = engine.df_games if engine is not None else None
+result_cache = get_result_cache()
+if engine is not None:
+    # Uma vez por modelo, em segundo plano: os jogos mais populares já saem do cache no primeiro clique
+    result_cache.warm_in_background(engine, DEFAULT_APP_FILTERS)
 
 
 with st.sidebar:
@@ -149,7 +132,7 @@ with st.sidebar:
         "Classificação etária do jogo:",
         min_value=0,
         max_value=18,
-        value=18,
+        value=DEFAULT_APP_FILTERS['max_age'],
         step=1,
         help="Exclui jogos com classificação etária acima deste valor."
     )
@@ -161,7 +144,7 @@ with st.sidebar:
         "% de Avaliações Positivas:",
         min_value=0,
         max_value=100,
-        value=50,
+        value=DEFAULT_APP_FILTERS['min_score'],
         step=1,
         help="Mostra apenas jogos com aprovação da comunidade acima de X%"
     )
@@ -173,8 +156,15 @@ with st.sidebar:
     os_mac = st.checkbox("Mac", value=True)
     os_linux = st.checkbox("Linux", value=True)
 
+    # Contadores do cache de recomendações (compartilhado entre as sessões)
+    cache_stats = result_cache.stats()
+    st.caption(f"⚡ Cache: {cache_stats['entries']} listas | {cache_stats['hits']} acertos, "
+               f"{cache_stats['misses']} faltas, {cache_stats['evictions']} descartes")
+
     st.info("💡 **Dica:** Digite o nome do seu jogo favorito na caixa de busca para encontrar títulos similares baseados em gênero, tags e desenvolvedores.")
 
+current_filters = {'max_age': age_filter, 'min_score': score_filter, 'os_bits': os_mask(os_windows, os_mac, os_linux)}
+
 if df_games is None:
     st.warning("⚠️ Os modelos de IA ainda não foram gerados.")
     st.info("Como é a primeira execução, precisamos processar o banco de dados. Isso pode levar cerca de 1 minuto.")
@@ -184,6 +174,11 @@ if df_games is None:
         status_text = st.empty()
 
         try:
+            # Imports pesados só quando a instalação realmente vai rodar
+            from db_setup import init_db
+            from etl_steam import run_etl
+            from model_training import train_model
+
             # PASSO 1: Criar o Banco de Dados (Tabelas vazias)
             status_text.text("1/3: Criando Banco de Dados SQL...")
             init_db()
@@ -221,84 +216,32 @@ st.title("Game Matcher Steam")
 st.subheader("Decida sua próxima gameplay baseado no que acabou de jogar.")
 
 # Selecionando o jogo
-game_list = sorted(df_games['nm_game'].unique())
-game_option = st.selectbox(
+# Typeahead: índice de títulos pré-construído (prefixo + busca aproximada), só os melhores vão para a tela
+game_query = st.text_input(
     "Escolha um jogo que você curtiu:",
-    game_list,
-    index=None,
     placeholder="Digite para pesquisar (ex: Elden Ring)..."
 )
 
+game_option = None
+if game_query:
+    matches = engine.search_titles(game_query, limit=10)
+    if matches:
+        game_option = st.selectbox("Jogos encontrados:", matches, index=0)
+    else:
+        st.warning("😔 Nenhum jogo encontrado com esse nome.")
+
 if game_option:
     if st.button("🔍 Encontrar Recomendações"):
         try:
-            # ID do jogo escolhido
-            idx = indices_map[game_option]
-
-            # Pega os 50 vizinhos
-            neighbor_indices = knn_indices[idx][1:]
-            neighbor_distances = knn_distances[idx][1:]
-
-            recommended_games = []
-
-            # Guardando informações do jogo selecionado
-            selected_idx = indices_map[game_option]
-            selected_game = df_games.iloc[selected_idx]
-            selected_tags = selected_game.get("ds_tags", "")
-            selected_genres = selected_game.get("ds_genres", "")
-            selected_dev = selected_game.get("ds_developer", "")
-            selected_pub = selected_game.get("ds_publisher", "")
-
-            for i, game_idx in enumerate(neighbor_indices):
-                game_data = df_games.iloc[game_idx]
-
-                # Tentando entender quais foram os matchs para a seleção dos jogos
-                common_tags = top_common_tags(selected_tags, game_data.get("ds_tags", ""), k=5)
-
-                rec_genre = game_data.get("ds_genres", "")
-                genre_match = (safe_first_genre(selected_genres) is not None and
-                               safe_first_genre(selected_genres) == safe_first_genre(rec_genre))
-
-                dev_match = False
-                if pd.notna(selected_dev) and pd.notna(game_data.get("ds_developer", None)):
-                    dev_match = str(selected_dev).strip().lower() == str(game_data["ds_developer"]).strip().lower()
-
-                pub_match = False
-                if pd.notna(selected_pub) and pd.notna(game_data.get("ds_publisher", None)):
-                    pub_match = str(selected_pub).strip().lower() == str(game_data["ds_publisher"]).strip().lower()
-
-                similarity_score = 1 - neighbor_distances[i]
-
-                # Filtragem
-                # 1. Idade
-                game_age = game_data['vl_required_age'] if pd.notna(game_data['vl_required_age']) else 0
-                if game_age > age_filter:
-                    continue
-
-                # 2. Aprovação
-                game_score = game_data['vl_positive_ratio'] if pd.notna(game_data['vl_positive_ratio']) else 0
-                if game_score < score_filter:
-                    continue
-
-                # 3. Sistema Operacional
-                compatible = False
-                if os_windows and game_data['bl_windows']: compatible = True
-                if os_linux and game_data['bl_linux']: compatible = True
-                if os_mac and game_data['bl_mac']: compatible = True
-
-                if not compatible:
-                    continue
-
-                # Se passou em tudo, adiciona na lista final
-                game_data['match_score'] = similarity_score
-                game_data["explain_common_tags"] = common_tags
-                game_data["explain_genre_match"] = genre_match
-                game_data["explain_dev_match"] = dev_match
-                game_data["explain_pub_match"] = pub_match
-                recommended_games.append(game_data)
-
-                if len(recommended_games) >= 5:
-                    break
+            # Vizinhos filtrados + motivos (mesma lógica do benchmark e da avaliação)
+            # Listas já calculadas (por qualquer sessão) saem do cache LRU
+            recommendations = result_cache.recommend(
+                engine,
+                game_option,
+                current_filters,
+                k=5
+            )
+            recommended_games = [game_data for _, game_data in recommendations.iterrows()]
 
             if len(recommended_games) == 0:
                 st.warning("😔 Nenhum jogo encontrado com esses filtros. Tente diminuir a nota mínima ou aumentar a idade.")
@@ -378,4 +321,30 @@ if game_option:
                             st.caption("✅ Livre")
 
         except Exception as e:
-            st.error(f"Ops! Ocorreu um erro ao processar: {e}")
\ No newline at end of file
+            st.error(f"Ops! Ocorreu um erro ao processar: {e}")
+
+# Biblioteca inteira: perfil com todos os jogos do usuário, um único produto no catálogo
+st.divider()
+with st.expander("📚 Recomendar pela minha biblioteca (lista de appids)"):
+    uploaded = st.file_uploader("Arquivo com um appid por linha (opcional: appid,horas jogadas)", type=['txt', 'csv'])
+    typed_appids = st.text_area("...ou cole os appids aqui:", placeholder="1245620\n730,120")
+    if st.button("📚 Recomendar pela biblioteca"):
+        try:
+            appids, weights = parse_appids(uploaded.getvalue().decode('utf-8') if uploaded is not None else typed_appids)
+            if not appids:
+                st.warning("Informe ao menos um appid.")
+            else:
+                library_recs = engine.recommend_library(appids, current_filters, k=10, weights=weights)
+                if library_recs.empty:
+                    st.warning("😔 Os filtros esgotaram as opções para essa biblioteca.")
+                else:
+                    st.dataframe(
+                        library_recs[['nm_game', 'match_score', 'explain_seed', 'explain_common_tags']].rename(columns={
+                            'nm_game': 'Jogo', 'match_score': 'Match', 'explain_seed': 'Parecido com',
+                            'explain_common_tags': 'Tags em comum'}),
+                        hide_index=True, use_container_width=True
+                    )
+        except KeyError:
+            st.warning("😔 Nenhum jogo da biblioteca foi encontrado no catálogo.")
+        except ValueError:
+            st.error("Formato inválido: use um appid por linha (opcional: appid,horas).")
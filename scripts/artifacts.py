@@ -0,0 +1,313 @@
+import os
+import pickle
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from filters import build_filter_columns
+from tags import build_tag_matrix
+from title_search import TitleIndex
+
+MODELS_DIR = 'models'
+
+# Formato binário (.npy) que pode ser mapeado em memória (mmap).
+# Vários processos (réplicas do Streamlit) compartilham o mesmo page cache do SO.
+INDICES_FILE = 'neighbors_indices.npy'
+SIMILARITIES_FILE = 'neighbors_similarities.npy'
+
+# Colunas de filtro (struct-of-arrays), uma por arquivo para permitir mmap
+FILTER_FILES = {
+    'age': 'filter_age.npy',
+    'positive_ratio': 'filter_positive_ratio.npy',
+    'os': 'filter_os.npy',
+}
+
+# Metadados dos jogos e mapa nome -> linha
+DATAFRAME_FILE = 'dataframe.pkl'
+# Colunas que só servem para a vetorização: nunca entram no catálogo salvo (mesmo esquema em todos os modos de treino)
+TEXT_ONLY_COLUMNS = ['ds_short_description', 'soup']
+INDICES_MAP_FILE = 'indices_map.pkl'
+
+# Vetorizador TF-IDF treinado e a matriz TF-IDF (busca sob demanda)
+VECTORIZER_FILE = 'tfidf_vectorizer.pkl'
+TFIDF_MATRIX_FILE = 'tfidf_matrix.npz'
+
+# Vocabulário de tags + matriz CSR jogos x tags (explicações e Jaccard sem parsing de strings)
+TAG_VOCAB_FILE = 'tag_vocab.npy'
+TAG_MATRIX_FILE = 'tag_matrix.npz'
+
+# Índice de títulos do typeahead (prefixo + trigramas), arrays num único .npz
+TITLE_INDEX_FILE = 'title_index.npz'
+
+# Modo denso opcional: embedding (jogos x rank, float32, L2) + projeção TF-IDF -> embedding (rank x termos)
+EMBEDDING_FILE = 'embedding.npy'
+PROJECTION_FILE = 'embedding_projection.npy'
+
+# Vizinhos por partição de filtro (SO x idade x nota): specs (P x 4) + índices/similaridades (P x jogos x k)
+PARTITION_FILES = {
+    'specs': 'partition_specs.npy',
+    'indices': 'partition_indices.npy',
+    'similarities': 'partition_similarities.npy',
+}
+
+# Formato antigo (pickle), mantido só para comparação
+LEGACY_INDICES_FILE = 'neighbors_indices.pkl'
+LEGACY_DISTANCES_FILE = 'neighbors_distances.pkl'
+
+INDEX_DTYPE = np.int32
+SIMILARITY_DTYPE = np.float16
+
+
+def save_neighbors(indices, distances, models_dir=MODELS_DIR, sim_dtype=SIMILARITY_DTYPE):
+    """Salva a matriz de vizinhos em .npy compacto (int32 + similaridade float16/float32)."""
+    if not os.path.exists(models_dir):
+        os.makedirs(models_dir)
+
+    indices = np.ascontiguousarray(indices, dtype=INDEX_DTYPE)
+    # Guardamos a similaridade (1 - distância), que é o que o app exibe
+    similarities = np.ascontiguousarray(1 - np.asarray(distances), dtype=sim_dtype)
+
+    np.save(os.path.join(models_dir, INDICES_FILE), indices)
+    np.save(os.path.join(models_dir, SIMILARITIES_FILE), similarities)
+
+
+def load_neighbors(models_dir=MODELS_DIR, mmap=True):
+    """
+    Carrega (índices, similaridades). Com mmap=True a leitura é lazy e zero-copy:
+    nada é lido do disco até que uma linha seja acessada.
+    """
+    mmap_mode = 'r' if mmap else None
+    indices = np.load(os.path.join(models_dir, INDICES_FILE), mmap_mode=mmap_mode)
+    similarities = np.load(os.path.join(models_dir, SIMILARITIES_FILE), mmap_mode=mmap_mode)
+    return indices, similarities
+
+
+def neighbors_exist(models_dir=MODELS_DIR):
+    return all(os.path.exists(os.path.join(models_dir, f)) for f in [INDICES_FILE, SIMILARITIES_FILE])
+
+
+def save_filter_columns(df, models_dir=MODELS_DIR):
+    """Salva idade, % de aprovação e bitmask de SO alinhados às linhas do DataFrame."""
+    if not os.path.exists(models_dir):
+        os.makedirs(models_dir)
+
+    columns = build_filter_columns(df)
+    for name, filename in FILTER_FILES.items():
+        np.save(os.path.join(models_dir, filename), columns[name])
+
+
+def load_filter_columns(models_dir=MODELS_DIR, mmap=True):
+    mmap_mode = 'r' if mmap else None
+    return {
+        name: np.load(os.path.join(models_dir, filename), mmap_mode=mmap_mode)
+        for name, filename in FILTER_FILES.items()
+    }
+
+
+def filter_columns_exist(models_dir=MODELS_DIR):
+    return all(os.path.exists(os.path.join(models_dir, f)) for f in FILTER_FILES.values())
+
+
+def save_catalog(df, models_dir=MODELS_DIR):
+    """Salva o DataFrame de treino (O Mapa), sem as colunas de texto livre, e o mapa de nomes -> linha."""
+    if not os.path.exists(models_dir):
+        os.makedirs(models_dir)
+
+    df = df.drop(columns=TEXT_ONLY_COLUMNS, errors='ignore')
+
+    with open(os.path.join(models_dir, DATAFRAME_FILE), 'wb') as f:
+        pickle.dump(df, f)
+    indices_map = pd.Series(df.index, index=df['nm_game'])
+    with open(os.path.join(models_dir, INDICES_MAP_FILE), 'wb') as f:
+        pickle.dump(indices_map, f)
+
+
+def load_catalog(models_dir=MODELS_DIR):
+    with open(os.path.join(models_dir, DATAFRAME_FILE), 'rb') as f:
+        df = pickle.load(f)
+    with open(os.path.join(models_dir, INDICES_MAP_FILE), 'rb') as f:
+        indices_map = pickle.load(f)
+    return df, indices_map
+
+
+def save_tfidf(vectorizer, tfidf_matrix, models_dir=MODELS_DIR):
+    """Persiste o TfidfVectorizer e a matriz TF-IDF (CSR float32, sem compressão para carregar rápido)."""
+    if not os.path.exists(models_dir):
+        os.makedirs(models_dir)
+
+    with open(os.path.join(models_dir, VECTORIZER_FILE), 'wb') as f:
+        pickle.dump(vectorizer, f)
+    import scipy.sparse as sp
+    matrix = sp.csr_matrix(tfidf_matrix, dtype=np.float32)
+    sp.save_npz(os.path.join(models_dir, TFIDF_MATRIX_FILE), matrix, compressed=False)
+
+
+def load_tfidf_matrix(models_dir=MODELS_DIR):
+    # scipy importado só aqui e nos loaders abaixo: fora do tempo de import do app (~170 ms)
+    import scipy.sparse as sp
+    return sp.load_npz(os.path.join(models_dir, TFIDF_MATRIX_FILE)).tocsr()
+
+
+def load_vectorizer(models_dir=MODELS_DIR):
+    with open(os.path.join(models_dir, VECTORIZER_FILE), 'rb') as f:
+        return pickle.load(f)
+
+
+def tfidf_exists(models_dir=MODELS_DIR):
+    return all(os.path.exists(os.path.join(models_dir, f)) for f in [VECTORIZER_FILE, TFIDF_MATRIX_FILE])
+
+
+def save_tag_matrix(df, models_dir=MODELS_DIR):
+    """Constrói e salva o vocabulário de tags e a matriz jogos x tags a partir de ds_tags."""
+    if not os.path.exists(models_dir):
+        os.makedirs(models_dir)
+
+    import scipy.sparse as sp
+    vocab, matrix = build_tag_matrix(df['ds_tags'])
+    np.save(os.path.join(models_dir, TAG_VOCAB_FILE), vocab)
+    sp.save_npz(os.path.join(models_dir, TAG_MATRIX_FILE), matrix, compressed=False)
+    return vocab, matrix
+
+
+def load_tag_matrix(models_dir=MODELS_DIR):
+    import scipy.sparse as sp
+    vocab = np.load(os.path.join(models_dir, TAG_VOCAB_FILE))
+    matrix = sp.load_npz(os.path.join(models_dir, TAG_MATRIX_FILE)).tocsr()
+    return vocab, matrix
+
+
+def tag_matrix_exists(models_dir=MODELS_DIR):
+    return all(os.path.exists(os.path.join(models_dir, f)) for f in [TAG_VOCAB_FILE, TAG_MATRIX_FILE])
+
+
+def save_title_index(df, models_dir=MODELS_DIR):
+    """Constrói e salva o índice de busca de títulos (popularidade = vl_recommendations)."""
+    if not os.path.exists(models_dir):
+        os.makedirs(models_dir)
+
+    index = TitleIndex.build(df['nm_game'], df['vl_recommendations'])
+    np.savez(os.path.join(models_dir, TITLE_INDEX_FILE), **index.to_arrays())
+    return index
+
+
+def load_title_index(models_dir=MODELS_DIR):
+    with np.load(os.path.join(models_dir, TITLE_INDEX_FILE)) as data:
+        return TitleIndex(**{name: data[name] for name in data.files})
+
+
+def title_index_exists(models_dir=MODELS_DIR):
+    return os.path.exists(os.path.join(models_dir, TITLE_INDEX_FILE))
+
+
+def save_embedding(embedding, projection, models_dir=MODELS_DIR):
+    if not os.path.exists(models_dir):
+        os.makedirs(models_dir)
+    np.save(os.path.join(models_dir, EMBEDDING_FILE), np.ascontiguousarray(embedding, dtype=np.float32))
+    np.save(os.path.join(models_dir, PROJECTION_FILE), np.ascontiguousarray(projection, dtype=np.float32))
+
+
+def load_embedding(models_dir=MODELS_DIR, mmap=True):
+    """(embedding, projeção). Com mmap=True o embedding é lido sob demanda, como os vizinhos."""
+    mmap_mode = 'r' if mmap else None
+    embedding = np.load(os.path.join(models_dir, EMBEDDING_FILE), mmap_mode=mmap_mode)
+    projection = np.load(os.path.join(models_dir, PROJECTION_FILE), mmap_mode=mmap_mode)
+    return embedding, projection
+
+
+def embedding_exists(models_dir=MODELS_DIR):
+    return all(os.path.exists(os.path.join(models_dir, f)) for f in [EMBEDDING_FILE, PROJECTION_FILE])
+
+
+def remove_embedding(models_dir=MODELS_DIR):
+    """Apaga um embedding de um treino anterior (evita servir vizinhos e busca de modelos diferentes)."""
+    for filename in [EMBEDDING_FILE, PROJECTION_FILE]:
+        path = os.path.join(models_dir, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def save_partitions(specs, indices, similarities, models_dir=MODELS_DIR):
+    if not os.path.exists(models_dir):
+        os.makedirs(models_dir)
+    arrays = {'specs': specs, 'indices': indices, 'similarities': similarities}
+    for name, filename in PARTITION_FILES.items():
+        np.save(os.path.join(models_dir, filename), np.ascontiguousarray(arrays[name]))
+
+
+def load_partitions(models_dir=MODELS_DIR, mmap=True):
+    """(specs, índices, similaridades); índices e similaridades via mmap, como os vizinhos globais."""
+    mmap_mode = 'r' if mmap else None
+    specs = np.load(os.path.join(models_dir, PARTITION_FILES['specs']))
+    indices = np.load(os.path.join(models_dir, PARTITION_FILES['indices']), mmap_mode=mmap_mode)
+    similarities = np.load(os.path.join(models_dir, PARTITION_FILES['similarities']), mmap_mode=mmap_mode)
+    return specs, indices, similarities
+
+
+def partitions_exist(models_dir=MODELS_DIR):
+    return all(os.path.exists(os.path.join(models_dir, f)) for f in PARTITION_FILES.values())
+
+
+def remove_partitions(models_dir=MODELS_DIR):
+    for filename in PARTITION_FILES.values():
+        path = os.path.join(models_dir, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _timed(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def compare_formats(models_dir=MODELS_DIR):
+    """
+    Compara tamanho e tempo de carga do formato antigo (pickle int64/float64)
+    com o novo (.npy int32/float16 via mmap).
+    """
+    indices, similarities = load_neighbors(models_dir, mmap=False)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Recria os pickles antigos a partir dos arrays atuais
+        legacy_idx_path = os.path.join(tmp, LEGACY_INDICES_FILE)
+        legacy_dist_path = os.path.join(tmp, LEGACY_DISTANCES_FILE)
+        with open(legacy_idx_path, 'wb') as f:
+            pickle.dump(indices.astype(np.int64), f)
+        with open(legacy_dist_path, 'wb') as f:
+            pickle.dump(1 - similarities.astype(np.float64), f)
+
+        def load_legacy():
+            with open(legacy_idx_path, 'rb') as f:
+                pickle.load(f)
+            with open(legacy_dist_path, 'rb') as f:
+                pickle.load(f)
+
+        def load_mmap():
+            idx, sim = load_neighbors(models_dir, mmap=True)
+            # Toca uma linha, como o app faz numa recomendação
+            _ = idx[0], sim[0]
+
+        legacy_size = os.path.getsize(legacy_idx_path) + os.path.getsize(legacy_dist_path)
+        new_size = (os.path.getsize(os.path.join(models_dir, INDICES_FILE)) +
+                    os.path.getsize(os.path.join(models_dir, SIMILARITIES_FILE)))
+        legacy_time = _timed(load_legacy)
+        new_time = _timed(load_mmap)
+
+    print(f"Matriz de vizinhos: {indices.shape[0]} jogos x {indices.shape[1]} vizinhos")
+    print(f"{'FORMATO':<28} | {'TAMANHO (MB)':>12} | {'CARGA (ms)':>10}")
+    print("-" * 58)
+    print(f"{'pickle (int64/float64)':<28} | {legacy_size / 1024 ** 2:>12.2f} | {legacy_time * 1000:>10.2f}")
+    print(f"{'npy mmap (int32/' + np.dtype(similarities.dtype).name + ')':<28} | "
+          f"{new_size / 1024 ** 2:>12.2f} | {new_time * 1000:>10.2f}")
+
+    return {
+        'legacy_bytes': legacy_size, 'new_bytes': new_size,
+        'legacy_load_s': legacy_time, 'new_load_s': new_time,
+    }
+
+
+if __name__ == "__main__":
+    compare_formats()
@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+from datetime import datetime
+import numpy as np
+from artifacts import MODELS_DIR
+from filters import OS_WINDOWS, OS_MAC, OS_LINUX
+from recommender import RecommendationEngine
+
+BASELINE_FILE = 'benchmarks/serving_baseline.json'
+
+# Combinações sorteadas a cada consulta (mesmos limites dos sliders do app)
+AGE_CHOICES = [0, 12, 16, 18]
+SCORE_CHOICES = [0, 50, 70, 90]
+OS_CHOICES = [OS_WINDOWS | OS_MAC | OS_LINUX, OS_WINDOWS, OS_MAC, OS_LINUX,
+              OS_WINDOWS | OS_MAC, OS_WINDOWS | OS_LINUX, OS_MAC | OS_LINUX]
+
+# Quanto cada métrica pode piorar em relação ao baseline antes de falhar
+DEFAULT_TOLERANCE = 0.25
+
+
+def sample_queries(n_games, n_queries, seed=42):
+    """Jogos e filtros sorteados: (linha do jogo, filtros no formato do engine)."""
+    rng = np.random.default_rng(seed)
+    games = rng.integers(0, n_games, size=n_queries)
+    ages = rng.choice(AGE_CHOICES, size=n_queries)
+    scores = rng.choice(SCORE_CHOICES, size=n_queries)
+    os_bits = rng.choice(OS_CHOICES, size=n_queries)
+    return [(idx, {'max_age': age, 'min_score': score, 'os_bits': bits})
+            for idx, age, score, bits in zip(games.tolist(), ages.tolist(), scores.tolist(), os_bits.tolist())]
+
+
+def run_serving_benchmark(n_queries=2000, k=5, seed=42, warmup=50, repeat=3, models_dir=MODELS_DIR):
+    """
+    Mede o caminho de recomendação do app (engine.recommend: vizinhos filtrados + busca sob demanda + motivos).
+    A latência é medida sem tracemalloc; as alocações são medidas numa segunda passada.
+    """
+    # Mesmo engine do app (a matriz TF-IDF é carregada só na primeira busca sob demanda)
+    engine = RecommendationEngine.from_models_dir(models_dir)
+    titles = engine.df_games['nm_game'].to_numpy()
+    queries = sample_queries(engine.n_games, n_queries, seed)
+
+    def serve(query):
+        idx, filters = query
+        return engine.recommend(titles[idx], filters, k=k)
+
+    for query in queries[:warmup]:
+        serve(query)
+
+    # Passada 1: latência e vazão; fica a rodada mais rápida (menos ruído da máquina)
+    best = None
+    for _ in range(repeat):
+        latencies = np.empty(len(queries))
+        short = 0
+        total_start = time.perf_counter()
+        for i, query in enumerate(queries):
+            start = time.perf_counter()
+            result = serve(query)
+            latencies[i] = (time.perf_counter() - start) * 1000
+            short += len(result) < k
+        total_time = time.perf_counter() - total_start
+        if best is None or total_time < best[1]:
+            best = (latencies, total_time)
+    latencies, total_time = best
+
+    # Passada 2: memória alocada por consulta (pico acima do estado anterior)
+    n_alloc = min(len(queries), 500)
+    allocated_kb = np.empty(n_alloc)
+    tracemalloc.start()
+    for i, query in enumerate(queries[:n_alloc]):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        serve(query)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated_kb[i] = (peak - current) / 1024
+    tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'machine': platform.node(),
+        'n_games': int(engine.n_games),
+        'n_queries': len(queries),
+        'k': k,
+        'seed': seed,
+        'repeat': repeat,
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'mean_ms': float(latencies.mean()),
+        'throughput_qps': len(queries) / total_time,
+        'alloc_kb_per_query': float(allocated_kb.mean()),
+        'alloc_kb_p95': float(np.percentile(allocated_kb, 95)),
+        'short_results_pct': short / len(queries),
+    }
+
+
+def compare_with_baseline(result, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Retorna as métricas que pioraram além da tolerância (latência/memória maiores, vazão menor)."""
+    regressions = []
+    higher_is_worse = ['p50_ms', 'p95_ms', 'p99_ms', 'alloc_kb_per_query']
+    for metric in higher_is_worse + ['throughput_qps']:
+        previous, current = baseline.get(metric), result[metric]
+        if previous is None:
+            continue
+        if metric in higher_is_worse:
+            worse = current > previous * (1 + tolerance)
+        else:
+            worse = current < previous * (1 - tolerance)
+        status = "❌" if worse else "✅"
+        print(f"{status} {metric:<20} baseline: {previous:>10.2f} | atual: {current:>10.2f}")
+        if worse:
+            regressions.append(metric)
+    return regressions
+
+
+def print_result(result):
+    print(f"📦 Catálogo: {result['n_games']} jogos | consultas: {result['n_queries']} (k={result['k']})")
+    print(f"⏱️ p50: {result['p50_ms']:.2f} ms | p95: {result['p95_ms']:.2f} ms | p99: {result['p99_ms']:.2f} ms")
+    print(f"🚀 Vazão: {result['throughput_qps']:,.0f} consultas/s")
+    print(f"🧠 Alocação por consulta: {result['alloc_kb_per_query']:.1f} KB (p95 {result['alloc_kb_p95']:.1f} KB)")
+    print(f"ℹ️  Consultas com menos de {result['k']} resultados: {result['short_results_pct']:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de latência do caminho de recomendação (sem Streamlit)")
+    parser.add_argument('--queries', type=int, default=2000, help="Número de consultas sorteadas.")
+    parser.add_argument('--k', type=int, default=5, help="Recomendações por consulta.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3, help="Rodadas de medição (vale a mais rápida).")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="JSON com o resultado de referência.")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Piora relativa aceita antes de falhar (0.25 = 25%%).")
+    parser.add_argument('--update-baseline', action='store_true', help="Grava o resultado atual como baseline.")
+    args = parser.parse_args()
+
+    result = run_serving_benchmark(n_queries=args.queries, k=args.k, seed=args.seed, repeat=args.repeat)
+    print_result(result)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Baseline gravado em {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('n_games') != result['n_games'] or baseline.get('machine') != result['machine']:
+            print("⚠️ Baseline gerado com outro catálogo ou em outra máquina: compare com cuidado.")
+        regressions = compare_with_baseline(result, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ Regressão de performance em: {', '.join(regressions)}")
+            exit(1)
+        print("✅ Sem regressões em relação ao baseline.")
+    else:
+        print(f"ℹ️  Nenhum baseline em {args.baseline}. Rode com --update-baseline para criar.")
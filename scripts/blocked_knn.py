@@ -0,0 +1,146 @@
+import os
+import time
+import multiprocessing
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+from perf import peak_rss_mb
+
+# Orçamento de memória total (todos os workers) para as matrizes de score de cada bloco
+DEFAULT_MEMORY_BUDGET_MB = 1024
+
+# Bytes por célula do bloco: produto esparso intermediário + matriz densa float64 + argpartition
+BYTES_PER_SCORE = 32
+
+# Estado de cada worker (preenchido pelo initializer, herdado sem cópia via fork)
+_worker_state = {}
+
+
+def _init_worker(X, X_index, n_neighbors, query_ids):
+    _worker_state['X'] = X
+    _worker_state['X_index'] = X_index
+    _worker_state['n_neighbors'] = n_neighbors
+    _worker_state['query_ids'] = query_ids
+
+
+def _block_scores(X_block, X_index):
+    scores = X_block @ X_index.T
+    return scores.toarray() if sp.issparse(scores) else np.asarray(scores)
+
+
+def _top_k_block(start, stop):
+    """Calcula o top-k de um bloco de linhas: produto escalar + seleção parcial."""
+    X = _worker_state['X']
+    X_index = _worker_state['X_index']
+    k = _worker_state['n_neighbors']
+
+    scores = _block_scores(X[start:stop], X_index)
+    rows = np.arange(stop - start)
+
+    query_ids = _worker_state['query_ids']
+    if query_ids is not None:
+        # Como no NearestNeighbors, o próprio jogo é sempre o vizinho 0 (distância 0); -1 = consulta fora do índice
+        ids = query_ids[start:stop]
+        inside = ids >= 0
+        scores[rows[inside], ids[inside]] = np.inf
+
+    # Seleção parcial O(N) em vez de ordenar a linha inteira
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    candidate_scores = scores[rows[:, None], candidates]
+
+    # Ordena só os k vencedores (empate desfeito pelo menor índice)
+    order = np.lexsort((candidates, -candidate_scores), axis=-1)
+    indices = candidates[rows[:, None], order]
+    similarities = candidate_scores[rows[:, None], order]
+
+    distances = np.clip(1 - similarities, 0, 2)
+    return start, indices, distances, peak_rss_mb()
+
+
+def block_size_for_budget(n_index, memory_budget_mb, n_jobs):
+    """Quantas linhas por bloco cabem no orçamento, considerando todos os workers."""
+    budget_bytes = memory_budget_mb * 1024 ** 2
+    return max(1, int(budget_bytes // (n_jobs * n_index * BYTES_PER_SCORE)))
+
+
+def blocked_kneighbors(X, n_neighbors=50, X_index=None, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB,
+                       n_jobs=-1, block_size=None, return_stats=False, query_ids=None):
+    """
+    kNN por cosseno em blocos de linhas, com memória limitada.
+
+    Equivalente a NearestNeighbors(metric='cosine', algorithm='brute').kneighbors(X),
+    mas cada worker só materializa um bloco (block_size x N) de scores por vez.
+    Retorna (distances, indices), como o scikit-learn.
+    Com X_index, busca os vizinhos de X dentro de X_index; query_ids (linha de cada
+    consulta dentro de X_index, -1 se não está nele) fixa o próprio jogo na posição 0.
+    """
+    self_join = X_index is None
+    if self_join:
+        query_ids = np.arange(X.shape[0])
+    elif query_ids is not None:
+        query_ids = np.asarray(query_ids)
+    X = normalize(X, norm='l2', copy=True)
+    X_index = X if self_join else normalize(X_index, norm='l2', copy=True)
+    if sp.issparse(X):
+        X = X.tocsr()
+        X_index = X_index.tocsr()
+
+    n_rows, n_index = X.shape[0], X_index.shape[0]
+    n_neighbors = min(n_neighbors, n_index)
+    n_jobs = os.cpu_count() if n_jobs in (None, -1) else max(1, n_jobs)
+
+    if block_size is None:
+        block_size = block_size_for_budget(n_index, memory_budget_mb, n_jobs)
+    blocks = [(start, min(start + block_size, n_rows)) for start in range(0, n_rows, block_size)]
+    n_jobs = min(n_jobs, len(blocks))
+
+    indices = np.empty((n_rows, n_neighbors), dtype=np.int64)
+    distances = np.empty((n_rows, n_neighbors), dtype=np.float64)
+    worker_peak = 0.0
+
+    start_time = time.perf_counter()
+    if n_jobs <= 1:
+        _init_worker(X, X_index, n_neighbors, query_ids)
+        results = (_top_k_block(*block) for block in blocks)
+        for start, block_indices, block_distances, rss in results:
+            indices[start:start + len(block_indices)] = block_indices
+            distances[start:start + len(block_distances)] = block_distances
+            worker_peak = max(worker_peak, rss)
+        _worker_state.clear()
+    else:
+        with multiprocessing.Pool(n_jobs, initializer=_init_worker,
+                                  initargs=(X, X_index, n_neighbors, query_ids)) as pool:
+            for start, block_indices, block_distances, rss in pool.starmap(_top_k_block, blocks, chunksize=1):
+                indices[start:start + len(block_indices)] = block_indices
+                distances[start:start + len(block_distances)] = block_distances
+                worker_peak = max(worker_peak, rss)
+
+    if not return_stats:
+        return distances, indices
+
+    stats = {
+        'block_size': block_size, 'n_blocks': len(blocks), 'n_jobs': n_jobs,
+        'wall_s': time.perf_counter() - start_time,
+        'peak_rss_worker_mb': worker_peak, 'peak_rss_main_mb': peak_rss_mb(),
+    }
+    return distances, indices, stats
+
+
+def benchmark_block_sizes(X, block_sizes=(64, 256, 1024, 4096), n_neighbors=50, n_jobs=-1):
+    """Reporta tempo total e pico de RSS para cada tamanho de bloco."""
+    print(f"Matriz: {X.shape[0]} x {X.shape[1]} | vizinhos: {n_neighbors}")
+    print(f"{'BLOCO':>7} | {'BLOCOS':>6} | {'WORKERS':>7} | {'TEMPO (s)':>9} | {'RSS WORKER (MB)':>15} | {'RSS MAIN (MB)':>13}")
+    print("-" * 75)
+    results = []
+    for block_size in block_sizes:
+        _, _, stats = blocked_kneighbors(X, n_neighbors=n_neighbors, n_jobs=n_jobs,
+                                         block_size=block_size, return_stats=True)
+        results.append(stats)
+        print(f"{stats['block_size']:>7} | {stats['n_blocks']:>6} | {stats['n_jobs']:>7} | {stats['wall_s']:>9.2f} | "
+              f"{stats['peak_rss_worker_mb']:>15.1f} | {stats['peak_rss_main_mb']:>13.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    from artifacts import load_tfidf_matrix
+    benchmark_block_sizes(load_tfidf_matrix())
@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import tempfile
+import time
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateIndex
+from db_setup import Base, Game, DB_PATH
+
+# Pragmas só durante a carga: sem fsync e com journal em WAL
+LOAD_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-262144",  # ~256 MB de cache de páginas
+]
+
+
+class BulkLoader:
+    """
+    Carga em massa na tabela 'game' via sqlite3 puro:
+    uma única transação, INSERT preparado com executemany, índices criados só no fim e ANALYZE.
+
+        with BulkLoader() as loader:
+            loader.insert(df_final)
+    """
+
+    def __init__(self, db_path=DB_PATH, table=Game.__table__):
+        self.db_path = db_path
+        self.table = table
+        self.rows = 0
+        self.conn = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.conn = sqlite3.connect(self.db_path, isolation_level=None)
+        for pragma in LOAD_PRAGMAS:
+            self.conn.execute(pragma)
+
+        # Índices atrasados: cada INSERT não precisa atualizar as árvores B secundárias
+        for index in self.table.indexes:
+            self.conn.execute(f'DROP INDEX IF EXISTS "{index.name}"')
+        self.conn.execute("BEGIN")
+        return self
+
+    def insert(self, df):
+        if df.empty:
+            return 0
+        cols = list(df.columns)
+        sql = (f'INSERT INTO "{self.table.name}" ({", ".join(cols)}) '
+               f'VALUES ({", ".join("?" for _ in cols)})')
+        # NaN -> NULL e tipos NumPy -> tipos Python (sqlite3 não aceita numpy.int64)
+        values = df.astype(object).where(pd.notna(df), None).itertuples(index=False, name=None)
+        self.conn.executemany(sql, values)
+        self.rows += len(df)
+        return len(df)
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is not None:
+                self.conn.execute("ROLLBACK")
+            else:
+                self.conn.execute("COMMIT")
+            self.load_time = time.perf_counter() - self.start
+
+            # Recria os índices declarados no modelo (também após rollback) e atualiza as estatísticas
+            index_start = time.perf_counter()
+            for index in self.table.indexes:
+                ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=sqlite.dialect()))
+                self.conn.execute(ddl)
+            self.conn.execute("ANALYZE")
+            self.index_time = time.perf_counter() - index_start
+
+            # Volta para o journal padrão: o banco continua sendo um arquivo único
+            self.conn.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            self.conn.close()
+        return False
+
+
+def bulk_load_games(df_final, db_path=DB_PATH):
+    """Carrega um DataFrame já limpo na tabela 'game' usando o BulkLoader."""
+    with BulkLoader(db_path) as loader:
+        loader.insert(df_final)
+    print(f"⚡ Bulk load: {loader.rows} linhas em {loader.load_time:.2f}s "
+          f"+ índices/ANALYZE em {loader.index_time:.2f}s")
+    return loader.rows
+
+
+def benchmark_load(df_final):
+    """Compara o to_sql (SQLAlchemy, chunksize=10000) com o BulkLoader no mesmo DataFrame."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path_to_sql = os.path.join(tmp, 'to_sql.db')
+        engine = create_engine(f"sqlite:///{path_to_sql}")
+        Base.metadata.create_all(engine)
+        start = time.perf_counter()
+        df_final.to_sql('game', con=engine, if_exists='append', index=False, chunksize=10000)
+        results['to_sql'] = time.perf_counter() - start
+        engine.dispose()
+
+        path_bulk = os.path.join(tmp, 'bulk.db')
+        engine = create_engine(f"sqlite:///{path_bulk}")
+        Base.metadata.create_all(engine)
+        engine.dispose()
+        start = time.perf_counter()
+        with BulkLoader(path_bulk) as loader:
+            loader.insert(df_final)
+        results['bulk'] = time.perf_counter() - start
+
+    n = len(df_final)
+    print(f"{'MODO':<10} | {'TEMPO (s)':>9} | {'LINHAS/s':>10}")
+    print("-" * 36)
+    for mode, elapsed in results.items():
+        print(f"{mode:<10} | {elapsed:>9.2f} | {n / elapsed:>10,.0f}")
+    print(f"🚀 Ganho: {results['to_sql'] / results['bulk']:.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    from etl_steam import clean_games
+    df_game = pd.read_csv('data/games.zip', compression='zip', on_bad_lines='skip')
+    benchmark_load(clean_games(df_game))
@@ -4,13 +4,9 @@ import os
 
 DB_FOLDER = 'database'
 DB_NAME = 'game_recommender_system.db'
-
-if not os.path.exists(DB_FOLDER):
-    os.makedirs(DB_FOLDER)
-
 DB_PATH = os.path.join(DB_FOLDER, DB_NAME)
 
-# Criando conexão
+# Criando conexão (create_engine não abre o arquivo: só na primeira consulta)
 DATABASE_URL = f"sqlite:///{DB_PATH}"
 engine = create_engine(DATABASE_URL)
 
@@ -22,7 +18,7 @@ class Game(Base):
 
     # Identificador
     cd_game = Column(Integer, primary_key=True)
-    nm_game = Column(String(255))
+    nm_game = Column(String(255), index=True)
 
     # Dados Front-End
     dt_release = Column(Date, default=func.now())
@@ -31,11 +27,11 @@ class Game(Base):
     ds_website = Column(String(500))
     ds_support_url = Column(String(500))
 
-    # Filtros
-    vl_required_age = Column(Integer)
+    # Filtros (indexados: usados no WHERE do treino e nos filtros do app)
+    vl_required_age = Column(Integer, index=True)
     vl_metacritic_score = Column(Integer)
-    vl_positive_ratio = Column(Float)
-    vl_recommendations = Column(Integer)
+    vl_positive_ratio = Column(Float, index=True)
+    vl_recommendations = Column(Integer, index=True)
     bl_windows = Column(Boolean)
     bl_mac = Column(Boolean)
     bl_linux = Column(Boolean)
@@ -60,6 +56,9 @@ class User(Base):
     ds_password = Column(String(100))
 
 def init_db():
+    # A pasta do banco só é criada aqui, não no import
+    if not os.path.exists(DB_FOLDER):
+        os.makedirs(DB_FOLDER)
     Base.metadata.create_all(engine)
 
 if __name__ == '__main__':
@@ -0,0 +1,27 @@
+import time
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+# Dimensão padrão do embedding denso (modo opcional do treino)
+DEFAULT_RANK = 128
+
+
+def build_embedding(tfidf_matrix, rank=DEFAULT_RANK, random_state=42):
+    """
+    Projeta o TF-IDF (esparso, muito largo) num embedding denso float32 de dimensão `rank`,
+    normalizado (L2): a similaridade vira um produto matriz-vetor denso.
+    Retorna (embedding, projeção rank x termos, variância explicada, tempo em s).
+    """
+    start = time.perf_counter()
+    rank = max(1, min(rank, tfidf_matrix.shape[1] - 1, tfidf_matrix.shape[0] - 1))
+    svd = TruncatedSVD(n_components=rank, random_state=random_state)
+    embedding = normalize(svd.fit_transform(tfidf_matrix)).astype(np.float32)
+    projection = svd.components_.astype(np.float32)
+    return embedding, projection, float(svd.explained_variance_ratio_.sum()), time.perf_counter() - start
+
+
+def project(projection, tfidf_rows):
+    """Embedding de linhas novas (consultas ad hoc, atualização incremental) com a projeção salva."""
+    reduced = tfidf_rows @ np.asarray(projection).T
+    return normalize(np.asarray(reduced)).astype(np.float32)
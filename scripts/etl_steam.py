@@ -1,32 +1,28 @@
 import pandas as pd
 import os
+import time
+import argparse
+import itertools
+from contextlib import nullcontext
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from reduce_data import INPUT_CSV, COLS_TO_KEEP, MIN_RECOMMENDATIONS
+from perf import peak_rss_mb, metrics
+from profiling import profiler, add_profile_argument
+from bulk_load import BulkLoader, bulk_load_games
 
 DB_FOLDER = 'database'
 DB_NAME = 'game_recommender_system.db'
-
-if not os.path.exists(DB_FOLDER):
-    os.makedirs(DB_FOLDER)
-
 DB_PATH = os.path.join(DB_FOLDER, DB_NAME)
 
-# Criando conexão
+# Criando conexão (sem abrir o banco no import; a pasta é criada pelo init_db)
 DATABASE_URL = f"sqlite:///{DB_PATH}"
 engine = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=engine)
-session = Session()
 
-def run_etl():
-    print("Starting ETL... ")
-
-    # Lendo o arquivo
-    zip_path = 'data/games.zip'
-    print(f"Lendo o arquivo {zip_path}")
-    df_game = pd.read_csv(zip_path, compression='zip', on_bad_lines='skip')
-
-    print(f"Tamanho do DataFrame original: {len(df_game)}")
+# Linhas por chunk no ETL em streaming
+STREAM_CHUNKSIZE = 20000
 
+def clean_games(df_game):
+    """Limpeza do CSV bruto (Kaggle) e renomeação para as colunas da tabela 'game'."""
     # Começando a limpeza
     df_game.dropna(subset=['appid', 'name'], inplace=True)
     df_game.drop_duplicates(subset=['appid'], inplace=True)
@@ -59,17 +55,118 @@ def run_etl():
     ]
 
     cols_existentes = [c for c in colunas_bd if c in df_game.columns]
-    df_final = df_game[cols_existentes]
+    return df_game[cols_existentes]
+
+
+def run_etl(bulk=False):
+    print("Starting ETL... ")
+
+    # Lendo o arquivo
+    zip_path = 'data/games.zip'
+    print(f"Lendo o arquivo {zip_path}")
+    with metrics.stage('etl.csv_read') as stage:
+        df_game = pd.read_csv(zip_path, compression='zip', on_bad_lines='skip')
+        stage['rows'] = len(df_game)
+
+    print(f"Tamanho do DataFrame original: {len(df_game)}")
+
+    with metrics.stage('etl.cleaning') as stage:
+        df_final = clean_games(df_game)
+        stage['rows'] = len(df_final)
 
     print(f"Linhas prontas para inserção: {len(df_final)}")
 
     print(f"Iniciando inserção no Banco de Dados...")
 
     try:
-        df_final.to_sql('game', con=engine, if_exists='append', index=False, chunksize=10000)
+        with metrics.stage('etl.sql_write', rows=len(df_final), bulk=bulk):
+            if bulk:
+                # Uma transação, executemany, pragmas de carga e índices criados no fim
+                bulk_load_games(df_final)
+            else:
+                df_final.to_sql('game', con=engine, if_exists='append', index=False, chunksize=10000)
         print("ETL Completo! Banco populado")
     except Exception as e:
         print(f"Erro ao salvar o banco: {e}")
 
+
+def _dedup_chunk(chunk, seen_appids, seen_name_dev):
+    """Deduplicação entre chunks: mantém a primeira ocorrência de appid e de (name, developers)."""
+    chunk = chunk.dropna(subset=['appid', 'name'])
+
+    chunk = chunk.drop_duplicates(subset=['appid'])
+    chunk = chunk[~chunk['appid'].isin(seen_appids)]
+    # Como no clean_games: o appid conta como visto mesmo se a linha cair no passo de (name, developers)
+    seen_appids.update(chunk['appid'])
+
+    # NaN em developers conta como valor igual, como no drop_duplicates
+    keys = list(zip(chunk['name'], chunk['developers'].where(chunk['developers'].notna(), None)))
+    keep = []
+    for key in keys:
+        keep.append(key not in seen_name_dev)
+        seen_name_dev.add(key)
+    return chunk.loc[pd.Series(keep, index=chunk.index, dtype=bool)]
+
+
+def run_streaming_etl(csv_path=INPUT_CSV, chunksize=STREAM_CHUNKSIZE, bulk=False):
+    """
+    ETL em streaming: lê o CSV bruto em chunks, aplica filtro de recomendações,
+    deduplicação e limpeza por chunk e grava direto no SQLite.
+    O pico de memória depende do tamanho do chunk, não do arquivo.
+    """
+    print(f"Starting streaming ETL... ({csv_path}, chunks de {chunksize} linhas)")
+
+    seen_appids = set()
+    seen_name_dev = set()
+    rows_read = 0
+    rows_written = 0
+    start = time.perf_counter()
+
+    reader = pd.read_csv(csv_path, usecols=lambda c: c in COLS_TO_KEEP, on_bad_lines='skip', chunksize=chunksize)
+    # Em modo bulk, todos os chunks entram na mesma transação
+    with (BulkLoader() if bulk else nullcontext()) as loader:
+        for i in itertools.count(1):
+            # Uma linha de métricas por chunk e etapa (leitura, limpeza, escrita)
+            with metrics.stage('etl.csv_read', chunk=i) as stage:
+                chunk = next(reader, None)
+                stage['rows'] = 0 if chunk is None else len(chunk)
+            if chunk is None:
+                break
+            rows_read += len(chunk)
+
+            with metrics.stage('etl.cleaning', chunk=i) as stage:
+                # Mesmo filtro de qualidade do minify_dataset
+                chunk = chunk[chunk['recommendations'] >= MIN_RECOMMENDATIONS]
+                chunk = _dedup_chunk(chunk, seen_appids, seen_name_dev)
+                df_final = clean_games(chunk.copy())
+                stage['rows'] = len(df_final)
+
+            if not df_final.empty:
+                with metrics.stage('etl.sql_write', rows=len(df_final), chunk=i, bulk=bulk):
+                    if loader is not None:
+                        loader.insert(df_final)
+                    else:
+                        df_final.to_sql('game', con=engine, if_exists='append', index=False)
+                rows_written += len(df_final)
+
+            elapsed = time.perf_counter() - start
+            print(f"   chunk {i}: {rows_read} lidas | {rows_written} gravadas | "
+                  f"{rows_read / elapsed:,.0f} linhas/s | pico RSS {peak_rss_mb():.0f} MB")
+
+    elapsed = time.perf_counter() - start
+    print(f"ETL Completo! {rows_written} jogos gravados de {rows_read} linhas em {elapsed:.1f}s "
+          f"({rows_read / max(elapsed, 1e-9):,.0f} linhas/s, pico RSS {peak_rss_mb():.0f} MB)")
+
+
 if __name__ == "__main__":
-    run_etl()
\ No newline at end of file
+    from db_setup import init_db
+    parser = argparse.ArgumentParser(description="ETL: zip reduzido -> SQLite")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    metrics.configure()
+    if args.profile:
+        profiler.enable(args.profile)
+    init_db()
+    with profiler.profile('etl'):
+        run_etl()
+    metrics.write_prometheus()
\ No newline at end of file
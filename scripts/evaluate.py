@@ -1,57 +1,34 @@
 import pandas as pd
-import pickle
 import os
+import time
+import json
+import argparse
+from datetime import datetime
 import numpy as np
+from artifacts import load_tfidf_matrix, load_embedding, embedding_exists
+from tags import tag_jaccard
+from recommender import RecommendationEngine
 
 MODELS_DIR = 'models'
+REPORTS_DIR = 'reports'
 
 
-def load_models():
+def load_engine():
     try:
-        # Carregamos também o neighbors_distances.pkl agora
-        with open(os.path.join(MODELS_DIR, 'neighbors_indices.pkl'), 'rb') as f:
-            knn_indices = pickle.load(f)
-        with open(os.path.join(MODELS_DIR, 'neighbors_distances.pkl'), 'rb') as f:
-            knn_distances = pickle.load(f)
-        with open(os.path.join(MODELS_DIR, 'dataframe.pkl'), 'rb') as f:
-            df = pickle.load(f)
-        with open(os.path.join(MODELS_DIR, 'indices_map.pkl'), 'rb') as f:
-            indices_map = pickle.load(f)
-        return knn_indices, knn_distances, df, indices_map
+        # Mesmo engine usado pelo app: vizinhos (mmap), catálogo e matriz de tags
+        return RecommendationEngine.from_models_dir(MODELS_DIR)
     except FileNotFoundError:
         print("❌ Modelos não encontrados. Rode 'python main.py --reset' primeiro.")
         exit()
 
 
-def normalize_tags(tag_string):
-    """Limpa tags sujas no formato '{Tag Name: 1234}'"""
-    if pd.isna(tag_string) or tag_string == '':
-        return set()
-    tag_string = str(tag_string).replace('{', '').replace('}', '')
-    cleaned_tags = set()
-    items = tag_string.split(',')
-    for item in items:
-        if ':' in item:
-            tag_name = item.split(':')[0]
-        else:
-            tag_name = item
-        tag_clean = tag_name.strip().lower()
-        if tag_clean and tag_clean != "nan": cleaned_tags.add(tag_clean)
-    return cleaned_tags
-
-
-def calculate_tag_overlap(tags1, tags2):
-    set1 = normalize_tags(tags1)
-    set2 = normalize_tags(tags2)
-    if len(set1) == 0: return 0.0
-    intersection = set1.intersection(set2)
-    union = set1.union(set2)
-    if len(union) == 0: return 0.0
-    return len(intersection) / len(union)
+def calculate_tag_overlap(tag_matrix, rows_a, rows_b):
+    """Overlap de tags (Jaccard) entre pares de jogos, via matriz esparsa de IDs de tags."""
+    return tag_jaccard(tag_matrix, rows_a, rows_b)
 
 
 def run_evaluation():
-    knn_indices, knn_distances, df, indices_map = load_models()
+    engine = load_engine()
     top_k = 5
 
     with open('benchmarks/test_games.txt', 'r', encoding='utf-8') as arquivo:
@@ -60,38 +37,37 @@ def run_evaluation():
     print(f"{'JOGO DE ENTRADA':<25} | {'TOP-1 RECOMENDAÇÃO':<40} | {'COSINE@5':<10} | {'TAGS@5':<10}")
     print("-" * 100)
 
+    # Títulos do benchmark resolvidos pelo índice de títulos (caixa, pontuação e erros de digitação)
+    resolved = {game: engine.resolve_title(game) for game in test_games}
+
+    # Todas as recomendações de uma vez, pelo mesmo caminho do app (sem filtros)
+    recs = engine.recommend_many([t for t in resolved.values() if t is not None], filters=None, k=top_k, explain=False)
+    # Tags@K (overlap de tags no Top-K) para todos os pares de uma vez
+    recs['tags'] = calculate_tag_overlap(engine.tag_matrix, recs['seed_row'].to_numpy(), recs['rec_row'].to_numpy())
+    by_game = recs.groupby('seed_nm_game', sort=False)
+
     cosine_at_k_scores = []
     overlap_at_k_scores = []
 
     for game in test_games:
-        if game not in indices_map:
+        title = resolved[game]
+        if title is None or title not in by_game.groups:
             print(f"{game:<25} | (não encontrado no dataset)")
             continue
+        if title != game:
+            print(f"{'':<25} | ↳ '{game}' resolvido como '{title}'")
 
-        idx = indices_map[game]
-        original_tags = df.iloc[idx].get("ds_tags", "")
-
-        neighbor_indices_topk = knn_indices[idx][1:1 + top_k]
-        neighbor_distances_topk = knn_distances[idx][1:1 + top_k]
-
+        game_recs = by_game.get_group(title)
         # Cosine@K (média da similaridade do Top-K)
-        similarities_topk = 1 - neighbor_distances_topk
-        cosine_at_k = float(np.mean(similarities_topk))
-
-        # Top-K recomendados
-        recommended_games = df.iloc[neighbor_indices_topk]
-        top1 = recommended_games.iloc[0]
-
-        # Tags@K (média do overlap de tags no Top-K)
-        overlaps = []
-        for _, rec in recommended_games.iterrows():
-            overlaps.append(calculate_tag_overlap(original_tags, rec.get("ds_tags", "")))
-        tags_at_k = float(np.mean(overlaps)) if overlaps else 0.0
+        cosine_at_k = float(game_recs['match_score'].mean())
+        tags_at_k = float(game_recs['tags'].mean())
+        # Top-1 recomendado
+        top1 = game_recs['nm_game'].iloc[0]
 
         cosine_at_k_scores.append(cosine_at_k)
         overlap_at_k_scores.append(tags_at_k)
 
-        print(f"{game:<25} | {str(top1['nm_game'])[:40]:<40} | {cosine_at_k:.1%}     | {tags_at_k:.1%}")
+        print(f"{game:<25} | {str(top1)[:40]:<40} | {cosine_at_k:.1%}     | {tags_at_k:.1%}")
 
     if cosine_at_k_scores:
         avg_cosine = float(np.mean(cosine_at_k_scores))
@@ -104,5 +80,248 @@ def run_evaluation():
         print(f"✅ avg_tags@{top_k}:   {avg_tags:.1%}   | 📉 std_tags@{top_k}:   {std_tags:.1%}")
 
 
+def run_ann_evaluation(k=10, n_probes=(1, 4, 8, 16), n_lists=None, sample_size=1000, seed=42):
+    """Recall@k do índice aproximado (IVF) contra o kNN exato, com tempo de build e throughput."""
+    from ann_index import build_ann_index
+    from blocked_knn import blocked_kneighbors
+
+    tfidf_matrix = load_tfidf_matrix(MODELS_DIR)
+    n_games = tfidf_matrix.shape[0]
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(n_games, size=min(sample_size, n_games), replace=False))
+    queries = tfidf_matrix[sample]
+
+    # Verdade: busca exata (força bruta) para as consultas da amostra
+    start = time.perf_counter()
+    _, exact = blocked_kneighbors(queries, n_neighbors=k + 1, X_index=tfidf_matrix)
+    exact_qps = len(sample) / (time.perf_counter() - start)
+    exact_sets = [set(row[row != q][:k]) for row, q in zip(exact, sample)]
+
+    index, build_time = build_ann_index(tfidf_matrix, n_lists=n_lists)
+    print(f"Jogos: {n_games} | consultas: {len(sample)} | k={k}")
+    print(f"Índice IVF: {index.n_lists} listas | build: {build_time:.2f}s")
+    print(f"{'MÉTODO':<20} | {'RECALL@' + str(k):>10} | {'CONSULTAS/s':>12}")
+    print("-" * 50)
+    print(f"{'exato (brute)':<20} | {1:>10.1%} | {exact_qps:>12.0f}")
+
+    results = []
+    for n_probe in n_probes:
+        start = time.perf_counter()
+        _, approx = index.search(queries, k + 1, n_probe=n_probe, query_ids=sample)
+        qps = len(sample) / (time.perf_counter() - start)
+        recall = float(np.mean([len(truth.intersection(row[1:])) / k for truth, row in zip(exact_sets, approx)]))
+        results.append({'n_probe': n_probe, 'recall': recall, 'qps': qps})
+        print(f"{'ivf n_probe=' + str(n_probe):<20} | {recall:>10.1%} | {qps:>12.0f}")
+
+    return {'build_s': build_time, 'exact_qps': exact_qps, 'ann': results}
+
+
+def _query_qps(matrix, queries, k, repeat=3):
+    """Consultas/s de uma busca avulsa (produto matriz-vetor + top-k), a melhor de `repeat` rodadas."""
+    from search import dense_scores, top_k_order
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for q in queries:
+            top_k_order(dense_scores(matrix @ matrix[q].T).ravel(), k + 1)
+        best = min(best, time.perf_counter() - start)
+    return len(queries) / best
+
+
+def run_embedding_evaluation(k=5, rank=None, sample_size=1000, output_dir=REPORTS_DIR, seed=42):
+    """
+    Compara o embedding denso (SVD) com o TF-IDF esparso nas mesmas consultas:
+    cosine@k (medido no TF-IDF), tags@k, overlap das listas de vizinhos, velocidade e memória.
+    Usa o embedding salvo no treino; com `rank`, projeta um novo na hora.
+    """
+    from blocked_knn import blocked_kneighbors
+    from embedding import build_embedding, project, DEFAULT_RANK
+
+    engine = load_engine()
+    tfidf_matrix = load_tfidf_matrix(MODELS_DIR)
+    n_games = tfidf_matrix.shape[0]
+
+    build_s = None
+    if rank is None and embedding_exists(MODELS_DIR):
+        embedding, projection = load_embedding(MODELS_DIR, mmap=False)
+    else:
+        embedding, projection, _, build_s = build_embedding(tfidf_matrix, rank=rank or DEFAULT_RANK)
+
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(n_games, size=min(sample_size, n_games), replace=False))
+    results = {'n_games': int(n_games), 'n_queries': len(sample), 'k': k, 'rank': int(embedding.shape[1])}
+    neighbors = {}
+    for name, matrix in [('sparse', tfidf_matrix), ('dense', embedding)]:
+        start = time.perf_counter()
+        _, indices = blocked_kneighbors(matrix[sample], n_neighbors=k + 1, X_index=matrix, query_ids=sample)
+        knn_s = time.perf_counter() - start
+        neighbors[name] = indices[:, 1:]
+        seeds, recs = np.repeat(sample, k), indices[:, 1:].ravel()
+        # Cosseno sempre no TF-IDF: mede o quanto os vizinhos do embedding são parecidos de fato
+        cosine = np.asarray(tfidf_matrix[seeds].multiply(tfidf_matrix[recs]).sum(axis=1)).ravel()
+        results[name] = {
+            f'cosine@{k}': float(cosine.mean()),
+            f'tags@{k}': float(calculate_tag_overlap(engine.tag_matrix, seeds, recs).mean()),
+            'knn_s': knn_s,
+            'query_qps': _query_qps(matrix, sample[:200], k),
+        }
+    results['sparse']['memory_mb'] = (tfidf_matrix.data.nbytes + tfidf_matrix.indices.nbytes +
+                                      tfidf_matrix.indptr.nbytes) / 1024 ** 2
+    results['dense']['memory_mb'] = embedding.nbytes / 1024 ** 2
+    results['dense']['projection_mb'] = projection.nbytes / 1024 ** 2
+    results['dense']['build_s'] = build_s
+    results[f'overlap@{k}'] = float(np.mean([len(np.intersect1d(a, b)) / k
+                                             for a, b in zip(neighbors['sparse'], neighbors['dense'])]))
+    # Consulta ad hoc: TF-IDF de um jogo novo -> embedding pela projeção salva
+    start = time.perf_counter()
+    project(projection, tfidf_matrix[sample[:200]])
+    results['dense']['projection_ms_per_query'] = (time.perf_counter() - start) / min(200, len(sample)) * 1000
+
+    sparse, dense = results['sparse'], results['dense']
+    print(f"Jogos: {n_games} | consultas: {len(sample)} | k={k} | embedding: {results['rank']} dimensões")
+    print(f"{'MÉTRICA':<22} | {'ESPARSO':>10} | {'DENSO':>10} | {'DELTA':>10}")
+    print("-" * 62)
+    for metric in [f'cosine@{k}', f'tags@{k}']:
+        print(f"{metric:<22} | {sparse[metric]:>10.1%} | {dense[metric]:>10.1%} | {dense[metric] - sparse[metric]:>+10.1%}")
+    print(f"{'consultas/s':<22} | {sparse['query_qps']:>10.0f} | {dense['query_qps']:>10.0f} | "
+          f"{dense['query_qps'] / sparse['query_qps']:>9.1f}x")
+    print(f"{'kNN da amostra (s)':<22} | {sparse['knn_s']:>10.2f} | {dense['knn_s']:>10.2f} |")
+    print(f"{'memória (MB)':<22} | {sparse['memory_mb']:>10.1f} | {dense['memory_mb']:>10.1f} | "
+          f"{dense['memory_mb'] / sparse['memory_mb']:>9.2f}x")
+    print(f"🔁 overlap@{k} com as listas do modelo esparso: {results[f'overlap@{k}']:.1%} | "
+          f"projeção: {dense['projection_mb']:.1f} MB, {dense['projection_ms_per_query']:.3f} ms por consulta")
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(os.path.join(output_dir, 'embedding_evaluation.json'), 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"💾 Resultados em '{output_dir}/embedding_evaluation.json'")
+    return results
+
+
+def first_genres(df):
+    """Primeiro gênero de cada jogo (vetorizado), 'Unknown' quando vazio."""
+    genres = df['ds_genres'].fillna('').astype(str).str.split(',').str[0].str.strip()
+    return genres.where(genres != '', 'Unknown')
+
+
+def run_full_evaluation(k=5, output_dir=REPORTS_DIR, baseline_path=None, tolerance=0.01):
+    """
+    Avalia o catálogo inteiro com operações em lote (NumPy/esparsas):
+    cosine@k, tags@k (Jaccard), genre_match@k, cobertura e quebra por gênero.
+    Grava JSON (resumo) + CSVs (por jogo e por gênero). Com baseline_path,
+    falha (exit 1) se alguma média cair mais que a tolerância.
+    """
+    start = time.perf_counter()
+    # Lido antes de gravar qualquer coisa: o baseline pode ser o próprio reports/evaluation_summary.json
+    baseline = None
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    engine = load_engine()
+    df = engine.df_games
+    n_games = engine.n_games
+    rows = np.arange(n_games)
+
+    # Top-k de todos os jogos pelo mesmo caminho em lote do app (sem filtros)
+    neighbors, similarities = engine.recommend_indices(rows, filters=None, k=k)
+
+    # Métricas por jogo, todas de uma vez
+    cosine_at_k = similarities.mean(axis=1)
+    seeds = np.repeat(rows, k)
+    tags_at_k = calculate_tag_overlap(engine.tag_matrix, seeds, neighbors.ravel()).reshape(n_games, k).mean(axis=1)
+    genre_match_at_k = engine.match_flags(seeds, neighbors.ravel())['genre'].reshape(n_games, k).mean(axis=1)
+    genres = first_genres(df)
+    coverage = len(np.unique(neighbors)) / n_games
+
+    per_game = pd.DataFrame({
+        'cd_game': df['cd_game'].to_numpy(), 'nm_game': df['nm_game'].to_numpy(), 'genre': genres.to_numpy(),
+        f'cosine@{k}': cosine_at_k, f'tags@{k}': tags_at_k, f'genre_match@{k}': genre_match_at_k,
+    })
+    per_genre = per_game.groupby('genre').agg(
+        n_games=('cd_game', 'size'),
+        **{f'cosine@{k}': (f'cosine@{k}', 'mean'), f'tags@{k}': (f'tags@{k}', 'mean'),
+           f'genre_match@{k}': (f'genre_match@{k}', 'mean')}
+    ).sort_values('n_games', ascending=False)
+
+    def describe(values):
+        return {'mean': float(np.mean(values)), 'std': float(np.std(values)),
+                'p10': float(np.percentile(values, 10)), 'p50': float(np.percentile(values, 50)),
+                'p90': float(np.percentile(values, 90))}
+
+    summary = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'n_games': int(n_games), 'k': k,
+        f'cosine@{k}': describe(cosine_at_k),
+        f'tags@{k}': describe(tags_at_k),
+        f'genre_match@{k}': describe(genre_match_at_k),
+        'coverage': coverage,
+        'per_genre': per_genre.reset_index().to_dict('records'),
+    }
+    summary['elapsed_s'] = time.perf_counter() - start
+
+    # Saída legível por máquina
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(os.path.join(output_dir, 'evaluation_summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    per_game.to_csv(os.path.join(output_dir, 'evaluation_per_game.csv'), index=False)
+    per_genre.to_csv(os.path.join(output_dir, 'evaluation_per_genre.csv'))
+
+    print(f"📊 Avaliação completa: {n_games} jogos em {summary['elapsed_s']:.2f}s")
+    print(f"✅ avg_cosine@{k}: {summary[f'cosine@{k}']['mean']:.1%} | avg_tags@{k}: {summary[f'tags@{k}']['mean']:.1%} | "
+          f"genre_match@{k}: {summary[f'genre_match@{k}']['mean']:.1%} | cobertura: {coverage:.1%}")
+    print(f"💾 Resultados em '{output_dir}/' (evaluation_summary.json, evaluation_per_game.csv, evaluation_per_genre.csv)")
+
+    if baseline is not None:
+        regressions = compare_with_baseline(summary, baseline, k, tolerance)
+        if regressions:
+            exit(1)
+    return summary
+
+
+def compare_with_baseline(summary, baseline, k, tolerance):
+    """Compara as médias com um resumo anterior (dict); retorna a lista de métricas que pioraram."""
+    regressions = []
+    for metric in [f'cosine@{k}', f'tags@{k}', f'genre_match@{k}', 'coverage']:
+        if metric not in baseline:
+            continue
+        current = summary[metric]['mean'] if isinstance(summary[metric], dict) else summary[metric]
+        previous = baseline[metric]['mean'] if isinstance(baseline[metric], dict) else baseline[metric]
+        status = "✅"
+        if current < previous - tolerance:
+            status = "❌"
+            regressions.append(metric)
+        print(f"{status} {metric}: {previous:.1%} -> {current:.1%}")
+
+    if regressions:
+        print(f"❌ Regressão de qualidade em: {', '.join(regressions)} (tolerância {tolerance:.1%})")
+    return regressions
+
+
 if __name__ == "__main__":
-    run_evaluation()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Avaliação do Game Recommender System")
+    parser.add_argument('--ann', action='store_true', help="Recall@k do índice aproximado (IVF) contra o kNN exato.")
+    parser.add_argument('--full', action='store_true', help="Avalia o catálogo inteiro e grava JSON/CSV.")
+    parser.add_argument('--embedding', action='store_true',
+                        help="Compara o embedding denso (SVD) com o TF-IDF esparso: qualidade, velocidade e memória.")
+    parser.add_argument('--rank', type=int, default=None,
+                        help="Dimensão do embedding no --embedding (padrão: o embedding salvo no treino).")
+    parser.add_argument('--k', type=int, default=None, help="k das métricas (padrão: 10 no --ann, 5 no --full).")
+    parser.add_argument('--output-dir', default=REPORTS_DIR, help="Pasta dos resultados do modo --full.")
+    parser.add_argument('--baseline', default=None, help="JSON de uma avaliação anterior; falha se a qualidade cair.")
+    parser.add_argument('--tolerance', type=float, default=0.01, help="Queda máxima aceita em relação ao baseline.")
+    parser.add_argument('--n-lists', type=int, default=None, help="Número de listas do IVF (padrão: raiz de N).")
+    parser.add_argument('--n-probe', type=int, nargs='+', default=[1, 4, 8, 16], help="Valores de n_probe a testar.")
+    parser.add_argument('--sample', type=int, default=1000, help="Quantidade de consultas da amostra.")
+    args = parser.parse_args()
+
+    if args.ann:
+        run_ann_evaluation(k=args.k or 10, n_probes=args.n_probe, n_lists=args.n_lists, sample_size=args.sample)
+    elif args.embedding:
+        run_embedding_evaluation(k=args.k or 5, rank=args.rank, sample_size=args.sample, output_dir=args.output_dir)
+    elif args.full:
+        run_full_evaluation(k=args.k or 5, output_dir=args.output_dir,
+                            baseline_path=args.baseline, tolerance=args.tolerance)
+    else:
+        run_evaluation()
\ No newline at end of file
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+# Bitmask de sistemas operacionais (uma coluna uint8 em vez de 3 booleanas)
+OS_WINDOWS = 1
+OS_MAC = 2
+OS_LINUX = 4
+OS_ALL = OS_WINDOWS | OS_MAC | OS_LINUX
+
+
+def os_mask(windows: bool, mac: bool, linux: bool) -> int:
+    """Converte os checkboxes de plataforma em bitmask."""
+    mask = 0
+    if windows: mask |= OS_WINDOWS
+    if mac: mask |= OS_MAC
+    if linux: mask |= OS_LINUX
+    return mask
+
+
+def build_filter_columns(df: pd.DataFrame) -> dict:
+    """
+    Extrai as colunas de filtro do DataFrame em formato struct-of-arrays:
+    idade (uint8), % de aprovação (float32) e bitmask de SO (uint8).
+    Nulos viram 0, como no filtro original do app.
+    """
+    age = pd.to_numeric(df['vl_required_age'], errors='coerce').fillna(0).clip(0, 255).to_numpy(dtype=np.uint8)
+    positive_ratio = pd.to_numeric(df['vl_positive_ratio'], errors='coerce').fillna(0).to_numpy(dtype=np.float32)
+
+    os_bits = np.zeros(len(df), dtype=np.uint8)
+    for col, bit in [('bl_windows', OS_WINDOWS), ('bl_mac', OS_MAC), ('bl_linux', OS_LINUX)]:
+        flag = df[col].fillna(False).astype(bool).to_numpy()
+        os_bits[flag] |= bit
+
+    return {'age': age, 'positive_ratio': positive_ratio, 'os': os_bits}
+
+
+def filter_mask(columns: dict, candidates, max_age, min_score, os_bits: int) -> np.ndarray:
+    """
+    Aplica os três filtros de uma vez sobre os candidatos (máscara NumPy).
+    Com candidates=None a máscara cobre o catálogo inteiro.
+    """
+    candidates = slice(None) if candidates is None else np.asarray(candidates)
+    return (
+        (columns['age'][candidates] <= max_age) &
+        (columns['positive_ratio'][candidates] >= min_score) &
+        ((columns['os'][candidates] & os_bits) != 0)
+    )
@@ -0,0 +1,286 @@
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sqlalchemy import table, column
+from sqlalchemy.dialects.sqlite import insert
+from db_setup import engine, init_db
+from etl_steam import clean_games
+from model_training import N_NEIGHBORS, MIN_RECOMMENDATIONS
+from soup import build_soup, vectorize
+from blocked_knn import blocked_kneighbors
+from search import dense_scores
+from embedding import project
+from profiling import profiler, add_profile_argument
+from artifacts import (MODELS_DIR, load_catalog, save_catalog, load_neighbors, save_neighbors,
+                       load_vectorizer, load_tfidf_matrix, save_tfidf, save_filter_columns, save_tag_matrix,
+                       save_title_index, load_embedding, save_embedding, embedding_exists, partitions_exist)
+from ann_index import ANN_INDEX_FILE
+from model_bundle import staged_models
+
+# Linhas por bloco ao comparar o catálogo com os jogos novos/alterados
+PATCH_BLOCK_SIZE = 4096
+# Margem na comparação com o k-ésimo vizinho (a similaridade salva é float16)
+SIMILARITY_TOLERANCE = 1e-3
+
+
+def upsert_games(df_final):
+    """INSERT ... ON CONFLICT(cd_game) DO UPDATE na tabela 'game'."""
+    if df_final.empty:
+        return 0
+
+    cols = list(df_final.columns)
+    # Tabela "leve" (sem tipos) para gravar os valores exatamente como o to_sql do ETL
+    game_table = table('game', *[column(c) for c in cols])
+    records = df_final.astype(object).where(pd.notna(df_final), None).to_dict('records')
+
+    stmt = insert(game_table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['cd_game'],
+        set_={c: stmt.excluded[c] for c in cols if c != 'cd_game'}
+    )
+    with engine.begin() as conn:
+        conn.execute(stmt, records)
+    return len(records)
+
+
+def read_games(game_ids):
+    """Relê do SQL as linhas gravadas, com os mesmos tipos que o treino usa."""
+    ids = [int(i) for i in game_ids]
+    frames = []
+    for start in range(0, len(ids), 900):
+        chunk = ','.join(str(i) for i in ids[start:start + 900])
+        frames.append(pd.read_sql(f"SELECT * FROM game WHERE cd_game IN ({chunk})", engine))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def _pair_scores(X, rows, neighbor_indices):
+    """Cosseno exato entre cada linha e os vizinhos da sua lista (sem passar pelo float16 salvo)."""
+    X_rows = X[rows]
+    scores = np.empty(neighbor_indices.shape, dtype=np.float64)
+    for j in range(neighbor_indices.shape[1]):
+        if sp.issparse(X):
+            scores[:, j] = np.asarray(X_rows.multiply(X[neighbor_indices[:, j]]).sum(axis=1)).ravel()
+        else:
+            scores[:, j] = np.einsum('ij,ij->i', X_rows, X[neighbor_indices[:, j]])
+    return scores
+
+
+def patch_neighbor_lists(X, indices, similarities, touched, block_size=PATCH_BLOCK_SIZE):
+    """
+    Atualiza as listas top-k das linhas existentes (não tocadas) em relação aos jogos tocados.
+    Só é reescrita a lista que contém um jogo alterado ou em que um jogo novo/alterado
+    supera o k-ésimo vizinho atual. Retorna (listas corrigidas, linhas a recalcular):
+    se um jogo alterado ficou menos similar, o verdadeiro próximo vizinho é desconhecido
+    e a lista precisa da busca exata.
+    """
+    n_old, k = indices.shape
+    touched = np.asarray(touched)
+    touched_pos = np.full(X.shape[0], -1, dtype=np.int64)
+    touched_pos[touched] = np.arange(len(touched))
+
+    others = np.setdiff1d(np.arange(n_old), touched)
+    X_touched = X[touched]
+    n_patched = 0
+    recompute = []
+
+    for start in range(0, len(others), block_size):
+        rows = others[start:start + block_size]
+        scores = dense_scores(X[rows] @ X_touched.T)
+        block_indices = indices[rows]
+
+        present = touched_pos[block_indices] >= 0
+        threshold = similarities[rows, -1].astype(np.float64) - SIMILARITY_TOLERANCE
+        changed = present.any(axis=1) | (scores >= threshold[:, None]).any(axis=1)
+        if not changed.any():
+            continue
+
+        rows, scores, block_indices, present = rows[changed], scores[changed], block_indices[changed], present[changed]
+
+        # Similaridades exatas da lista atual (inclui o valor novo dos jogos alterados)
+        block_scores = _pair_scores(X, rows, block_indices)
+        block_scores[:, 0] = np.inf  # o próprio jogo continua na posição 0
+        dropped = (present & (block_scores < similarities[rows].astype(np.float64) - SIMILARITY_TOLERANCE)).any(axis=1)
+        recompute.append(rows[dropped])
+        # Jogos tocados que já estavam na lista não entram duas vezes
+        present_rows, present_cols = np.nonzero(present)
+        scores[present_rows, touched_pos[block_indices[present_rows, present_cols]]] = -np.inf
+
+        cand_scores = np.hstack([block_scores, scores])
+        cand_indices = np.hstack([block_indices, np.broadcast_to(touched, scores.shape)])
+        top = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+        sel = np.arange(len(rows))[:, None]
+        cand_scores, cand_indices = cand_scores[sel, top], cand_indices[sel, top]
+        order = np.lexsort((cand_indices, -cand_scores), axis=-1)
+        cand_scores, cand_indices = cand_scores[sel, order], cand_indices[sel, order]
+        cand_scores[:, 0] = 1.0
+
+        n_patched += int((cand_indices != block_indices).any(axis=1).sum())
+        indices[rows] = cand_indices
+        similarities[rows] = cand_scores
+
+    recompute = np.concatenate(recompute) if recompute else np.empty(0, dtype=np.int64)
+    return n_patched, recompute
+
+
+def drop_rows(indices, similarities, removed):
+    """
+    Tira do modelo as linhas removidas e renumera as listas de vizinhos.
+    Retorna (mantidas, índices, similaridades, linhas a recalcular): listas que apontavam
+    para um jogo removido perderam um vizinho e precisam da busca exata.
+    """
+    n = len(indices)
+    keep = np.ones(n, dtype=bool)
+    keep[removed] = False
+    new_pos = np.cumsum(keep) - 1
+    stale = ~keep[indices[keep]]
+    rows = np.arange(keep.sum())[:, None]
+    # Vizinho removido vira o próprio jogo até a lista ser recalculada
+    indices = np.where(stale, rows, new_pos[indices[keep]])
+    return keep, indices, similarities[keep], np.flatnonzero(stale.any(axis=1))
+
+
+def run_incremental_update(csv_path, models_dir=MODELS_DIR):
+    """
+    Atualização diária sem retreino completo: upsert no SQL, vetorização com o
+    vocabulário congelado e patch das listas de vizinhos.
+    O vocabulário e o IDF não mudam; rode o pipeline completo de tempos em tempos.
+    """
+    start_time = time.perf_counter()
+    print(f"🔄 Atualização incremental a partir de {csv_path}...")
+
+    # 1. ETL só das linhas novas/alteradas
+    df_raw = pd.read_csv(csv_path, on_bad_lines='skip')
+    df_clean = clean_games(df_raw)
+    init_db()
+    n_upserted = upsert_games(df_clean)
+    print(f"🗄️ {n_upserted} linhas gravadas (upsert) na tabela 'game'")
+
+    df_rows = read_games(df_clean['cd_game'])
+    below_minimum = df_rows['vl_recommendations'] < MIN_RECOMMENDATIONS
+
+    # 2. Artefatos atuais
+    df, _ = load_catalog(models_dir)
+    vectorizer = load_vectorizer(models_dir)
+    X = load_tfidf_matrix(models_dir)
+    embedding = projection = None
+    if embedding_exists(models_dir):
+        embedding, projection = load_embedding(models_dir, mmap=False)
+    indices, similarities = load_neighbors(models_dir, mmap=False)
+    indices = indices.astype(np.int64)
+    similarities = similarities.astype(np.float32)
+    had_partitions = partitions_exist(models_dir)
+    had_ann_index = os.path.exists(os.path.join(models_dir, ANN_INDEX_FILE))
+
+    # 3. Jogos treinados que caíram abaixo do mínimo de recomendações saem do modelo, como no treino completo
+    row_of_game = pd.Series(df.index, index=df['cd_game'])
+    removed_ids = df_rows.loc[below_minimum, 'cd_game']
+    removed_rows = row_of_game[removed_ids[removed_ids.isin(row_of_game.index)]].to_numpy()
+    stale = np.empty(0, dtype=np.int64)
+    if len(removed_rows) > 0:
+        keep, indices, similarities, stale = drop_rows(indices, similarities, removed_rows)
+        df = df[keep].reset_index(drop=True)
+        X = X[keep]
+        if embedding is not None:
+            embedding = embedding[keep]
+        row_of_game = pd.Series(df.index, index=df['cd_game'])
+        print(f"🗑️ Jogos removidos do modelo (menos de {MIN_RECOMMENDATIONS} recomendações): {len(removed_rows)}")
+
+    # 4. Separa jogos já treinados (alterados) de jogos novos
+    df_rows = df_rows[~below_minimum]
+    is_existing = df_rows['cd_game'].isin(row_of_game.index)
+    updated = df_rows[is_existing].copy()
+    new = df_rows[~is_existing].drop_duplicates(subset='nm_game', keep='first')
+    # Mesmo critério do treino: nomes duplicados ficam de fora
+    new = new[~new['nm_game'].isin(df['nm_game'])].copy()
+
+    if updated.empty and new.empty and len(removed_rows) == 0:
+        print("ℹ️  Nenhum jogo elegível para atualizar o modelo.")
+        return
+
+    n_old = len(df)
+    updated_rows = row_of_game[updated['cd_game']].to_numpy()
+    new_rows = np.arange(n_old, n_old + len(new))
+    print(f"🎮 Jogos alterados: {len(updated)} | jogos novos: {len(new)}")
+
+    # 5. DataFrame: substitui as linhas alteradas e anexa as novas
+    updated['soup'] = build_soup(updated) if not updated.empty else pd.Series(dtype=object)
+    new['soup'] = build_soup(new) if not new.empty else pd.Series(dtype=object)
+    if not updated.empty:
+        updated.index = updated_rows
+        df.loc[updated_rows, df.columns] = updated[df.columns]
+    new.index = new_rows
+    df = pd.concat([df, new[df.columns]])
+
+    # 6. Vetoriza só as linhas tocadas com o vocabulário congelado
+    touched = np.concatenate([updated_rows, new_rows]).astype(np.int64)
+    if len(touched) > 0:
+        X_touched = vectorize(vectorizer, pd.concat([updated, new]))
+        order = np.arange(n_old)
+        order[updated_rows] = n_old + np.arange(len(updated))
+        order = np.concatenate([order, n_old + len(updated) + np.arange(len(new))])
+        X = sp.vstack([X, X_touched]).tocsr()[order]
+        # Modelo com embedding denso: os tocados são projetados com a projeção salva e os vizinhos saem do embedding
+        if embedding is not None:
+            embedding = np.vstack([embedding, project(projection, X_touched)])[order]
+    X_knn = X if embedding is None else embedding
+
+    # 7. Vizinhos: lista completa para os tocados + patch nas listas existentes
+    n_patched, recompute = 0, np.empty(0, dtype=np.int64)
+    if len(touched) > 0:
+        touched_distances, touched_indices = blocked_kneighbors(
+            X_knn[touched], n_neighbors=indices.shape[1], X_index=X_knn, query_ids=touched
+        )
+        n_patched, recompute = patch_neighbor_lists(X_knn, indices, similarities, touched)
+
+        indices = np.vstack([indices, np.zeros((len(new), indices.shape[1]), dtype=np.int64)])
+        similarities = np.vstack([similarities, np.zeros((len(new), similarities.shape[1]), dtype=np.float32)])
+        indices[touched] = touched_indices
+        similarities[touched] = 1 - touched_distances
+
+    # Listas que perderam um vizinho removido também vão para a busca exata
+    recompute = np.setdiff1d(np.union1d(recompute, stale), touched)
+    if len(recompute) > 0:
+        recompute_distances, recompute_indices = blocked_kneighbors(
+            X_knn[recompute], n_neighbors=indices.shape[1], X_index=X_knn, query_ids=recompute
+        )
+        indices[recompute] = recompute_indices
+        similarities[recompute] = 1 - recompute_distances
+    print(f"📐 Listas de vizinhos recalculadas: {len(touched) + len(recompute)} | corrigidas: {n_patched}")
+
+    # 8. Persiste os artefatos na mesma estrutura do treino completo, numa pasta temporária publicada
+    # de uma vez com o bundle novo: os apps em execução trocam de modelo sem reiniciar
+    df = df.reset_index(drop=True)
+    with staged_models(models_dir) as staging:
+        save_neighbors(indices, 1 - similarities, models_dir=staging)
+        save_filter_columns(df, models_dir=staging)
+        save_tag_matrix(df, models_dir=staging)
+        save_tfidf(vectorizer, X, models_dir=staging)
+        if embedding is not None:
+            save_embedding(embedding, projection, models_dir=staging)
+        save_catalog(df, models_dir=staging)
+        save_title_index(df, models_dir=staging)
+
+    # Jogos novos/removidos e filtros alterados mudam os membros das partições, e refazê-las é um
+    # all-pairs por partição: ficam de fora da versão nova até o próximo treino (os filtros usam a busca sob demanda)
+    if had_partitions:
+        print("ℹ️  Partições de filtro removidas; rode 'python main.py --force train' para recriá-las.")
+    # O índice IVF não conhece os jogos novos: fica de fora até o próximo treino completo
+    if had_ann_index:
+        print("ℹ️  Índice aproximado (IVF) removido; será recriado no próximo treino.")
+
+    print(f"✅ Atualização incremental concluída em {time.perf_counter() - start_time:.1f}s "
+          f"({len(df)} jogos no modelo)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Atualização incremental do catálogo (sem retreino completo)")
+    parser.add_argument('csv_path', help="CSV no formato do Kaggle com os jogos novos/alterados.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        profiler.enable(args.profile)
+    with profiler.profile('update'):
+        run_incremental_update(args.csv_path)
@@ -0,0 +1,71 @@
+import time
+import argparse
+import numpy as np
+from artifacts import MODELS_DIR
+from recommender import RecommendationEngine
+
+# Tamanhos de biblioteca medidos no benchmark (latência deve ficar plana)
+BENCHMARK_SIZES = (1, 10, 100, 1000, 5000)
+
+
+def parse_appids(text) -> tuple:
+    """
+    Lê um appid (cd_game) por linha; 'appid,peso' (ex.: horas jogadas) define o peso do jogo no perfil.
+    Linhas vazias e comentários (#) são ignorados. Retorna (appids, pesos).
+    """
+    appids, weights = [], []
+    for line in text.splitlines():
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        appid, _, weight = line.partition(',')
+        appids.append(int(appid))
+        weights.append(float(weight) if weight.strip() else 1.0)
+    return appids, weights
+
+
+def read_appids(path) -> tuple:
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_appids(f.read())
+
+
+def benchmark_library_sizes(engine, sizes=BENCHMARK_SIZES, k=10, repeat=5, seed=42):
+    """Latência da recomendação por biblioteca para bibliotecas de 1 a 5.000 jogos."""
+    rng = np.random.default_rng(seed)
+    appids = engine.df_games['cd_game'].to_numpy()
+    engine.tfidf_matrix()  # a carga da matriz não entra na medição
+    print(f"{'JOGOS NA BIBLIOTECA':>19} | {'p50 (ms)':>8} | {'máx (ms)':>8}")
+    print("-" * 43)
+    for size in sizes:
+        # No máximo metade do catálogo: sobra o que recomendar em catálogos pequenos
+        library = rng.choice(appids, size=min(size, len(appids) // 2), replace=False)
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            engine.recommend_library(library, k=k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        print(f"{len(library):>19} | {np.median(latencies):>8.2f} | {max(latencies):>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recomendações a partir da biblioteca do usuário (lista de appids)")
+    parser.add_argument('path', nargs='?', help="Arquivo com os appids (um por linha ou 'appid,peso').")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--benchmark', action='store_true', help="Mede a latência para bibliotecas de 1 a 5.000 jogos.")
+    args = parser.parse_args()
+
+    engine = RecommendationEngine.from_models_dir(args.models_dir)
+    if args.benchmark:
+        benchmark_library_sizes(engine, k=args.k)
+    elif args.path:
+        appids, weights = read_appids(args.path)
+        try:
+            recommendations = engine.recommend_library(appids, k=args.k, weights=weights)
+        except KeyError as e:
+            print(f"❌ {e.args[0]}")
+            exit(1)
+        print(f"📚 {len(appids)} jogos na biblioteca -> {len(recommendations)} recomendações")
+        print(recommendations[['cd_game', 'nm_game', 'match_score', 'explain_seed']].to_string(index=False))
+    else:
+        parser.error("informe o arquivo de appids ou --benchmark")
@@ -0,0 +1,95 @@
+import json
+import time
+import asyncio
+import argparse
+from urllib.parse import urlencode
+import numpy as np
+from artifacts import MODELS_DIR, load_catalog
+from benchmark_serving import sample_queries
+from serve_api import DEFAULT_HOST, DEFAULT_PORT
+
+
+async def _client(host, port, paths, latencies, errors):
+    """Uma conexão keep-alive enviando os pedidos da sua fila, um por vez."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for path in paths:
+            start = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('latin-1'))
+            await writer.drain()
+
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.strip().lower() == 'content-length':
+                    length = int(value)
+            body = await reader.readexactly(length)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            if b' 200 ' not in status_line:
+                errors.append(status_line.decode('latin-1').strip() + ' ' + body[:120].decode('utf-8', 'replace'))
+    finally:
+        writer.close()
+
+
+async def run_load_test(host=DEFAULT_HOST, port=DEFAULT_PORT, n_requests=20000, connections=64, k=5,
+                        seed=42, models_dir=MODELS_DIR):
+    """Dispara n_requests GET /recommend com jogos e filtros sorteados em várias conexões concorrentes."""
+    df_games, _ = load_catalog(models_dir)
+    titles = df_games['nm_game'].to_numpy()
+    paths = [
+        '/recommend?' + urlencode({'title': titles[idx], 'k': k, **filters})
+        for idx, filters in sample_queries(len(titles), n_requests, seed)
+    ]
+
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _client(host, port, paths[i::connections], latencies, errors) for i in range(connections)
+    ])
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /health HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode('latin-1'))
+    health = json.loads((await reader.read()).split(b'\r\n\r\n', 1)[1])
+    writer.close()
+
+    latencies = np.array(latencies)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'requests': len(latencies),
+        'connections': connections,
+        'errors': len(errors),
+        'error_sample': errors[:3],
+        'elapsed_s': elapsed,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99),
+        'server_avg_batch_size': health.get('avg_batch_size'),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gerador de carga para o serve_api.py")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--connections', type=int, default=64, help="Conexões keep-alive concorrentes.")
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--min-rps', type=float, default=None, help="Falha (exit 1) se a vazão ficar abaixo disto.")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_load_test(args.host, args.port, args.requests, args.connections, args.k))
+    print(f"📨 {result['requests']} requisições em {result['elapsed_s']:.2f}s com {result['connections']} conexões")
+    print(f"🚀 Vazão: {result['rps']:,.0f} req/s | lote médio no servidor: {result['server_avg_batch_size']}")
+    print(f"⏱️ p50: {result['p50_ms']:.2f} ms | p95: {result['p95_ms']:.2f} ms | p99: {result['p99_ms']:.2f} ms")
+    if result['errors']:
+        print(f"⚠️ {result['errors']} respostas com erro, ex.: {result['error_sample']}")
+    if args.min_rps is not None:
+        if result['rps'] < args.min_rps or result['errors']:
+            print(f"❌ Abaixo da meta de {args.min_rps:,.0f} req/s (ou com erros)")
+            exit(1)
+        print(f"✅ Meta de {args.min_rps:,.0f} req/s atingida")
@@ -1,14 +1,21 @@
 import os
 import shutil
+import sqlite3
+import hashlib
 import argparse
 from db_setup import init_db, DB_PATH
-from etl_steam import run_etl
-from model_training import train_model
-from reduce_data import minify_dataset
+from reduce_data import INPUT_CSV, OUTPUT_ZIP, COLS_TO_KEEP, MIN_RECOMMENDATIONS
+from model_bundle import bundle_path
+from pipeline import Stage, run_pipeline, mark_current, clear_state, code_dependencies
+from perf import metrics, METRICS_DIR
+from profiling import profiler, add_profile_argument
 
 # Definição dos caminhos
 MODELS_DIR = 'models'
 
+# Etapas do pipeline, na ordem do grafo (saídas de uma são entradas da próxima)
+STAGES = ['minify', 'etl', 'train']
+
 def clean_environment():
     """
     Função para deletar o Banco de Dados e os Modelos Salvos.
@@ -42,14 +49,132 @@ def clean_environment():
 
     return True
 
+
+def count_games():
+    """Linhas da tabela 'game' (parte do fingerprint da saída do ETL)."""
+    if not os.path.exists(DB_PATH):
+        return None
+    with sqlite3.connect(DB_PATH) as conn:
+        try:
+            return conn.execute("SELECT COUNT(*) FROM game").fetchone()[0]
+        except sqlite3.OperationalError:
+            return None
+
+
+def games_digest():
+    """
+    Hash do conteúdo da tabela 'game' (ordenada por cd_game). Os bytes do arquivo SQLite
+    mudam a cada carga mesmo com os mesmos dados; o treino depende só do conteúdo.
+    """
+    if not count_games():
+        return None
+    digest = hashlib.sha256()
+    with sqlite3.connect(DB_PATH) as conn:
+        for row in conn.execute("SELECT * FROM game ORDER BY cd_game"):
+            digest.update(repr(row).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def run_etl_stage(streaming=False, bulk=False):
+    # O ETL grava em append: a etapa sempre recria o banco do zero
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    init_db()
+    from etl_steam import run_etl, run_streaming_etl
+    if streaming:
+        run_streaming_etl(bulk=bulk)
+    else:
+        run_etl(bulk=bulk)
+    if not count_games():
+        raise RuntimeError("ETL não gravou nenhum jogo no banco.")
+
+
+def run_train_stage(out_of_core=False, embedding_rank=None):
+    from model_training import train_model
+    train_model(out_of_core=out_of_core, embedding_rank=embedding_rank)
+
+
+def build_stages(streaming=False, bulk=False, out_of_core=False, embedding_rank=None):
+    """
+    Grafo de etapas com as entradas/saídas de cada uma. ETL e treino só são importados
+    quando a etapa roda: sem mudanças, o pipeline termina em poucos segundos.
+    """
+    def run_minify():
+        from reduce_data import minify_dataset
+        minify_dataset()
+
+    stages = []
+    if not streaming:
+        stages.append(Stage(
+            'minify', run_minify, inputs=[INPUT_CSV], outputs=[OUTPUT_ZIP],
+            config={'min_recommendations': MIN_RECOMMENDATIONS, 'columns': COLS_TO_KEEP},
+            code=code_dependencies('reduce_data.py'),
+        ))
+    stages.append(Stage(
+        'etl', lambda: run_etl_stage(streaming=streaming, bulk=bulk),
+        # O ETL em streaming lê o CSV bruto direto, sem o zip
+        inputs=[INPUT_CSV if streaming else OUTPUT_ZIP], outputs=[DB_PATH],
+        config={'streaming': streaming, 'min_recommendations': MIN_RECOMMENDATIONS},
+        code=code_dependencies('etl_steam.py', 'db_setup.py'),
+        values={'rows': count_games, 'games': games_digest},
+    ))
+    stages.append(Stage(
+        # Entrada = conteúdo da tabela 'game', não os bytes do arquivo do banco
+        'train', lambda: run_train_stage(out_of_core=out_of_core, embedding_rank=embedding_rank),
+        outputs=[bundle_path(MODELS_DIR)],
+        config={'knn_method': 'exact', 'out_of_core': out_of_core, 'embedding_rank': embedding_rank},
+        input_values={'games': games_digest},
+        # O treino e tudo o que ele importa de scripts/ (IVF, métricas, profiling...)
+        code=code_dependencies('model_training.py'),
+    ))
+    return stages
+
+
 if __name__ == '__main__':
     # Configuração do Argument Parser (Leitor de comandos do terminal)
     parser = argparse.ArgumentParser(description="Pipeline do Game Recommender System")
 
     # Criamos a flag --reset. Se o usuário usar, a variável 'reset' vira True.
     parser.add_argument('--reset', action='store_true', help="Deleta DB e Modelos antigos antes de rodar.")
+    # ETL em streaming: CSV bruto -> SQLite em chunks, sem o zip intermediário
+    parser.add_argument('--streaming', action='store_true', help="Roda o ETL em streaming direto do CSV bruto (memória constante).")
+    # Carga em massa: transação única, executemany, pragmas de carga e índices no fim
+    parser.add_argument('--bulk', action='store_true', help="Usa o bulk loader do SQLite no ETL (bem mais rápido).")
+    # Treino out-of-core: SQL em blocos + features com hashing (memória não cresce com o vocabulário)
+    parser.add_argument('--out-of-core', action='store_true', help="Treina lendo o SQL em blocos (hashing + IDF em streaming).")
+    # Embedding denso (SVD): vizinhos e busca sob demanda num espaço de `rank` dimensões
+    parser.add_argument('--embedding-rank', type=int, default=None, metavar='RANK',
+                        help="Treina também um embedding denso (SVD) com essa dimensão e usa-o no kNN.")
+    # Atualização diária: só os jogos novos/alterados, sem rodar o pipeline completo
+    parser.add_argument('--update', metavar='CSV', help="Atualização incremental a partir de um CSV com jogos novos/alterados.")
+    # Cada etapa guarda o fingerprint das entradas/saídas e é pulada quando nada mudou
+    parser.add_argument('--force', metavar='ETAPA', action='append', default=[], choices=STAGES + ['all'],
+                        help="Reexecuta a etapa mesmo sem mudanças (pode repetir; 'all' = todas).")
+
+    # Tempo, CPU, pico de RSS e linhas por etapa: metrics/stages.jsonl + snapshot metrics/metrics.prom
+    parser.add_argument('--metrics-dir', default=METRICS_DIR, help="Pasta das métricas por etapa.")
+    # Opt-in: hotspots (cProfile) e sites de alocação (tracemalloc) das etapas escolhidas, ex.: --profile train.knn
+    add_profile_argument(parser)
 
     args = parser.parse_args()
+    metrics.configure(args.metrics_dir)
+    if args.profile:
+        profiler.enable(args.profile)
+
+    stages = build_stages(streaming=args.streaming, bulk=args.bulk, out_of_core=args.out_of_core,
+                          embedding_rank=args.embedding_rank)
+
+    if args.update:
+        if args.reset:
+            print("⚠️ --update não pode ser usado junto com --reset.")
+            exit()
+        from incremental_update import run_incremental_update
+        with metrics.stage('pipeline.update'):
+            run_incremental_update(args.update)
+        # Banco e modelos mudaram fora do grafo: registra o novo estado para o próximo start não retreinar
+        mark_current(stages, ['etl', 'train'])
+        metrics.write_prometheus()
+        exit()
 
     # Lógica de Execução
     if args.reset:
@@ -57,11 +182,11 @@ if __name__ == '__main__':
         if not sucesso:
             print("⚠️ Abortando pipeline devido a erro na limpeza.")
             exit()
+        clear_state()
 
     # Pipeline
     print("\n🚀 Iniciando Pipeline...")
-    init_db()
-    minify_dataset()
-    run_etl()
-    train_model()
-    print("\n🎉 Pipeline finalizado com sucesso!")
\ No newline at end of file
+    summary = run_pipeline(stages, force=args.force)
+    print("\n🎉 Pipeline finalizado com sucesso! "
+          f"({', '.join(f'{name}: {status} em {elapsed:.1f}s' for name, status, elapsed in summary)})")
+    print(f"📊 Métricas por etapa em '{args.metrics_dir}/' (snapshot: {metrics.write_prometheus()})")
@@ -0,0 +1,346 @@
+import os
+import io
+import json
+import mmap
+import time
+import struct
+import pickle
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+from artifacts import (MODELS_DIR, DATAFRAME_FILE, INDICES_MAP_FILE, VECTORIZER_FILE, load_neighbors,
+                       load_filter_columns, load_tag_matrix, load_tfidf_matrix, load_title_index, title_index_exists,
+                       load_embedding, embedding_exists, load_partitions, partitions_exist)
+from title_search import TitleIndex
+
+# Arquivo único com todos os artefatos do modelo (manifesto + arrays alinhados)
+BUNDLE_FILE = 'model_bundle.bin'
+BUNDLE_MAGIC = b'GMBUNDLE'
+BUNDLE_FORMAT_VERSION = 1
+# Alinhamento de cada seção (arrays podem ser lidos direto do mmap)
+ALIGNMENT = 64
+
+# Intervalo com que os apps em execução procuram um bundle novo
+RELOAD_INTERVAL_S = 5.0
+# Pasta temporária (dentro de models/, mesmo disco) onde uma versão nova é montada antes de publicar
+STAGING_PREFIX = '.staging-'
+
+_HEADER = struct.Struct('<8sIQ')  # magic, versão do formato, tamanho do manifesto
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def bundle_path(models_dir=MODELS_DIR):
+    return os.path.join(models_dir, BUNDLE_FILE)
+
+
+def bundle_exists(models_dir=MODELS_DIR):
+    return os.path.exists(bundle_path(models_dir))
+
+
+def _collect_sections(models_dir):
+    """Arrays e blobs (pickle) que entram no bundle, lidos dos artefatos recém-gravados."""
+    # Import local: ann_index traz o scikit-learn, que o caminho de serving não precisa
+    from ann_index import ANN_INDEX_FILE
+
+    arrays = {}
+    knn_indices, knn_similarities = load_neighbors(models_dir, mmap=False)
+    arrays['neighbors_indices'] = knn_indices
+    arrays['neighbors_similarities'] = knn_similarities
+    for name, column in load_filter_columns(models_dir, mmap=False).items():
+        arrays[f'filter_{name}'] = column
+
+    sparse_shapes = {}
+    tag_vocab, tag_matrix = load_tag_matrix(models_dir)
+    arrays['tag_vocab'] = tag_vocab
+    for name, matrix in [('tag_matrix', tag_matrix), ('tfidf_matrix', load_tfidf_matrix(models_dir))]:
+        sparse_shapes[name] = list(matrix.shape)
+        for part in ('data', 'indices', 'indptr'):
+            arrays[f'{name}.{part}'] = getattr(matrix, part)
+
+    if title_index_exists(models_dir):
+        for name, array in load_title_index(models_dir).to_arrays().items():
+            arrays[f'title_index.{name}'] = array
+    if embedding_exists(models_dir):
+        arrays['embedding'], arrays['embedding_projection'] = load_embedding(models_dir, mmap=False)
+    if partitions_exist(models_dir):
+        for name, array in zip(('specs', 'indices', 'similarities'), load_partitions(models_dir, mmap=False)):
+            arrays[f'partition_{name}'] = array
+
+    blobs = {}
+    for name, filename in [('dataframe', DATAFRAME_FILE), ('indices_map', INDICES_MAP_FILE),
+                           ('vectorizer', VECTORIZER_FILE), ('ivf_index', ANN_INDEX_FILE)]:
+        path = os.path.join(models_dir, filename)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                blobs[name] = f.read()
+    return arrays, blobs, sparse_shapes
+
+
+def _vectorizer_params(blob):
+    """Parâmetros do TfidfVectorizer em formato JSON (para o manifesto)."""
+    vectorizer = pickle.loads(blob)
+    params = {k: v if isinstance(v, (str, int, float, bool, type(None))) else str(v)
+              for k, v in vectorizer.get_params().items()}
+    params['vocabulary_size'] = len(getattr(vectorizer, 'vocabulary_', {}))
+    return params
+
+
+def write_bundle(models_dir=MODELS_DIR):
+    """
+    Junta os artefatos de models/ num único arquivo versionado:
+    cabeçalho + manifesto JSON (versão, checksums, nº de jogos, parâmetros do vetorizador)
+    + seções alinhadas. Escreve num arquivo temporário e troca com os.replace (atômico):
+    quem está lendo continua com a versão antiga até recarregar.
+    """
+    start = time.perf_counter()
+    arrays, blobs, sparse_shapes = _collect_sections(models_dir)
+
+    sections = {}
+    payloads = []
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        data = array.tobytes()
+        sections[name] = {'kind': 'array', 'dtype': array.dtype.str, 'shape': list(array.shape),
+                          'offset': offset, 'nbytes': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+        payloads.append((offset, data))
+        offset = _aligned(offset + len(data))
+    for name, data in blobs.items():
+        sections[name] = {'kind': 'pickle', 'offset': offset, 'nbytes': len(data),
+                          'sha256': hashlib.sha256(data).hexdigest()}
+        payloads.append((offset, data))
+        offset = _aligned(offset + len(data))
+
+    created_at = datetime.now()
+    digest = hashlib.sha256(''.join(s['sha256'] for s in sections.values()).encode()).hexdigest()
+    manifest = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'version': f"{created_at:%Y%m%dT%H%M%S}-{digest[:8]}",
+        'created_at': created_at.isoformat(timespec='seconds'),
+        'n_games': int(arrays['neighbors_indices'].shape[0]),
+        'n_neighbors': int(arrays['neighbors_indices'].shape[1]),
+        'embedding_rank': int(arrays['embedding'].shape[1]) if 'embedding' in arrays else None,
+        'n_partitions': int(arrays['partition_specs'].shape[0]) if 'partition_specs' in arrays else 0,
+        'vectorizer': _vectorizer_params(blobs['vectorizer']) if 'vectorizer' in blobs else None,
+        'sparse_shapes': sparse_shapes,
+        'sections': sections,
+    }
+    manifest_bytes = json.dumps(manifest, ensure_ascii=False).encode('utf-8')
+    data_start = _aligned(_HEADER.size + len(manifest_bytes))
+
+    final_path = bundle_path(models_dir)
+    tmp_path = f"{final_path}.tmp-{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(BUNDLE_MAGIC, BUNDLE_FORMAT_VERSION, len(manifest_bytes)))
+            f.write(manifest_bytes)
+            for section_offset, data in payloads:
+                f.seek(data_start + section_offset)
+                f.write(data)
+            f.truncate(data_start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        # Checksums conferidos uma vez, aqui: um bundle corrompido nunca é publicado
+        verify_bundle(tmp_path)
+        os.replace(tmp_path, final_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    size_mb = (data_start + offset) / 1024 ** 2
+    print(f"📦 Bundle {manifest['version']} gravado: {manifest['n_games']} jogos, {len(sections)} seções, "
+          f"{size_mb:.1f} MB ({time.perf_counter() - start:.2f}s)")
+    return manifest
+
+
+@contextmanager
+def staged_models(models_dir=MODELS_DIR):
+    """
+    Monta uma versão nova do modelo fora de models/ e só publica no fim do bloco:
+
+        with staged_models('models') as staging:
+            save_neighbors(..., models_dir=staging)
+
+    O bundle é gravado (e conferido) na pasta temporária; depois cada artefato solto é trocado com
+    os.replace e o bundle vai por último. O serving só lê o bundle, então nunca vê versões misturadas.
+    Artefatos da versão anterior que não existem na nova (ex.: partições, embedding) são apagados.
+    Se o bloco falhar, models/ fica intacto.
+    """
+    staging = os.path.join(models_dir, f"{STAGING_PREFIX}{os.getpid()}")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    try:
+        yield staging
+        write_bundle(models_dir=staging)
+        new_files = set(os.listdir(staging))
+        for name in os.listdir(models_dir):
+            path = os.path.join(models_dir, name)
+            if os.path.isfile(path) and name not in new_files:
+                os.remove(path)
+        for name in sorted(new_files - {BUNDLE_FILE}):
+            os.replace(os.path.join(staging, name), os.path.join(models_dir, name))
+        os.replace(bundle_path(staging), bundle_path(models_dir))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def read_manifest(path):
+    with open(path, 'rb') as f:
+        magic, format_version, manifest_size = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"{path} não é um bundle de modelo")
+        if format_version > BUNDLE_FORMAT_VERSION:
+            raise ValueError(f"Formato de bundle {format_version} mais novo que o suportado ({BUNDLE_FORMAT_VERSION})")
+        manifest = json.loads(f.read(manifest_size))
+    manifest['data_start'] = _aligned(_HEADER.size + manifest_size)
+    return manifest
+
+
+def verify_bundle(path):
+    """Confere os checksums SHA-256 de todas as seções (lê o arquivo inteiro). Retorna o manifesto."""
+    manifest = read_manifest(path)
+    with open(path, 'rb') as f:
+        for name, section in manifest['sections'].items():
+            f.seek(manifest['data_start'] + section['offset'])
+            if hashlib.sha256(f.read(section['nbytes'])).hexdigest() != section['sha256']:
+                raise ValueError(f"Checksum inválido na seção '{name}' do bundle {manifest['version']}")
+    return manifest
+
+
+def load_bundle(models_dir=MODELS_DIR, verify=False):
+    """
+    Abre o bundle via mmap: os arrays apontam direto para o arquivo (zero-copy)
+    e só os blobs (DataFrame, mapa de nomes, vetorizador) são desserializados.
+    Os checksums são conferidos no write_bundle; aqui só o tamanho do arquivo (um arquivo truncado
+    não passa). verify=True confere os checksums de novo, mas lê todas as páginas do arquivo.
+    Retorna (manifesto, arrays, blobs).
+    """
+    path = bundle_path(models_dir)
+    manifest = verify_bundle(path) if verify else read_manifest(path)
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    end = manifest['data_start'] + max((s['offset'] + s['nbytes'] for s in manifest['sections'].values()), default=0)
+    if len(mm) < end:
+        raise ValueError(f"Bundle {manifest['version']} truncado: {len(mm)} de {end} bytes")
+    view = memoryview(mm)
+
+    arrays, blobs = {}, {}
+    for name, section in manifest['sections'].items():
+        start = manifest['data_start'] + section['offset']
+        data = view[start:start + section['nbytes']]
+        if section['kind'] == 'array':
+            dtype = np.dtype(section['dtype'])
+            count = section['nbytes'] // dtype.itemsize if dtype.itemsize else 0
+            arrays[name] = np.frombuffer(mm, dtype=dtype, count=count, offset=start).reshape(section['shape'])
+        else:
+            blobs[name] = data
+    return manifest, arrays, blobs
+
+
+def bundle_components(manifest, arrays, blobs):
+    """Monta, a partir das seções do bundle, os mesmos objetos que os loaders de artifacts.py devolvem."""
+    def sparse(name):
+        # scipy só quando a matriz é montada (1ª explicação / busca sob demanda), não na subida
+        import scipy.sparse as sp
+        return sp.csr_matrix((arrays[f'{name}.data'], arrays[f'{name}.indices'], arrays[f'{name}.indptr']),
+                             shape=tuple(manifest['sparse_shapes'][name]))
+
+    title_arrays = {name.split('.', 1)[1]: array for name, array in arrays.items() if name.startswith('title_index.')}
+    return {
+        'neighbors': (arrays['neighbors_indices'], arrays['neighbors_similarities']),
+        'filters': {name[len('filter_'):]: array for name, array in arrays.items() if name.startswith('filter_')},
+        'tags': lambda: (arrays['tag_vocab'], sparse('tag_matrix')),
+        'catalog': (pickle.load(io.BytesIO(blobs['dataframe'])), pickle.load(io.BytesIO(blobs['indices_map']))),
+        'titles': TitleIndex(**title_arrays) if title_arrays else None,
+        'partitions': ((arrays['partition_specs'], arrays['partition_indices'], arrays['partition_similarities'])
+                       if 'partition_specs' in arrays else None),
+        # Com embedding denso no bundle, a busca sob demanda usa o embedding (mesmo espaço dos vizinhos)
+        'tfidf_matrix': (lambda: arrays['embedding']) if 'embedding' in arrays else (lambda: sparse('tfidf_matrix')),
+    }
+
+
+class HotReloader:
+    """
+    Mantém o engine atual e, numa thread em segundo plano, procura um bundle novo.
+    Quando a versão muda, o engine novo é carregado fora do caminho
+    das requisições e trocado por referência: quem já pegou o engine antigo termina com ele.
+
+        reloader = HotReloader(RecommendationEngine.from_models_dir).start()
+        reloader.engine.recommend(...)
+    """
+
+    def __init__(self, load, models_dir=MODELS_DIR, interval_s=RELOAD_INTERVAL_S):
+        self.load = load
+        self.models_dir = models_dir
+        self.interval_s = interval_s
+        self.n_reloads = 0
+        self._stamp = self._bundle_stamp()
+        self.engine = load(models_dir)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _bundle_stamp(self):
+        try:
+            st = os.stat(bundle_path(self.models_dir))
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    @property
+    def version(self):
+        return getattr(self.engine, 'version', None)
+
+    def check(self) -> bool:
+        """Recarrega se o arquivo do bundle mudou e traz outra versão. Retorna True se trocou."""
+        stamp = self._bundle_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+        try:
+            new_version = read_manifest(bundle_path(self.models_dir))['version']
+            if new_version == self.version:
+                self._stamp = stamp
+                return False
+            engine = self.load(self.models_dir)
+        except Exception as e:
+            # Bundle inválido/incompleto: segue com a versão atual e não tenta de novo o mesmo arquivo
+            print(f"⚠️ Falha ao recarregar o modelo: {e}")
+            self._stamp = stamp
+            return False
+
+        old_version = self.version
+        self.engine = engine
+        self._stamp = stamp
+        self.n_reloads += 1
+        print(f"🔄 Modelo recarregado: {old_version} -> {self.version}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.check()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='model-hot-reload', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Bundle único do modelo")
+    parser.add_argument('--verify', action='store_true', help="Só confere os checksums do bundle existente.")
+    args = parser.parse_args()
+    if args.verify:
+        print(f"✅ Bundle {verify_bundle(bundle_path())['version']} íntegro")
+    else:
+        # Empacota os artefatos já existentes em models/ (ex.: modelos treinados antes do bundle)
+        write_bundle()
@@ -1,94 +1,247 @@
 import pandas as pd
 from sqlalchemy import create_engine
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.neighbors import NearestNeighbors
-import pickle
 import os
+import time
+import argparse
+import itertools
+from artifacts import (save_neighbors, save_filter_columns, save_tfidf, save_catalog, save_tag_matrix,
+                       save_title_index, save_embedding, save_partitions, TEXT_ONLY_COLUMNS)
+from blocked_knn import blocked_kneighbors, DEFAULT_MEMORY_BUDGET_MB
+from ann_index import build_ann_index, save_ann_index, DEFAULT_N_PROBE
+from model_bundle import staged_models
+from soup import build_soup, FieldTfidfVectorizer, HashedFieldTfidfVectorizer, DEFAULT_N_FEATURES
+from perf import peak_rss_mb, metrics
+from profiling import profiler, add_profile_argument
+from embedding import build_embedding
+from filters import build_filter_columns
+from partitions import build_partitions
 
 DB_FOLDER = 'database'
 DB_NAME = 'game_recommender_system.db'
-if not os.path.exists(DB_FOLDER):
-    os.makedirs(DB_FOLDER)
 DB_PATH = os.path.join(DB_FOLDER, DB_NAME)
 
 # Criando conexão
 DATABASE_URL = f"sqlite:///{DB_PATH}"
 engine = create_engine(DATABASE_URL)
 
-def train_model():
-    print("🧠 Iniciando treinamento...")
-
+N_NEIGHBORS = 50
+# Só entram no modelo jogos com um mínimo de recomendações
+MIN_RECOMMENDATIONS = 20
+
+# Linhas lidas do SQL por bloco no treino out-of-core
+TRAIN_CHUNKSIZE = 5000
+
+def create_soup(x):
+    # Versão antiga (uma chamada por linha), mantida para comparação em soup.py
+    # Tratamento para garantir que tudo seja string
+    genres = str(x['ds_genres']) if pd.notna(x['ds_genres']) and x['ds_genres'] else ''
+    tags = str(x['ds_tags']) if pd.notna(x['ds_tags']) and x['ds_tags'] else ''
+    developers = str(x['ds_developer']) if pd.notna(x['ds_developer']) and x['ds_developer'] else ''
+    publisher = str(x['ds_publisher']) if pd.notna(x['ds_publisher']) and x['ds_publisher'] else ''
+    short_desc = str(x['ds_short_description']) if pd.notna(x['ds_short_description']) and x['ds_short_description'] else ''
+    # Damos peso duplicado para TAGS, pois elas definem melhor o jogo
+    return (
+            genres + ' ' + genres + ' ' +
+            tags + ' ' + tags + ' ' + tags + ' ' +
+            developers + ' ' +
+            publisher + ' ' +
+            short_desc
+    )
+
+
+TRAIN_QUERY = f"""
+        SELECT * \
+        FROM game
+        WHERE vl_recommendations >= {MIN_RECOMMENDATIONS} \
+        """
+
+
+def load_and_vectorize(n_jobs=-1):
+    """Treino em memória: tabela inteira num DataFrame + TF-IDF com vocabulário exato."""
     # Carregar dados
-    query = """
-            SELECT * \
-            FROM game
-            WHERE vl_recommendations >= 20 \
-            """
     print("📦 Carregando os jogos do SQL...")
-    df_treino = pd.read_sql(query, engine)
-
-    df_treino = df_treino.drop_duplicates(subset='nm_game', keep='first').reset_index(drop=True)
+    with metrics.stage('train.sql_read') as stage:
+        df_treino = pd.read_sql(TRAIN_QUERY, engine)
+        df_treino = df_treino.drop_duplicates(subset='nm_game', keep='first').reset_index(drop=True)
+        stage['rows'] = len(df_treino)
     print(f"Jogos para treino: {len(df_treino)}")
 
     # "Feature Soup"
     # Juntamos Gêneros, Tags, Desenvolvedores e Descrição numa única string
     print("🍲 Cozinhando a 'Sopa de Features' (NLP)...")
-    def create_soup(x):
-        # Tratamento para garantir que tudo seja string
-        genres = str(x['ds_genres']) if pd.notna(x['ds_genres']) and x['ds_genres'] else ''
-        tags = str(x['ds_tags']) if pd.notna(x['ds_tags']) and x['ds_tags'] else ''
-        developers = str(x['ds_developer']) if pd.notna(x['ds_developer']) and x['ds_developer'] else ''
-        publisher = str(x['ds_publisher']) if pd.notna(x['ds_publisher']) and x['ds_publisher'] else ''
-        short_desc = str(x['ds_short_description']) if pd.notna(x['ds_short_description']) and x['ds_short_description'] else ''
-        # Damos peso duplicado para TAGS, pois elas definem melhor o jogo
-        return (
-                genres + ' ' + genres + ' ' +
-                tags + ' ' + tags + ' ' + tags + ' ' +
-                developers + ' ' +
-                publisher + ' ' +
-                short_desc
-        )
-
-
-    df_treino['soup'] = df_treino.apply(create_soup, axis=1)
+    start = time.perf_counter()
+    with metrics.stage('train.soup', rows=len(df_treino)):
+        df_treino['soup'] = build_soup(df_treino)
+    print(f"   Sopa vetorizada em {time.perf_counter() - start:.2f}s")
 
     # NLP - stop-words: necessário para tirar o the, and
+    # Pesos por campo (gêneros 2x, tags 3x) aplicados nas contagens, sem duplicar texto
     print("🧮 Vetorizando com TF-IDF..")
-    tfidf = TfidfVectorizer(stop_words='english', min_df=5, ngram_range=(1, 2))
+    start = time.perf_counter()
+    tfidf = FieldTfidfVectorizer(stop_words='english', min_df=5, ngram_range=(1, 2), n_jobs=n_jobs)
+
+    with metrics.stage('train.tfidf', rows=len(df_treino)) as stage:
+        tfidf_matrix = tfidf.fit_transform(df_treino)
+        stage['n_terms'] = tfidf_matrix.shape[1]
+    print(f"Matriz Gerada: {tfidf_matrix.shape[0]} jogos x {tfidf_matrix.shape[1]} palavras/termos "
+          f"({time.perf_counter() - start:.2f}s)")
+    return df_treino, tfidf, tfidf_matrix
+
+
+def load_and_vectorize_streaming(chunksize=TRAIN_CHUNKSIZE, n_features=DEFAULT_N_FEATURES):
+    """
+    Treino out-of-core: lê a tabela em blocos, vetoriza cada bloco com hashing
+    (largura fixa) e acumula a frequência de documento. O texto de cada bloco é
+    descartado depois da vetorização; ficam só as contagens esparsas e o catálogo
+    sem as colunas de texto livre.
+    """
+    print(f"📦 Lendo os jogos do SQL em blocos de {chunksize} linhas (out-of-core)...")
+    start = time.perf_counter()
+    tfidf = HashedFieldTfidfVectorizer(stop_words='english', min_df=5, ngram_range=(1, 2), n_features=n_features)
+    seen_names = set()
+    count_blocks = []
+    catalog_blocks = []
+    reader = pd.read_sql(TRAIN_QUERY, engine, chunksize=chunksize)
+    for i in itertools.count(1):
+        with metrics.stage('train.sql_read', chunk=i) as stage:
+            chunk = next(reader, None)
+            if chunk is not None:
+                # Mesmo critério do treino em memória: primeiro jogo de cada nome
+                chunk = chunk.drop_duplicates(subset='nm_game', keep='first')
+                chunk = chunk[~chunk['nm_game'].isin(seen_names)]
+                seen_names.update(chunk['nm_game'])
+            stage['rows'] = 0 if chunk is None else len(chunk)
+        if chunk is None:
+            break
+
+        # A sopa por campo é montada dentro do vetorizador; o texto livre sai do bloco logo depois
+        with metrics.stage('train.tfidf', rows=len(chunk), chunk=i):
+            count_blocks.append(tfidf.partial_fit_transform(chunk))
+        catalog_blocks.append(chunk.drop(columns=TEXT_ONLY_COLUMNS, errors='ignore'))
+        print(f"   bloco {i}: {tfidf.n_docs_} jogos | pico RSS {peak_rss_mb():.0f} MB")
+
+    df_treino = pd.concat(catalog_blocks, ignore_index=True)
+    with metrics.stage('train.tfidf_finalize', rows=len(df_treino)) as stage:
+        tfidf_matrix = tfidf.finalize(count_blocks)
+        stage['n_terms'] = tfidf_matrix.shape[1]
+    del count_blocks
+    print(f"Jogos para treino: {len(df_treino)}")
+    print(f"Matriz Gerada: {tfidf_matrix.shape[0]} jogos x {tfidf_matrix.shape[1]} buckets de {n_features} "
+          f"({time.perf_counter() - start:.2f}s, pico RSS {peak_rss_mb():.0f} MB)")
+    return df_treino, tfidf, tfidf_matrix
+
+
+def train_model(memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, n_jobs=-1, knn_method='exact',
+                n_lists=None, n_probe=DEFAULT_N_PROBE, out_of_core=False, chunksize=TRAIN_CHUNKSIZE,
+                n_features=DEFAULT_N_FEATURES, embedding_rank=None, partitions=True):
+    """
+    knn_method='exact' calcula o all-pairs exato em blocos.
+    knn_method='ivf' usa o índice aproximado (n_lists/n_probe controlam recall x velocidade).
+    out_of_core=True lê o SQL em blocos e vetoriza com hashing (memória independente do vocabulário);
+    vizinhos e artefatos são os mesmos do treino em memória.
+    embedding_rank=N projeta o TF-IDF num embedding denso (SVD, N dimensões): vizinhos e busca
+    sob demanda passam a usar o embedding; a projeção é salva para vetorizar consultas novas.
+    partitions=True pré-calcula vizinhos dentro das partições de filtro mais comuns (filtros seletivos).
+    """
+    print("🧠 Iniciando treinamento...")
 
-    tfidf_matrix = tfidf.fit_transform(df_treino['soup'])
-    print(f"Matriz Gerada: {tfidf_matrix.shape[0]} jogos x {tfidf_matrix.shape[1]} palavras/termos")
+    if out_of_core:
+        df_treino, tfidf, tfidf_matrix = load_and_vectorize_streaming(chunksize=chunksize, n_features=n_features)
+    else:
+        df_treino, tfidf, tfidf_matrix = load_and_vectorize(n_jobs=n_jobs)
+
+    # Espaço da similaridade: o TF-IDF esparso ou, opcionalmente, o embedding denso
+    similarity_matrix = tfidf_matrix
+    embedding = projection = None
+    if embedding_rank:
+        with metrics.stage('train.embedding', rows=tfidf_matrix.shape[0], rank=embedding_rank):
+            embedding, projection, explained, svd_time = build_embedding(tfidf_matrix, rank=embedding_rank)
+        similarity_matrix = embedding
+        print(f"🧊 Embedding denso: {embedding.shape[1]} dimensões, variância explicada {explained:.1%} "
+              f"({svd_time:.1f}s, {embedding.nbytes / 1024 ** 2:.1f} MB)")
 
     # Cálculo de Similaridade (A Mágica)
     print("📐 Calculando similaridade de Cossenos...")
-    model_knn = NearestNeighbors(metric='cosine', algorithm='brute', n_jobs=-1)
-    model_knn.fit(tfidf_matrix)
-
-    distances, indices = model_knn.kneighbors(tfidf_matrix, n_neighbors=50)
+    ann_index = None
+    with metrics.stage('train.knn', rows=similarity_matrix.shape[0], method=knn_method):
+        if knn_method == 'ivf':
+            # Índice aproximado: cada jogo só é comparado com as listas mais próximas
+            ann_index, build_time = build_ann_index(similarity_matrix, n_lists=n_lists, n_probe=n_probe)
+            print(f"   Índice IVF: {ann_index.n_lists} listas, n_probe={ann_index.n_probe} ({build_time:.1f}s)")
+            distances, indices = ann_index.kneighbors_all(N_NEIGHBORS)
+        elif knn_method == 'exact':
+            # kNN em blocos: cada worker só materializa um bloco de scores por vez (memória limitada)
+            distances, indices, stats = blocked_kneighbors(
+                similarity_matrix, n_neighbors=N_NEIGHBORS, memory_budget_mb=memory_budget_mb,
+                n_jobs=n_jobs, return_stats=True
+            )
+            print(f"   {stats['n_blocks']} blocos de {stats['block_size']} linhas em {stats['n_jobs']} workers "
+                  f"({stats['wall_s']:.1f}s, pico {stats['peak_rss_worker_mb']:.0f} MB por worker)")
+        else:
+            raise ValueError(f"knn_method inválido: {knn_method} (use 'exact' ou 'ivf')")
+
+    # Vizinhos dentro das partições de filtro (SO x idade x nota), com o mesmo kNN em blocos
+    partition_arrays = None
+    if partitions and knn_method == 'ivf':
+        # As partições são um kNN exato: com o IVF, anulariam o ganho do índice aproximado
+        print("ℹ️  Partições de filtro desligadas com knn_method='ivf' (filtros seletivos usam a busca sob demanda).")
+    elif partitions:
+        with metrics.stage('train.partitions', rows=similarity_matrix.shape[0]) as stage:
+            partition_arrays = build_partitions(similarity_matrix, build_filter_columns(df_treino),
+                                                memory_budget_mb=memory_budget_mb, n_jobs=n_jobs)
+            stage['n_partitions'] = len(partition_arrays[0])
 
     # Salvar
-    print("💾 Salvando arquivos .pkl...")
-
-    # Criamos a pasta 'models' se não existir
-    if not os.path.exists('models'):
-        os.makedirs('models')
-
-    # Salvamos apenas a matriz de índices (N_jogos x 50)
-    with open('models/neighbors_indices.pkl', 'wb') as f:
-        pickle.dump(indices, f)
-    # Se quiser mostrar a % de match, salve 'distances' também
-    with open('models/neighbors_distances.pkl', 'wb') as f:
-        pickle.dump(distances, f)
-    # Salvamos o índice (O Mapa)
-    with open('models/dataframe.pkl', 'wb') as f:
-        pickle.dump(df_treino, f)
-    # O mapa de nomes
-    indices_map = pd.Series(df_treino.index, index=df_treino['nm_game'])
-    with open('models/indices_map.pkl', 'wb') as f:
-        pickle.dump(indices_map, f)
-
+    print("💾 Salvando artefatos...")
+
+    with metrics.stage('train.persist', rows=len(df_treino)):
+        # Criamos a pasta 'models' se não existir
+        if not os.path.exists('models'):
+            os.makedirs('models')
+
+        # Tudo é gravado numa pasta temporária e publicado de uma vez no fim do bloco, com o
+        # bundle único versionado por último (os apps em execução recarregam sozinhos).
+        # Partições/embedding de um treino anterior que não existem neste somem na publicação
+        with staged_models('models') as staging:
+            # Matriz de vizinhos (N_jogos x 50) em .npy mapeável (int32 + similaridade compacta)
+            save_neighbors(indices, distances, models_dir=staging)
+            # Colunas de filtro compactas (idade, aprovação, bitmask de SO) para o app
+            save_filter_columns(df_treino, models_dir=staging)
+            if partition_arrays is not None:
+                save_partitions(*partition_arrays, models_dir=staging)
+            # Vetorizador + matriz TF-IDF, para a busca sob demanda quando os filtros esgotam os 50 vizinhos
+            save_tfidf(tfidf, tfidf_matrix, models_dir=staging)
+            if embedding is not None:
+                save_embedding(embedding, projection, models_dir=staging)
+            if ann_index is not None:
+                save_ann_index(ann_index, models_dir=staging)
+            # Vocabulário de tags + matriz jogos x tags (explicabilidade e avaliação)
+            save_tag_matrix(df_treino, models_dir=staging)
+            # DataFrame dos jogos + mapa de nomes
+            save_catalog(df_treino, models_dir=staging)
+            # Índice de títulos para o typeahead (busca por prefixo e aproximada)
+            save_title_index(df_treino, models_dir=staging)
 
     print("✅ Modelo treinado e salvo na pasta 'models/'!")
 
 if __name__ == "__main__":
-    train_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Treino do modelo de recomendação")
+    parser.add_argument('--out-of-core', action='store_true',
+                        help="Lê o SQL em blocos e vetoriza com hashing (memória limitada).")
+    parser.add_argument('--chunksize', type=int, default=TRAIN_CHUNKSIZE, help="Linhas por bloco no modo out-of-core.")
+    parser.add_argument('--n-features', type=int, default=DEFAULT_N_FEATURES,
+                        help="Largura do espaço de hashing no modo out-of-core.")
+    parser.add_argument('--embedding-rank', type=int, default=None,
+                        help="Usa um embedding denso (SVD) com essa dimensão para os vizinhos e a busca.")
+    parser.add_argument('--no-partitions', action='store_true',
+                        help="Não pré-calcula os vizinhos por partição de filtro (SO, idade, nota).")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    metrics.configure()
+    if args.profile:
+        profiler.enable(args.profile)
+    # 'train' = o treino inteiro num relatório; 'train.knn' etc. = só a etapa
+    with profiler.profile('train'):
+        train_model(out_of_core=args.out_of_core, chunksize=args.chunksize, n_features=args.n_features,
+                    embedding_rank=args.embedding_rank, partitions=not args.no_partitions)
+    metrics.write_prometheus()
\ No newline at end of file
@@ -0,0 +1,162 @@
+import time
+import numpy as np
+from filters import filter_mask, OS_MAC, OS_LINUX, OS_ALL
+
+# Partições pré-computadas: vizinhos de cada jogo só entre os jogos que passam num filtro comum.
+# Cada partição é (SO aceito, idade máx, nota mín); todas as combinações abaixo são candidatas.
+PARTITION_OS = [OS_MAC, OS_LINUX, OS_ALL]      # Windows é quase o catálogo inteiro
+PARTITION_MAX_AGES = [0, 12, 16, 255]          # 255 = sem limite
+PARTITION_MIN_SCORES = [0, 50, 70, 80, 90]     # bandas de % de aprovação
+
+# Vizinhos guardados por jogo em cada partição
+PARTITION_NEIGHBORS = 20
+# Partições com mais que essa fração do catálogo não valem o espaço: os 50 vizinhos globais já bastam
+MAX_PARTITION_FRACTION = 0.5
+# Partições guardadas no máximo: cada uma custa N x PARTITION_NEIGHBORS x 6 bytes (~120 bytes por jogo).
+# Os filtros sem partição usam a mais estreita que os cobre ou os vizinhos globais + busca sob demanda
+MAX_PARTITIONS = 8
+
+# Colunas de partition_specs
+SPEC_OS, SPEC_MAX_AGE, SPEC_MIN_SCORE, SPEC_MEMBERS = range(4)
+
+
+def candidate_specs():
+    """Combinações (SO, idade máx, nota mín), sem a que não filtra nada."""
+    return [(os_bits, max_age, min_score)
+            for os_bits in PARTITION_OS for max_age in PARTITION_MAX_AGES for min_score in PARTITION_MIN_SCORES
+            if (os_bits, max_age, min_score) != (OS_ALL, 255, 0)]
+
+
+def restricted_axes(spec) -> int:
+    """Quantos eixos (SO, idade, nota) a partição restringe."""
+    os_bits, max_age, min_score = spec[:3]
+    return int(os_bits != OS_ALL) + int(max_age != 255) + int(min_score != 0)
+
+
+def partition_members(filter_columns, max_fraction=MAX_PARTITION_FRACTION, max_partitions=MAX_PARTITIONS):
+    """
+    (specs, membros) das partições candidatas que valem a pena (não vazias e seletivas), no máximo
+    max_partitions. Os filtros mais comuns vêm primeiro: um eixo só (um SO, uma faixa etária,
+    uma nota mínima), depois combinações de dois e de três.
+    """
+    n_games = len(filter_columns['age'])
+    specs, members = [], []
+    for os_bits, max_age, min_score in sorted(candidate_specs(), key=restricted_axes):
+        if len(specs) == max_partitions:
+            break
+        rows = np.flatnonzero(filter_mask(filter_columns, None, max_age, min_score, os_bits))
+        if 0 < len(rows) <= max_fraction * n_games:
+            specs.append((os_bits, max_age, min_score, len(rows)))
+            members.append(rows)
+    return np.array(specs, dtype=np.int32).reshape(-1, 4), members
+
+
+def build_partitions(X, filter_columns, n_neighbors=PARTITION_NEIGHBORS, max_fraction=MAX_PARTITION_FRACTION,
+                     max_partitions=MAX_PARTITIONS, memory_budget_mb=None, n_jobs=-1):
+    """
+    Para cada partição seletiva, o top-k de TODOS os jogos (as consultas não são filtradas)
+    entre os membros da partição, com o mesmo kNN em blocos do treino (blocked_kneighbors,
+    workers e orçamento de memória) restrito às colunas dos membros.
+    Retorna (specs, índices, similaridades):
+      specs (P, 4) int32: SO, idade máx, nota mín, nº de membros
+      índices (P, N, k) int32 e similaridades (P, N, k) float16, com -1/NaN onde faltam membros.
+    """
+    # Import local: o serving só usa choose_partitions e não precisa do scikit-learn nem do scipy
+    from blocked_knn import blocked_kneighbors, DEFAULT_MEMORY_BUDGET_MB
+
+    start_time = time.perf_counter()
+    specs, members = partition_members(filter_columns, max_fraction, max_partitions)
+    n_games = X.shape[0]
+    indices = np.full((len(specs), n_games, n_neighbors), -1, dtype=np.int32)
+    similarities = np.full((len(specs), n_games, n_neighbors), np.nan, dtype=np.float16)
+
+    for p, member_rows in enumerate(members):
+        # Posição de cada jogo dentro da partição (-1 = não é membro)
+        position = np.full(n_games, -1, dtype=np.int64)
+        position[member_rows] = np.arange(len(member_rows))
+        distances, neighbors = blocked_kneighbors(
+            X, n_neighbors=n_neighbors + 1, X_index=X[member_rows], query_ids=position,
+            memory_budget_mb=memory_budget_mb or DEFAULT_MEMORY_BUDGET_MB, n_jobs=n_jobs
+        )
+        # Para os membros o vizinho 0 é o próprio jogo, que nunca é vizinho dele mesmo
+        is_member = (position >= 0)[:, None]
+        neighbors = np.where(is_member, neighbors[:, 1:], neighbors[:, :-1])
+        distances = np.where(is_member, distances[:, 1:], distances[:, :-1])
+        width = neighbors.shape[1]
+        indices[p, :, :width] = member_rows[neighbors]
+        similarities[p, :, :width] = 1 - distances
+
+    size_mb = (indices.nbytes + similarities.nbytes + specs.nbytes) / 1024 ** 2
+    print(f"🧩 {len(specs)} partições de filtro ({n_neighbors} vizinhos por jogo): {size_mb:.1f} MB "
+          f"em {time.perf_counter() - start_time:.1f}s")
+    return specs, indices, similarities
+
+
+def choose_partitions(specs, limits) -> np.ndarray:
+    """
+    Partição mais estreita que contém todos os jogos aprovados por cada filtro
+    (limits (n, 3): idade máx, nota mín, SO). -1 = nenhuma: usa os vizinhos globais.
+    """
+    n = len(limits)
+    if len(specs) == 0 or n == 0:
+        return np.full(n, -1, dtype=np.int64)
+    max_age = limits[:, 0:1]
+    min_score = limits[:, 1:2]
+    os_bits = limits[:, 2:3].astype(np.int64)
+    # A partição é um superconjunto dos aprovados quando é no máximo tão restritiva quanto o filtro
+    covers = (
+        ((os_bits & ~specs[:, SPEC_OS].astype(np.int64)) == 0) &
+        (specs[:, SPEC_MAX_AGE] >= max_age) &
+        (specs[:, SPEC_MIN_SCORE] <= min_score)
+    )
+    members = np.where(covers, specs[:, SPEC_MEMBERS], np.iinfo(np.int32).max)
+    choice = members.argmin(axis=1)
+    return np.where(covers.any(axis=1), choice, -1)
+
+
+def benchmark_partitions(n_queries=200, k=5, seed=42):
+    """
+    Latência e % de consultas com k resultados: sem filtro x filtros seletivos,
+    com e sem as partições (engine.partitions = None usa só os vizinhos globais + busca sob demanda).
+    """
+    from recommender import RecommendationEngine
+
+    engine = RecommendationEngine.from_models_dir()
+    if engine.partitions is None:
+        print("⚠️ Modelo sem partições: rode o treino (sem --no-partitions) primeiro.")
+        return
+    specs, partition_indices, partition_similarities = engine.partitions
+    size_mb = (partition_indices.nbytes + partition_similarities.nbytes + specs.nbytes) / 1024 ** 2
+    global_mb = (engine.knn_indices.nbytes + engine.knn_similarities.nbytes) / 1024 ** 2
+    print(f"Partições: {len(specs)} | {size_mb:.1f} MB (vizinhos globais: {global_mb:.1f} MB)")
+
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(engine.n_games, size=min(n_queries, engine.n_games), replace=False)
+    engine.tfidf_matrix()  # a carga da matriz não entra na medição
+    scenarios = [
+        ('sem filtro', None),
+        ('Linux + idade <= 12', {'max_age': 12, 'os_bits': OS_LINUX}),
+        ('Mac + >= 90%', {'min_score': 90, 'os_bits': OS_MAC}),
+        ('livre + >= 80%', {'max_age': 0, 'min_score': 80}),
+    ]
+    print(f"{'CENÁRIO':<22} | {'MODO':<10} | {'p50 (ms)':>8} | {'p95 (ms)':>8} | {'COMPLETAS':>9}")
+    print("-" * 70)
+    saved = engine.partitions
+    for name, filters in scenarios:
+        for mode, partitions in [('global', None), ('partição', saved)]:
+            if filters is None and partitions is not None:
+                continue
+            engine.partitions = partitions
+            latencies, full = [], 0
+            for row in queries:
+                start = time.perf_counter()
+                indices, _ = engine.recommend_indices([row], filters, k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                full += int((indices[0] >= 0).sum() == k)
+            p50, p95 = np.percentile(latencies, [50, 95])
+            print(f"{name:<22} | {mode:<10} | {p50:>8.2f} | {p95:>8.2f} | {full / len(queries):>9.0%}")
+    engine.partitions = saved
+
+
+if __name__ == "__main__":
+    benchmark_partitions()
@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from profiling import profiler
+
+try:
+    import resource
+except ImportError:  # Windows não tem o módulo resource
+    resource = None
+
+# Instrumentação: JSON lines por etapa/requisição + snapshot no formato texto do Prometheus
+METRICS_DIR = 'metrics'
+STAGES_LOG = 'stages.jsonl'
+REQUESTS_LOG = 'requests.jsonl'
+PROMETHEUS_FILE = 'metrics.prom'
+METRIC_PREFIX = 'game_recommender'
+# JSON lines maiores que isso viram <arquivo>.1 (um backup só: no máximo ~2x o limite em disco)
+MAX_LOG_MB = 50
+# Intervalo do snapshot periódico (app): o arquivo não é reescrito a cada clique
+PROMETHEUS_INTERVAL_S = 15.0
+# Limites (s) do histograma de latência por fase das requisições
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def peak_rss_mb(children=False):
+    """Pico de memória residente (RSS) do processo atual, ou dos filhos já finalizados."""
+    if resource is None:
+        return float('nan')
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    rss = resource.getrusage(who).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    return rss / 1024 ** 2 if sys.platform == 'darwin' else rss / 1024
+
+
+def current_rss_mb():
+    """RSS atual (Linux, via /proc); NaN onde não existe."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return float('nan')
+
+
+def _children_cpu_s():
+    """CPU dos processos filhos já finalizados (pools de workers do kNN/TF-IDF)."""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+class Metrics:
+    """
+    Métricas do processo: tempo de parede, CPU (incluindo workers), pico de RSS e linhas
+    por etapa do pipeline; latência por fase (lookup, filtro, explicação) por requisição.
+    Os agregados ficam sempre em memória; as JSON lines só são gravadas depois de configure().
+
+        metrics.configure()                      # grava em metrics/
+        with metrics.stage('train.tfidf') as stage:
+            ...
+            stage['rows'] = matrix.shape[0]
+        metrics.observe_request('recommend', {'lookup': 0.0001, 'filter': 0.0004, 'explain': 0.002})
+        metrics.write_prometheus()               # ou start_prometheus_writer(): a cada 15 s
+    """
+
+    def __init__(self):
+        self.metrics_dir = None
+        self.max_log_bytes = MAX_LOG_MB * 1024 ** 2
+        self.stages = {}
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._writer = None
+
+    def configure(self, metrics_dir=METRICS_DIR, max_log_mb=MAX_LOG_MB):
+        self.metrics_dir = metrics_dir
+        self.max_log_bytes = max_log_mb * 1024 ** 2
+        return self
+
+    def _append(self, filename, record):
+        """Chamado com o lock. Acima de max_log_bytes, o arquivo é rotacionado para <arquivo>.1."""
+        if self.metrics_dir is None:
+            return
+        # A pasta só é criada na primeira gravação (nenhum módulo cria pastas no import)
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        path = os.path.join(self.metrics_dir, filename)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            size = f.tell()
+        if size > self.max_log_bytes:
+            os.replace(path, f"{path}.1")
+
+    @contextmanager
+    def stage(self, name, rows=None, **fields):
+        """
+        Mede uma etapa. O dict devolvido aceita 'rows' (e outros campos) preenchidos dentro do bloco.
+        peak_rss_mb é o pico do processo ao fim da etapa; rss_growth_mb, quanto a etapa elevou esse pico.
+        """
+        info = {'rows': rows, **fields}
+        peak_before = peak_rss_mb()
+        cpu_before = time.process_time() + _children_cpu_s()
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            # --profile: cProfile + tracemalloc só nas etapas selecionadas (desligado = uma checagem)
+            with profiler.profile(name):
+                yield info
+            status = 'ok'
+        finally:
+            wall_s = time.perf_counter() - start
+            cpu_s = time.process_time() + _children_cpu_s() - cpu_before
+            peak = max(peak_rss_mb(), peak_rss_mb(children=True))
+            record = {
+                'ts': time.strftime('%Y-%m-%dT%H:%M:%S'), 'kind': 'stage', 'stage': name, 'status': status,
+                'wall_s': round(wall_s, 4), 'cpu_s': round(cpu_s, 4),
+                'peak_rss_mb': round(peak, 1), 'rss_growth_mb': round(max(peak - peak_before, 0.0), 1),
+                'rss_mb': round(current_rss_mb(), 1), **info,
+            }
+            with self._lock:
+                totals = self.stages.setdefault(name, {'runs': 0, 'errors': 0, 'wall_s': 0.0, 'cpu_s': 0.0,
+                                                       'rows': 0, 'peak_rss_mb': 0.0})
+                totals['runs'] += 1
+                totals['errors'] += status != 'ok'
+                totals['wall_s'] += wall_s
+                totals['cpu_s'] += cpu_s
+                totals['rows'] += int(info['rows'] or 0)
+                totals['peak_rss_mb'] = max(totals['peak_rss_mb'], peak)
+                self._append(STAGES_LOG, record)
+
+    def observe_request(self, route, phases, n=1, **fields):
+        """Registra as fases (segundos) de uma requisição, ou de um lote de n requisições."""
+        total = sum(phases.values())
+        with self._lock:
+            for phase, seconds in [*phases.items(), ('total', total)]:
+                histogram = self.requests.setdefault((route, phase), {
+                    'count': 0, 'sum': 0.0, 'buckets': [0] * len(LATENCY_BUCKETS)})
+                histogram['count'] += n
+                # Num lote, cada requisição esperou o lote inteiro
+                histogram['sum'] += seconds * n
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if seconds <= bound:
+                        histogram['buckets'][i] += n
+            self._append(REQUESTS_LOG, {
+                'ts': round(time.time(), 3), 'kind': 'request', 'route': route, 'n': n,
+                'phases_ms': {phase: round(seconds * 1000, 3) for phase, seconds in phases.items()},
+                'total_ms': round(total * 1000, 3), **fields,
+            })
+
+    def prometheus_text(self) -> str:
+        """Snapshot no formato de exposição em texto do Prometheus."""
+        p = METRIC_PREFIX
+        lines = []
+        with self._lock:
+            stage_metrics = [
+                ('stage_runs_total', 'counter', 'Execuções da etapa', 'runs'),
+                ('stage_errors_total', 'counter', 'Execuções da etapa com erro', 'errors'),
+                ('stage_wall_seconds_total', 'counter', 'Tempo de parede da etapa', 'wall_s'),
+                ('stage_cpu_seconds_total', 'counter', 'Tempo de CPU da etapa (processo + workers)', 'cpu_s'),
+                ('stage_rows_total', 'counter', 'Linhas processadas pela etapa', 'rows'),
+                ('stage_peak_rss_megabytes', 'gauge', 'Pico de RSS do processo ao fim da etapa', 'peak_rss_mb'),
+            ]
+            for metric, kind, help_text, key in stage_metrics:
+                if not self.stages:
+                    break
+                lines += [f'# HELP {p}_{metric} {help_text}', f'# TYPE {p}_{metric} {kind}']
+                lines += [f'{p}_{metric}{_labels(stage=name)} {totals[key]:g}' for name, totals in self.stages.items()]
+
+            if self.requests:
+                metric = f'{p}_request_phase_seconds'
+                lines += [f'# HELP {metric} Latência por fase das requisições', f'# TYPE {metric} histogram']
+                for (route, phase), histogram in self.requests.items():
+                    for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+                        lines.append(f'{metric}_bucket{_labels(route=route, phase=phase, le=f"{bound:g}")} {count}')
+                    lines.append(f'{metric}_bucket{_labels(route=route, phase=phase, le="+Inf")} {histogram["count"]}')
+                    lines.append(f'{metric}_sum{_labels(route=route, phase=phase)} {histogram["sum"]:g}')
+                    lines.append(f'{metric}_count{_labels(route=route, phase=phase)} {histogram["count"]}')
+
+        lines += [f'# HELP {p}_process_peak_rss_megabytes Pico de RSS do processo',
+                  f'# TYPE {p}_process_peak_rss_megabytes gauge',
+                  f'{p}_process_peak_rss_megabytes {peak_rss_mb():g}',
+                  f'# HELP {p}_process_rss_megabytes RSS atual do processo',
+                  f'# TYPE {p}_process_rss_megabytes gauge',
+                  f'{p}_process_rss_megabytes {current_rss_mb():g}']
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path=None):
+        """Grava o snapshot (temporário + os.replace, para o coletor nunca ler um arquivo pela metade)."""
+        if path is None:
+            if self.metrics_dir is None:
+                return None
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            path = os.path.join(self.metrics_dir, PROMETHEUS_FILE)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+        return path
+
+    def start_prometheus_writer(self, interval_s=PROMETHEUS_INTERVAL_S):
+        """
+        Grava o snapshot a cada interval_s numa thread em segundo plano (uma por processo; chamadas
+        repetidas, como os reruns do Streamlit, não criam outra). Retorna a thread.
+        """
+        with self._lock:
+            if self._writer is not None:
+                return self._writer
+
+            def run():
+                while True:
+                    time.sleep(interval_s)
+                    self.write_prometheus()
+
+            self._writer = threading.Thread(target=run, name='metrics-prometheus-writer', daemon=True)
+            self._writer.start()
+            return self._writer
+
+
+# Instância única do processo (pipeline, app e API registram aqui)
+metrics = Metrics()
@@ -0,0 +1,214 @@
+import os
+import ast
+import json
+import time
+import hashlib
+from perf import metrics
+
+# Fingerprints de cada etapa (entradas e saídas) da última execução bem-sucedida
+STATE_FILE = 'pipeline_state.json'
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_HASH_CHUNK = 1024 * 1024
+
+
+def load_state(path=STATE_FILE):
+    if not os.path.exists(path):
+        return {'stages': {}, 'files': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_FILE):
+    # Temporário + os.replace: uma execução interrompida não deixa o estado pela metade
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def file_hash(path, cache):
+    """
+    SHA-256 do conteúdo de um arquivo (None se não existe).
+    O hash fica em cache por (tamanho, mtime): arquivos grandes só são relidos quando mudam no disco.
+    """
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    cached = cache.get(path)
+    if cached and cached['size'] == st.st_size and cached['mtime_ns'] == st.st_mtime_ns:
+        return cached['sha256']
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_CHUNK), b''):
+            digest.update(block)
+    cache[path] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': digest.hexdigest()}
+    return cache[path]['sha256']
+
+
+def code_dependencies(*modules) -> list:
+    """
+    Módulos de scripts/ que as etapas executam: os arquivos de `modules` e tudo o que eles importam
+    de scripts/, recursivamente (inclusive imports locais dentro de funções, ex.: benchmarks).
+    Na dúvida sobra módulo: rodar a etapa a mais é seguro, pular uma etapa desatualizada não.
+    Pacotes de fora (numpy, sklearn...) não entram: o fingerprint cobre só o código do projeto.
+    """
+    found = []
+    pending = list(modules)
+    while pending:
+        module = pending.pop()
+        if module in found:
+            continue
+        found.append(module)
+        with open(os.path.join(SCRIPTS_DIR, module), 'r', encoding='utf-8') as f:
+            tree = ast.parse(f.read(), filename=module)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                filename = f"{name.split('.')[0]}.py"
+                if os.path.exists(os.path.join(SCRIPTS_DIR, filename)):
+                    pending.append(filename)
+    return sorted(found)
+
+
+class Stage:
+    """
+    Etapa do pipeline. `inputs`/`outputs` são caminhos de arquivo; `config`, `input_values` e
+    `values` (funções que devolvem algo serializável, ex.: contagem de linhas ou hash de uma tabela)
+    também entram no fingerprint. O código da etapa (`code`, módulos em scripts/, em geral
+    montado com code_dependencies) conta como entrada: mudar o treino retreina.
+    """
+
+    def __init__(self, name, run, inputs=(), outputs=(), config=None, code=(), input_values=None, values=None):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.config = config or {}
+        self.code = list(code)
+        self.input_values = input_values or {}
+        self.values = values or {}
+
+    def input_fingerprint(self, cache):
+        return {
+            'files': {path: file_hash(path, cache) for path in self.inputs},
+            'code': {module: file_hash(os.path.join(SCRIPTS_DIR, module), cache) for module in self.code},
+            'values': {name: fn() for name, fn in self.input_values.items()},
+            'config': self.config,
+        }
+
+    def output_fingerprint(self, cache):
+        return {
+            'files': {path: file_hash(path, cache) for path in self.outputs},
+            'values': {name: fn() for name, fn in self.values.items()},
+        }
+
+
+def _digest(fingerprint):
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _changes(previous, current):
+    """Nomes (arquivo/config) que mudaram entre dois fingerprints, para o log."""
+    changed = [path for path, sha in current['files'].items() if previous.get('files', {}).get(path) != sha]
+    changed += [module for module, sha in current['code'].items() if previous.get('code', {}).get(module) != sha]
+    changed += [name for name, value in current['values'].items() if previous.get('values', {}).get(name) != value]
+    if previous.get('config') != current.get('config'):
+        changed.append('config')
+    return changed
+
+
+def stage_status(stage, state, cache):
+    """Retorna (precisa_rodar, motivo)."""
+    record = state['stages'].get(stage.name)
+    inputs = stage.input_fingerprint(cache)
+    missing_inputs = [path for path in stage.inputs if inputs['files'][path] is None]
+    outputs_present = all(os.path.exists(path) for path in stage.outputs)
+
+    if missing_inputs:
+        if outputs_present:
+            # Ex.: imagem sem o CSV bruto, mas com o data/games.zip versionado
+            return False, f"entrada ausente ({', '.join(missing_inputs)}); mantendo as saídas existentes"
+        raise FileNotFoundError(f"Etapa '{stage.name}': entrada ausente ({', '.join(missing_inputs)})")
+    if record is None:
+        return True, "nunca executada"
+    if not outputs_present:
+        return True, "saídas ausentes"
+    if record['inputs_digest'] != _digest(inputs):
+        return True, f"entradas mudaram ({', '.join(_changes(record['inputs'], inputs)) or 'fingerprint'})"
+    if record['outputs_digest'] != _digest(stage.output_fingerprint(cache)):
+        return True, "saídas alteradas fora do pipeline"
+    return False, "sem mudanças"
+
+
+def record_stage(stage, state, cache, elapsed_s=None):
+    inputs = stage.input_fingerprint(cache)
+    outputs = stage.output_fingerprint(cache)
+    state['stages'][stage.name] = {
+        'inputs': inputs, 'inputs_digest': _digest(inputs),
+        'outputs': outputs, 'outputs_digest': _digest(outputs),
+        'elapsed_s': elapsed_s,
+        'completed_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def run_pipeline(stages, force=(), state_path=STATE_FILE):
+    """
+    Roda as etapas em ordem, pulando as que não tiveram mudança nas entradas
+    (nem nas saídas). Uma etapa que roda muda as saídas, que são entradas da
+    próxima: a invalidação se propaga pelo grafo. `force` reexecuta etapas pelo nome.
+    """
+    names = [stage.name for stage in stages]
+    unknown = set(force) - set(names) - {'all'}
+    if unknown:
+        raise ValueError(f"Etapas desconhecidas: {', '.join(sorted(unknown))} (disponíveis: {', '.join(names)})")
+
+    state = load_state(state_path)
+    cache = state.setdefault('files', {})
+    summary = []
+    for stage in stages:
+        start = time.perf_counter()
+        if 'all' in force or stage.name in force:
+            should_run, reason = True, "forçada (--force)"
+        else:
+            should_run, reason = stage_status(stage, state, cache)
+
+        if not should_run:
+            print(f"⏭️  {stage.name}: pulada ({reason}) [{time.perf_counter() - start:.2f}s]")
+            summary.append((stage.name, 'pulada', time.perf_counter() - start))
+            continue
+
+        print(f"\n▶️  {stage.name}: executando ({reason})")
+        with metrics.stage(f'pipeline.{stage.name}'):
+            stage.run()
+        elapsed = time.perf_counter() - start
+        record_stage(stage, state, cache, elapsed)
+        # Estado salvo a cada etapa: uma falha depois não perde o que já foi feito
+        save_state(state, state_path)
+        print(f"✅ {stage.name}: concluída em {elapsed:.1f}s")
+        summary.append((stage.name, 'executada', elapsed))
+
+    save_state(state, state_path)
+    return summary
+
+
+def mark_current(stages, names, state_path=STATE_FILE):
+    """Registra o estado atual de etapas cujas saídas mudaram fora do grafo (ex.: --update)."""
+    state = load_state(state_path)
+    cache = state.setdefault('files', {})
+    for stage in stages:
+        if stage.name in names:
+            record_stage(stage, state, cache)
+    save_state(state, state_path)
+
+
+def clear_state(state_path=STATE_FILE):
+    if os.path.exists(state_path):
+        os.remove(state_path)
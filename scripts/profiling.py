@@ -0,0 +1,113 @@
+import os
+import io
+import time
+import pstats
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+
+# Relatórios de --profile: uma pasta com timestamp por execução
+PROFILES_DIR = 'profiles'
+# Linhas de cada relatório
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+# Profundidade do traceback guardado pelo tracemalloc em cada alocação
+TRACEMALLOC_FRAMES = 10
+
+
+class Profiler:
+    """
+    Perfil opcional (cProfile + tracemalloc) das etapas selecionadas. Desligado, cada etapa custa
+    só uma checagem. Etapas aninhadas (ex.: pipeline.train > train.knn) são perfiladas pela mais
+    externa selecionada: dois cProfile ativos ao mesmo tempo não funcionam.
+    Workers de multiprocessing (kNN com n_jobs > 1) não entram no perfil.
+
+        profiler.enable('train.knn,etl')    # ou 'all'
+        with profiler.profile('train.knn'):
+            ...
+    """
+
+    def __init__(self):
+        self.selection = None
+        self.output_dir = None
+        self._active = None
+        self._runs = {}
+
+    def enable(self, stages='all', profiles_dir=PROFILES_DIR):
+        """Seleciona as etapas (nomes ou prefixos separados por vírgula). A pasta só é criada no 1º relatório."""
+        self.selection = [name.strip() for name in stages.split(',') if name.strip()] or ['all']
+        self.output_dir = os.path.join(profiles_dir, time.strftime('%Y%m%d-%H%M%S'))
+        print(f"🔬 Profiling ligado ({', '.join(self.selection)}): relatórios em '{self.output_dir}/'")
+        return self
+
+    def wants(self, name) -> bool:
+        if self.selection is None or self._active is not None:
+            return False
+        return any(s == 'all' or name == s or name.startswith(s + '.') for s in self.selection)
+
+    @contextmanager
+    def profile(self, name):
+        if not self.wants(name):
+            yield
+            return
+
+        self._active = name
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - start
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            self._active = None
+            self._write_reports(name, profile, before, after, peak, elapsed)
+
+    def _write_reports(self, name, profile, before, after, peak, elapsed):
+        # Etapas repetidas (ex.: chunks do ETL em streaming) ganham sufixo: etl.sql_write.2, .3, ...
+        self._runs[name] = self._runs.get(name, 0) + 1
+        run = self._runs[name]
+        base = os.path.join(self.output_dir, name if run == 1 else f"{name}.{run}")
+        os.makedirs(self.output_dir, exist_ok=True)
+        # .prof binário: abre no snakeviz / pstats para navegar
+        profile.dump_stats(f"{base}.prof")
+
+        text = io.StringIO()
+        text.write(f"Etapa: {name} | {elapsed:.2f}s | pico de memória Python (tracemalloc): {peak / 1024 ** 2:.1f} MB\n")
+        for sort_key, title in [('cumulative', 'tempo acumulado'), ('tottime', 'tempo próprio')]:
+            text.write(f"\n=== Top {TOP_FUNCTIONS} funções por {title} ===\n")
+            pstats.Stats(profile, stream=text).strip_dirs().sort_stats(sort_key).print_stats(TOP_FUNCTIONS)
+        with open(f"{base}.txt", 'w', encoding='utf-8') as f:
+            f.write(text.getvalue())
+
+        # Alocações que ficaram vivas durante a etapa, agrupadas pela linha de origem
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        diff = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'lineno')
+        with open(f"{base}.alloc.txt", 'w', encoding='utf-8') as f:
+            f.write(f"Etapa: {name} | pico de memória Python: {peak / 1024 ** 2:.1f} MB\n")
+            f.write(f"=== Top {TOP_ALLOCATIONS} linhas por memória alocada (líquida) na etapa ===\n")
+            for stat in diff[:TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                f.write(f"{stat.size_diff / 1024 ** 2:>10.2f} MB | {stat.count_diff:>9} blocos | "
+                        f"{frame.filename}:{frame.lineno}\n")
+        print(f"🔬 Perfil de '{name}' ({elapsed:.1f}s, pico {peak / 1024 ** 2:.0f} MB): {base}.txt / .alloc.txt")
+
+
+def add_profile_argument(parser):
+    """Flag --profile comum a main.py e aos scripts de ETL/treino."""
+    parser.add_argument('--profile', nargs='?', const='all', default=None, metavar='ETAPAS',
+                        help="Perfila (cProfile + tracemalloc) as etapas informadas (ex.: 'train.knn,etl'; "
+                             f"sem valor = todas) e grava os relatórios em {PROFILES_DIR}/<timestamp>/.")
+
+
+# Instância única do processo (as etapas de perf.metrics passam por aqui)
+profiler = Profiler()
@@ -0,0 +1,398 @@
+import time
+import numpy as np
+import pandas as pd
+from artifacts import MODELS_DIR
+from filters import filter_mask, OS_ALL
+from perf import metrics
+from search import search_filtered_many, dense_scores, top_k_order
+from partitions import choose_partitions
+from model_bundle import bundle_exists, load_bundle, bundle_components
+from title_search import TitleIndex
+
+# Valores que não restringem nada quando um filtro não é informado
+DEFAULT_FILTERS = {'max_age': 255, 'min_score': 0, 'os_bits': OS_ALL}
+# Limites usados só para montar a máscara de linhas sem filtro (sobrescrita depois)
+UNFILTERED = (255, 0, OS_ALL)
+
+# Tags em comum exibidas por recomendação
+EXPLAIN_TAGS = 5
+
+
+# Adicionando explicabilidade
+def safe_first_genre(genres: str) -> str | None:
+    if pd.isna(genres) or genres is None or str(genres).strip() == "":
+        return None
+    g = str(genres).split(",")[0].strip()
+    return g if g else None
+
+
+def normalize_filters(filters) -> tuple | None:
+    """
+    Converte o dict de filtros ({'max_age', 'min_score', 'os_bits'}) em uma tupla
+    (idade máx, nota mín, máscara de SO). None = sem filtro nenhum.
+    """
+    if filters is None:
+        return None
+    merged = {**DEFAULT_FILTERS, **filters}
+    return int(merged['max_age']), float(merged['min_score']), int(merged['os_bits'])
+
+
+def engine_artifacts_exist(models_dir=MODELS_DIR) -> bool:
+    # O serving só lê o bundle: os artefatos soltos de models/ são para o treino/avaliação offline
+    return bundle_exists(models_dir)
+
+
+class RecommendationEngine:
+    """
+    Toda a lógica de recomendação fora do Streamlit: vizinhos pré-computados,
+    filtros, busca sob demanda e explicação (tags em comum, gênero, dev, publisher).
+
+        engine = RecommendationEngine.from_models_dir()
+        engine.recommend('ELDEN RING', {'max_age': 16, 'min_score': 80, 'os_bits': OS_WINDOWS}, k=5)
+        engine.recommend_many(titles, filters=None, k=10)
+    """
+
+    def __init__(self, knn_indices, knn_similarities, filter_columns, tag_index, df_games, indices_map,
+                 load_matrix=None, title_index=None, partitions=None):
+        self.knn_indices = knn_indices
+        self.knn_similarities = knn_similarities
+        self.filter_columns = filter_columns
+        # (vocabulário, matriz) ou uma função que os carrega no primeiro uso
+        self._tag_index = tag_index
+        self.df_games = df_games
+        self.indices_map = indices_map
+        self._load_matrix = load_matrix
+        self._tfidf_matrix = None
+        self._match_codes = None
+        self._appid_index = None
+        self._title_index = title_index
+        # (specs, índices, similaridades) das partições de filtro, ou None (modelos sem partições)
+        self.partitions = partitions
+        self.load_times = {}
+        self.version = None
+
+    @classmethod
+    def from_models_dir(cls, models_dir=MODELS_DIR):
+        """
+        Engine do bundle versionado de models/ (todos os artefatos da mesma versão).
+        Sem fallback para os arquivos soltos: eles são trocados um a um na publicação.
+        """
+        if not bundle_exists(models_dir):
+            raise FileNotFoundError(f"Bundle do modelo não encontrado em '{models_dir}': rode o treino "
+                                    f"ou 'python model_bundle.py' para empacotar os artefatos existentes")
+        return cls.from_bundle(models_dir)
+
+    @classmethod
+    def from_bundle(cls, models_dir=MODELS_DIR, verify=False):
+        """
+        Engine a partir do bundle único (mmap zero-copy); a matriz TF-IDF vem do mesmo arquivo.
+        Os checksums já foram conferidos no write_bundle: verify=True relê o arquivo inteiro.
+        """
+        start = time.perf_counter()
+        manifest, arrays, blobs = load_bundle(models_dir, verify=verify)
+        bundle_time = time.perf_counter() - start
+        components = bundle_components(manifest, arrays, blobs)
+
+        knn_indices, knn_similarities = components['neighbors']
+        df_games, indices_map = components['catalog']
+        engine = cls(knn_indices, knn_similarities, components['filters'], components['tags'], df_games, indices_map,
+                     load_matrix=components['tfidf_matrix'], title_index=components['titles'],
+                     partitions=components['partitions'])
+        engine.load_times = {'bundle': bundle_time, 'objects': time.perf_counter() - start - bundle_time}
+        engine.version = manifest['version']
+        return engine
+
+    @property
+    def n_games(self) -> int:
+        return self.knn_indices.shape[0]
+
+    def tfidf_matrix(self):
+        """Matriz da busca sob demanda: TF-IDF esparso ou o embedding denso, quando o modelo tem um."""
+        if self._tfidf_matrix is None and self._load_matrix is not None:
+            self._tfidf_matrix = self._load_matrix()
+        return self._tfidf_matrix
+
+    def _tags(self):
+        if callable(self._tag_index):
+            self._tag_index = self._tag_index()
+        return self._tag_index
+
+    @property
+    def tag_vocab(self):
+        return self._tags()[0]
+
+    @property
+    def tag_matrix(self):
+        """Matriz jogos x tags, montada na primeira explicação (o scipy não entra no import do app)."""
+        return self._tags()[1]
+
+    @property
+    def title_index(self):
+        # Modelos treinados antes do índice de títulos: monta em memória a partir do catálogo
+        if self._title_index is None:
+            self._title_index = TitleIndex.build(self.df_games['nm_game'], self.df_games['vl_recommendations'])
+        return self._title_index
+
+    def search_titles(self, query, limit=10) -> list:
+        """Typeahead: títulos do catálogo mais parecidos com o texto digitado."""
+        rows, _ = self.title_index.search(query, limit=limit)
+        return self.df_games['nm_game'].iloc[rows].tolist()
+
+    def resolve_title(self, title):
+        """Título exato do catálogo para um texto (com caixa/pontuação/erro de digitação) ou None."""
+        if title in self.indices_map.index:
+            return title
+        row = self.title_index.resolve(title)
+        return None if row is None else self.df_games['nm_game'].iloc[row]
+
+    def rows_for_titles(self, titles):
+        """Linhas do catálogo para cada título (-1 quando o título não existe)."""
+        return self.indices_map.reindex(list(titles)).fillna(-1).to_numpy(dtype=np.int64)
+
+    def recommend_indices(self, rows, filters=None, k=5):
+        """
+        Núcleo em lote: (índices, similaridades) de shape (n, k) para cada linha de entrada.
+        filters pode ser um dict (vale para todas as linhas), None (sem filtro) ou uma
+        lista com um dict/None por linha, para lotes com pedidos diferentes.
+        Os vizinhos de todas as linhas são lidos de uma vez (gather nos arrays de vizinhos)
+        e filtrados com uma única máscara. Linhas com filtro leem da partição pré-computada mais
+        estreita que cobre o filtro, quando existe uma. Só as linhas que ficam com menos de k
+        resultados passam pela busca sob demanda. Posições sem resultado ficam com -1 / NaN.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if filters is None or isinstance(filters, dict):
+            row_filters = [normalize_filters(filters)] * len(rows)
+        else:
+            filters = list(filters)
+            if len(filters) != len(rows):
+                raise ValueError(f"filters tem {len(filters)} itens para {len(rows)} linhas (um por linha)")
+            row_filters = [normalize_filters(f) for f in filters]
+        neighbors = np.asarray(self.knn_indices[rows, 1:], dtype=np.int64)
+        similarities = np.asarray(self.knn_similarities[rows, 1:], dtype=np.float32)
+
+        unfiltered = np.array([f is None for f in row_filters], dtype=bool)
+        if unfiltered.all():
+            mask = np.ones(neighbors.shape, dtype=bool)
+        else:
+            # Limites de cada linha como colunas (n, 1): a máscara sai por broadcasting
+            limits = np.array([f if f is not None else UNFILTERED for f in row_filters], dtype=np.float64)
+            if self.partitions is not None:
+                neighbors, similarities = self._partition_neighbors(rows, limits, unfiltered, neighbors, similarities)
+            # -1 = posição vazia numa partição com poucos membros
+            mask = filter_mask(self.filter_columns, np.maximum(neighbors, 0), limits[:, 0:1], limits[:, 1:2],
+                               limits[:, 2:3].astype(np.int64)) & (neighbors >= 0)
+            mask[unfiltered] = True
+
+        # Os k primeiros vizinhos aprovados de cada linha, mantendo a ordem do ranking
+        rank = np.cumsum(mask, axis=1)
+        keep = mask & (rank <= k)
+        out_indices = np.full((len(rows), k), -1, dtype=np.int64)
+        out_similarities = np.full((len(rows), k), np.nan, dtype=np.float32)
+        r, c = np.nonzero(keep)
+        out_indices[r, rank[r, c] - 1] = neighbors[r, c]
+        out_similarities[r, rank[r, c] - 1] = similarities[r, c]
+
+        # Todo jogo fora da lista pré-computada é menos similar que ela,
+        # então os resultados da busca sob demanda entram depois, sem reordenar
+        found = rank[:, -1] if rank.shape[1] > 0 else np.zeros(len(rows), dtype=np.int64)
+        short = np.flatnonzero((found < k) & ~unfiltered)
+        if len(short) > 0 and self._load_matrix is not None:
+            # Todas as linhas curtas numa busca em lote (um produto esparso por bloco)
+            extras = search_filtered_many(
+                self.tfidf_matrix(), self.filter_columns, rows[short], [row_filters[i] for i in short],
+                [k - int(found[i]) for i in short], [neighbors[i][neighbors[i] >= 0] for i in short]
+            )
+            for i, (extra_indices, extra_similarities) in zip(short, extras):
+                n_found = int(found[i])
+                out_indices[i, n_found:n_found + len(extra_indices)] = extra_indices
+                out_similarities[i, n_found:n_found + len(extra_indices)] = extra_similarities
+
+        return out_indices, out_similarities
+
+    def _partition_neighbors(self, rows, limits, unfiltered, neighbors, similarities):
+        """
+        Troca a lista global pela lista da partição escolhida nas linhas com filtro.
+        Todos os jogos aprovados pelo filtro são membros da partição, então a ordem dela
+        é a mesma do ranking filtrado (e a busca sob demanda continua logo depois).
+        """
+        specs, partition_indices, partition_similarities = self.partitions
+        chosen = choose_partitions(specs, limits)
+        chosen[unfiltered] = -1
+        use = np.flatnonzero(chosen >= 0)
+        if len(use) == 0:
+            return neighbors, similarities
+
+        width = partition_indices.shape[2]
+        if width > neighbors.shape[1]:
+            pad = width - neighbors.shape[1]
+            neighbors = np.pad(neighbors, ((0, 0), (0, pad)), constant_values=-1)
+            similarities = np.pad(similarities, ((0, 0), (0, pad)), constant_values=np.nan)
+        neighbors[use] = -1
+        similarities[use] = np.nan
+        neighbors[use, :width] = partition_indices[chosen[use], rows[use]]
+        similarities[use, :width] = partition_similarities[chosen[use], rows[use]]
+        return neighbors, similarities
+
+    def _codes(self):
+        """Códigos inteiros (calculados uma vez) para comparar gênero, dev e publisher sem strings."""
+        if self._match_codes is None:
+            df = self.df_games
+            genres = df['ds_genres'].astype('string').str.split(',').str[0].str.strip()
+            self._match_codes = {
+                'genre': pd.factorize(genres.where(genres != ''))[0],
+                'dev': pd.factorize(df['ds_developer'].astype('string').str.strip().str.lower())[0],
+                'pub': pd.factorize(df['ds_publisher'].astype('string').str.strip().str.lower())[0],
+            }
+        return self._match_codes
+
+    def match_flags(self, seed_rows, rec_rows) -> dict:
+        """Mesmo gênero (1º da lista) / dev / publisher para cada par, vetorizado. Nulo nunca bate."""
+        seed_rows = np.asarray(seed_rows)
+        rec_rows = np.asarray(rec_rows)
+        flags = {}
+        for name, codes in self._codes().items():
+            seed_codes = codes[seed_rows]
+            flags[name] = (seed_codes >= 0) & (seed_codes == codes[rec_rows])
+        return flags
+
+    def common_tags(self, seed_rows, rec_rows, k=EXPLAIN_TAGS) -> list:
+        """Tags em comum (ordem alfabética, no máximo k) de cada par, via produto elemento a elemento das linhas."""
+        common = self.tag_matrix[np.asarray(seed_rows)].multiply(self.tag_matrix[np.asarray(rec_rows)]).tocsr()
+        common.sort_indices()
+        starts = common.indptr[:-1]
+        stops = np.minimum(common.indptr[1:], starts + k)
+        return [self.tag_vocab[common.indices[a:b]].tolist() for a, b in zip(starts, stops)]
+
+    def explain(self, seed_rows, rec_rows) -> pd.DataFrame:
+        """Colunas explain_* exibidas pelo app para cada par (jogo escolhido, recomendado)."""
+        flags = self.match_flags(seed_rows, rec_rows)
+        return pd.DataFrame({
+            'explain_common_tags': self.common_tags(seed_rows, rec_rows),
+            'explain_genre_match': flags['genre'],
+            'explain_dev_match': flags['dev'],
+            'explain_pub_match': flags['pub'],
+        })
+
+    def recommend(self, title, filters=None, k=5) -> pd.DataFrame:
+        """
+        Recomendações de um jogo, com as colunas completas do catálogo,
+        match_score e os motivos (explain_*). Título desconhecido -> KeyError.
+        """
+        start = time.perf_counter()
+        idx = int(self.indices_map[title])
+        lookup_done = time.perf_counter()
+        rec_indices, rec_similarities = self.recommend_indices([idx], filters, k)
+        valid = rec_indices[0] >= 0
+        rec_indices, rec_similarities = rec_indices[0][valid], rec_similarities[0][valid]
+        filter_done = time.perf_counter()
+
+        recommended = self.df_games.iloc[rec_indices].copy()
+        recommended['match_score'] = rec_similarities.astype(float)
+        explanation = self.explain(np.full(len(rec_indices), idx), rec_indices)
+        for col in explanation.columns:
+            recommended[col] = explanation[col].to_numpy()
+        metrics.observe_request('recommend', {
+            'lookup': lookup_done - start, 'filter': filter_done - lookup_done,
+            'explain': time.perf_counter() - filter_done,
+        }, filtered=filters is not None, results=len(rec_indices))
+        return recommended
+
+    def rows_for_appids(self, appids):
+        """Linhas do catálogo para cada appid (cd_game); -1 quando o jogo não está no modelo."""
+        if self._appid_index is None:
+            self._appid_index = pd.Index(self.df_games['cd_game'].to_numpy())
+        return self._appid_index.get_indexer(np.asarray(list(appids), dtype=np.int64))
+
+    def recommend_library(self, appids, filters=None, k=10, weights=None) -> pd.DataFrame:
+        """
+        Recomendações para uma biblioteca inteira (lista de appids/cd_game que o usuário já tem).
+        As linhas dos jogos da biblioteca (peso opcional por jogo, ex.: horas jogadas) viram um
+        vetor de perfil, e o catálogo é pontuado num único produto matriz-vetor: o custo depende
+        do tamanho do catálogo, não da biblioteca. Jogos da biblioteca nunca são recomendados.
+        explain_seed = jogo da biblioteca mais parecido com cada recomendação (base dos motivos).
+        Nenhum appid no catálogo -> KeyError. Sem resultados (filtros) -> DataFrame vazio com as mesmas colunas.
+        """
+        start = time.perf_counter()
+        rows = self.rows_for_appids(appids)
+        weights = np.ones(len(rows), dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+        known = rows >= 0
+        if not known.any():
+            raise KeyError("nenhum appid da biblioteca está no catálogo do modelo")
+        if not known.all():
+            print(f"⚠️ {int((~known).sum())} appids fora do catálogo do modelo")
+        rows, weights = rows[known], weights[known]
+        lookup_done = time.perf_counter()
+        matrix = self.tfidf_matrix()
+        if matrix is None:
+            raise RuntimeError("Modelo sem matriz TF-IDF/embedding: recomendação por biblioteca indisponível")
+
+        # Perfil denso (soma ponderada das linhas) + um produto catálogo x perfil
+        profile = np.asarray(matrix[rows].T @ weights, dtype=np.float32).ravel()
+        norm = np.linalg.norm(profile)
+        scores = matrix @ (profile / norm) if norm > 0 else np.zeros(self.n_games, dtype=np.float32)
+        scores = np.asarray(scores, dtype=np.float32).ravel()
+
+        limits = normalize_filters(filters)
+        eligible = (filter_mask(self.filter_columns, None, *limits) if limits is not None
+                    else np.ones(self.n_games, dtype=bool))
+        eligible[rows] = False
+        candidates = np.flatnonzero(eligible & (scores > 0))
+        rec_rows = candidates[top_k_order(scores[candidates], k)]
+        filter_done = time.perf_counter()
+
+        recommended = self.df_games.iloc[rec_rows]
+        # Motivos: comparados com o jogo da biblioteca mais parecido com cada recomendação
+        # (sem resultados, o explain sai vazio e as colunas continuam as mesmas)
+        seed_rows = rows[dense_scores(matrix[rec_rows] @ matrix[rows].T).argmax(axis=1)]
+        extra = self.explain(seed_rows, rec_rows)
+        extra.insert(0, 'match_score', scores[rec_rows].astype(float))
+        extra.insert(1, 'explain_seed', self.df_games['nm_game'].to_numpy()[seed_rows])
+        extra.index = recommended.index
+        # Uma concatenação só (inserir coluna por coluna no DataFrame largo custa mais que o scoring)
+        recommended = pd.concat([recommended, extra], axis=1)
+        # Na biblioteca, 'filter' inclui o perfil e o produto no catálogo
+        metrics.observe_request('library', {
+            'lookup': lookup_done - start, 'filter': filter_done - lookup_done,
+            'explain': time.perf_counter() - filter_done,
+        }, library_size=len(rows), results=len(rec_rows))
+        return recommended
+
+    def recommend_many(self, titles, filters=None, k=5, explain=True) -> pd.DataFrame:
+        """
+        Recomendações para milhares de jogos numa chamada (campanhas, jobs offline, avaliação).
+        Uma linha por par (jogo de entrada, recomendação), em ordem de ranking.
+        Títulos fora do catálogo são ignorados (com a lista de filtros, o filtro deles também).
+        """
+        titles = list(titles)
+        rows = self.rows_for_titles(titles)
+        known = rows >= 0
+        if not known.all():
+            print(f"⚠️ {int((~known).sum())} títulos não encontrados no catálogo")
+        rows = rows[known]
+        if filters is not None and not isinstance(filters, dict):
+            filters = list(filters)
+            if len(filters) != len(titles):
+                raise ValueError(f"filters tem {len(filters)} itens para {len(titles)} títulos (um por título)")
+            # Um filtro por título: descarta os mesmos que os títulos para não trocar os pares
+            filters = [f for f, ok in zip(filters, known) if ok]
+
+        rec_indices, rec_similarities = self.recommend_indices(rows, filters, k)
+        seed_pos, rank = np.nonzero(rec_indices >= 0)
+        seed_rows = rows[seed_pos]
+        rec_rows = rec_indices[seed_pos, rank]
+
+        cd_game = self.df_games['cd_game'].to_numpy()
+        nm_game = self.df_games['nm_game'].to_numpy()
+        result = pd.DataFrame({
+            'seed_row': seed_rows,
+            'seed_cd_game': cd_game[seed_rows],
+            'seed_nm_game': nm_game[seed_rows],
+            'rank': rank + 1,
+            'rec_row': rec_rows,
+            'cd_game': cd_game[rec_rows],
+            'nm_game': nm_game[rec_rows],
+            'match_score': rec_similarities[seed_pos, rank],
+        })
+        if explain:
+            result = pd.concat([result, self.explain(seed_rows, rec_rows)], axis=1)
+        return result
@@ -1,12 +1,18 @@
 import pandas as pd
 import zipfile
 import os
+import argparse
+from perf import metrics
+from profiling import profiler, add_profile_argument
 
 # Configuração
 INPUT_CSV = 'data/games_march2025_full.csv'
 OUTPUT_CSV = 'data/games_filtered.csv'
 OUTPUT_ZIP = 'data/games.zip'
 
+# Filtro de qualidade: jogos com poucas recomendações ficam de fora
+MIN_RECOMMENDATIONS = 50
+
 # Essas são as únicas colunas O elt lê
 COLS_TO_KEEP = [
     'appid', 'name', 'release_date', 'price', 'header_image',
@@ -21,32 +27,40 @@ def minify_dataset():
     print(f"Lendo monstro: {INPUT_CSV}...")
 
     # Lê APENAS o necessário
-    try:
-        df = pd.read_csv(INPUT_CSV, usecols=lambda c: c in COLS_TO_KEEP, on_bad_lines='skip')
-    except ValueError:
-        # Fallback caso alguma coluna tenha nome ligeiramente diferente
-        print("⚠️ Aviso: Alguma coluna não foi encontrada. Lendo tudo e filtrando depois...")
-        df = pd.read_csv(INPUT_CSV, on_bad_lines='skip')
-        existing_cols = [c for c in COLS_TO_KEEP if c in df.columns]
-        df = df[existing_cols]
+    with metrics.stage('minify.csv_read') as stage:
+        try:
+            df = pd.read_csv(INPUT_CSV, usecols=lambda c: c in COLS_TO_KEEP, on_bad_lines='skip')
+        except ValueError:
+            # Fallback caso alguma coluna tenha nome ligeiramente diferente
+            print("⚠️ Aviso: Alguma coluna não foi encontrada. Lendo tudo e filtrando depois...")
+            df = pd.read_csv(INPUT_CSV, on_bad_lines='skip')
+            existing_cols = [c for c in COLS_TO_KEEP if c in df.columns]
+            df = df[existing_cols]
+        stage['rows'] = len(df)
 
     print(f"Linhas Originais: {len(df)}")
 
     # REMOVER JOGOS IRRELEVANTES (Filtro de Qualidade)
-    df_clean = df[df['recommendations'] >= 50].copy()
+    with metrics.stage('minify.cleaning') as stage:
+        df_clean = df[df['recommendations'] >= MIN_RECOMMENDATIONS].copy()
+        stage['rows'] = len(df_clean)
 
     print(f"Linhas após limpeza: {len(df_clean)}")
 
-    # SALVAR CSV LIMPO
-    print("Salvando CSV reduzido...")
-    df_clean.to_csv(OUTPUT_CSV, index=False)
+    with metrics.stage('minify.persist', rows=len(df_clean)):
+        # SALVAR CSV LIMPO
+        print("Salvando CSV reduzido...")
+        df_clean.to_csv(OUTPUT_CSV, index=False)
 
-    # ZIPAR COM COMPRESSÃO MÁXIMA
-    print("Comprimindo ao máximo...")
-    with zipfile.ZipFile(OUTPUT_ZIP, 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
-        zf.write(OUTPUT_CSV, arcname='games.csv')
+        # ZIPAR COM COMPRESSÃO MÁXIMA
+        print("Comprimindo ao máximo...")
+        # Data fixa no cabeçalho do zip: mesmo CSV -> mesmo arquivo (o pipeline compara por hash do conteúdo)
+        with zipfile.ZipFile(OUTPUT_ZIP, 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+            with open(OUTPUT_CSV, 'rb') as f:
+                zf.writestr(zipfile.ZipInfo('games.csv', date_time=(1980, 1, 1, 0, 0, 0)), f.read(),
+                            compress_type=zipfile.ZIP_DEFLATED, compresslevel=9)
 
-    os.remove(OUTPUT_CSV)
+        os.remove(OUTPUT_CSV)
 
     size_mb = os.path.getsize(OUTPUT_ZIP) / (1024 * 1024)
     print(f"✅ Sucesso! Novo tamanho do arquivo: {size_mb:.2f} MB")
@@ -60,4 +74,12 @@ def minify_dataset():
 
 
 if __name__ == "__main__":
-    minify_dataset()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Reduz o CSV bruto do Kaggle ao zip usado pelo ETL")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    metrics.configure()
+    if args.profile:
+        profiler.enable(args.profile)
+    with profiler.profile('minify'):
+        minify_dataset()
+    metrics.write_prometheus()
\ No newline at end of file
@@ -0,0 +1,114 @@
+import time
+import threading
+from collections import OrderedDict
+from recommender import normalize_filters
+
+# Listas de recomendação guardadas (cada uma ~k linhas do catálogo: poucos KB)
+MAX_ENTRIES = 4096
+# Jogos mais populares (vl_recommendations) pré-calculados quando um modelo é carregado
+WARM_TITLES = 200
+
+
+class ResultCache:
+    """
+    Cache LRU, compartilhado pelo processo inteiro (todas as sessões do app), das listas
+    já calculadas por engine.recommend. Chave: (jogo, filtros normalizados, k).
+
+    As entradas valem para um engine só: quando chega outro (bundle novo via HotReloader,
+    reinstalação), o cache é esvaziado. Os DataFrames devolvidos são compartilhados: só leitura.
+
+        cache = ResultCache()
+        cache.recommend(engine, 'ELDEN RING', {'max_age': 18, 'min_score': 50, 'os_bits': OS_ALL}, k=5)
+        cache.stats()
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._engine = None
+        self._warmed_engine = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.warm_seconds = None
+
+    @staticmethod
+    def key(title, filters=None, k=5) -> tuple:
+        return title, normalize_filters(filters), int(k)
+
+    def _bind(self, engine):
+        """Chamado com o lock: um engine diferente do atual invalida tudo."""
+        if engine is not self._engine:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self._engine = engine
+
+    def recommend(self, engine, title, filters=None, k=5):
+        """engine.recommend com cache. O cálculo roda fora do lock: outras sessões não esperam."""
+        key = self.key(title, filters, k)
+        with self._lock:
+            self._bind(engine)
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        result = engine.recommend(title, filters, k)
+        with self._lock:
+            # Se o modelo foi trocado durante o cálculo, o resultado antigo não entra
+            if engine is self._engine:
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return result
+
+    def warm(self, engine, filters=None, k=5, n_titles=WARM_TITLES):
+        """Pré-calcula os jogos mais populares; os mais populares entram por último (mais recentes no LRU)."""
+        start = time.perf_counter()
+        df = engine.df_games
+        top = df['nm_game'].iloc[df['vl_recommendations'].to_numpy().argsort()[::-1][:n_titles]]
+        for title in reversed(top.tolist()):
+            if self._engine is not None and engine is not self._engine:
+                return
+            self.recommend(engine, title, filters, k)
+        self.warm_seconds = time.perf_counter() - start
+        print(f"🔥 Cache pré-aquecido com {len(top)} jogos populares em {self.warm_seconds:.2f}s")
+
+    def warm_in_background(self, engine, filters=None, k=5, n_titles=WARM_TITLES):
+        """Dispara warm() numa thread, uma vez por engine. Retorna a thread (ou None se já foi feito)."""
+        with self._lock:
+            if engine is self._warmed_engine:
+                return None
+            self._warmed_engine = engine
+        thread = threading.Thread(target=self.warm, args=(engine, filters, k, n_titles),
+                                  name='result-cache-warm', daemon=True)
+        thread.start()
+        return thread
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._engine = None
+            self._warmed_engine = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'model_version': getattr(self._engine, 'version', None),
+                'warm_seconds': self.warm_seconds,
+            }
@@ -0,0 +1,137 @@
+import time
+import numpy as np
+from filters import filter_mask, OS_MAC
+
+# Meta de latência para a busca sob demanda (filtros muito seletivos)
+LATENCY_TARGET_MS = 20
+# Limite de scores densos (catálogo x consultas) por produto na busca em lote (~64 MB em float64)
+MAX_BATCH_SCORES = 8_000_000
+
+
+def dense_scores(scores):
+    """Scores como array denso: a matriz pode ser o TF-IDF esparso ou o embedding denso."""
+    # Duck typing em vez de sp.issparse: o scipy fica fora dos imports do serving
+    return scores.toarray() if hasattr(scores, 'toarray') else np.asarray(scores)
+
+
+def top_k_order(scores, k):
+    """Seleção parcial (argpartition) e ordenação apenas dos k vencedores."""
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def search_filtered(tfidf_matrix, filter_columns, query_idx, max_age, min_score, os_bits, k, exclude=None):
+    """
+    Busca os k jogos mais similares a query_idx entre os que passam nos filtros.
+    Os filtros são aplicados ANTES da similaridade: só as linhas elegíveis da matriz
+    TF-IDF são pontuadas, então quanto mais seletivo o filtro, mais barata a busca.
+    """
+    eligible = filter_mask(filter_columns, None, max_age, min_score, os_bits)
+    eligible[query_idx] = False
+    if exclude is not None and len(exclude) > 0:
+        eligible[np.asarray(exclude)] = False
+
+    candidates = np.flatnonzero(eligible)
+    if len(candidates) == 0:
+        return candidates, np.empty(0, dtype=np.float32)
+
+    # As linhas do TF-IDF já são normalizadas (L2): produto escalar = cosseno
+    query = tfidf_matrix[query_idx]
+    scores = dense_scores(tfidf_matrix[candidates] @ query.T).ravel()
+
+    order = top_k_order(scores, k)
+    return candidates[order], scores[order].astype(np.float32)
+
+
+def search_filtered_many(tfidf_matrix, filter_columns, query_rows, row_filters, ks, excludes):
+    """
+    Versão em lote do search_filtered: um único produto esparso catálogo x consultas
+    (em blocos de até MAX_BATCH_SCORES) e depois máscara + top-k por consulta.
+    row_filters[i] = (idade máx, nota mín, SO). Retorna uma lista de (índices, similaridades).
+    """
+    query_rows = np.asarray(query_rows)
+    n_games = tfidf_matrix.shape[0]
+    block = max(1, MAX_BATCH_SCORES // max(n_games, 1))
+    results = []
+    for start in range(0, len(query_rows), block):
+        rows = query_rows[start:start + block]
+        scores = dense_scores(tfidf_matrix @ tfidf_matrix[rows].T)
+        for j, query_idx in enumerate(rows):
+            i = start + j
+            eligible = filter_mask(filter_columns, None, *row_filters[i])
+            eligible[query_idx] = False
+            if excludes[i] is not None and len(excludes[i]) > 0:
+                eligible[np.asarray(excludes[i])] = False
+
+            candidates = np.flatnonzero(eligible)
+            candidate_scores = scores[candidates, j]
+            order = top_k_order(candidate_scores, ks[i])
+            results.append((candidates[order], candidate_scores[order].astype(np.float32)))
+    return results
+
+
+def find_similar(knn_indices, knn_similarities, filter_columns, idx, max_age, min_score, os_bits,
+                 k=5, load_matrix=None):
+    """
+    Retorna (índices, similaridades) dos k melhores jogos que passam nos filtros.
+
+    1ª página: os 50 vizinhos pré-computados, filtrados com uma máscara.
+    2ª página (só se faltar resultado): busca sob demanda no TF-IDF com os filtros
+    empurrados para dentro do scan. load_matrix é chamado apenas nesse caso.
+    """
+    neighbor_indices = np.asarray(knn_indices[idx][1:])
+    neighbor_similarities = np.asarray(knn_similarities[idx][1:], dtype=np.float32)
+
+    mask = filter_mask(filter_columns, neighbor_indices, max_age, min_score, os_bits)
+    winners = np.flatnonzero(mask)[:k]
+    result_indices = neighbor_indices[winners]
+    result_similarities = neighbor_similarities[winners]
+
+    if len(winners) < k and load_matrix is not None:
+        # Todo jogo fora da lista pré-computada é menos similar que ela,
+        # então os novos resultados entram depois, sem reordenar
+        extra_indices, extra_similarities = search_filtered(
+            load_matrix(), filter_columns, idx, max_age, min_score, os_bits,
+            k - len(winners), exclude=neighbor_indices
+        )
+        result_indices = np.concatenate([result_indices, extra_indices])
+        result_similarities = np.concatenate([result_similarities, extra_similarities])
+
+    return result_indices, result_similarities
+
+
+def benchmark_selective_filters(n_queries=200, k=5, seed=42):
+    """Mede a latência da busca com filtros bem restritivos (idade <= 12, só Mac, >= 90%)."""
+    from artifacts import load_neighbors, load_filter_columns, load_tfidf_matrix
+
+    knn_indices, knn_similarities = load_neighbors()
+    filter_columns = load_filter_columns()
+    tfidf_matrix = load_tfidf_matrix()
+
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(knn_indices.shape[0], size=min(n_queries, knn_indices.shape[0]), replace=False)
+
+    latencies = []
+    full = 0
+    for idx in queries:
+        start = time.perf_counter()
+        found, _ = find_similar(knn_indices, knn_similarities, filter_columns, idx,
+                                max_age=12, min_score=90, os_bits=OS_MAC, k=k,
+                                load_matrix=lambda: tfidf_matrix)
+        latencies.append((time.perf_counter() - start) * 1000)
+        full += len(found) == k
+
+    latencies = np.array(latencies)
+    p50, p95 = np.percentile(latencies, [50, 95])
+    print(f"Consultas: {len(queries)} | com {k} resultados: {full / len(queries):.0%}")
+    print(f"p50: {p50:.2f} ms | p95: {p95:.2f} ms | máx: {latencies.max():.2f} ms")
+    status = "✅" if p95 < LATENCY_TARGET_MS else "⚠️"
+    print(f"{status} Meta: p95 < {LATENCY_TARGET_MS} ms")
+
+
+if __name__ == "__main__":
+    benchmark_selective_filters()
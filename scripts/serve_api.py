@@ -0,0 +1,317 @@
+import json
+import time
+import asyncio
+import argparse
+import functools
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+from artifacts import MODELS_DIR
+from recommender import RecommendationEngine, normalize_filters
+from model_bundle import HotReloader
+from perf import metrics, METRICS_DIR
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8000
+
+# Micro-batching: requisições que chegam juntas viram uma única chamada em lote ao engine
+MAX_BATCH = 256        # maior lote processado de uma vez
+MAX_WAIT_MS = 1.0      # quanto o primeiro pedido do lote espera por companhia
+MAX_K = 50
+# Maior biblioteca aceita em /library
+MAX_LIBRARY = 20000
+
+
+class MicroBatcher:
+    """
+    Junta pedidos concorrentes em lotes e resolve cada lote com um único
+    engine.recommend_indices (gather vetorizado) + engine.explain.
+    Roda dentro do event loop: sem threads, um núcleo.
+    Com um HotReloader, cada lote usa o engine mais recente (troca entre lotes, nunca no meio de um).
+    """
+
+    def __init__(self, engine, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, reloader=None):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.reloader = reloader
+        self.pending = []
+        self.flush_handle = None
+        self.n_requests = 0
+        self.n_batches = 0
+        self.set_engine(engine)
+
+    def set_engine(self, engine):
+        self.engine = engine
+        self.cd_game = engine.df_games['cd_game'].tolist()
+        self.nm_game = engine.df_games['nm_game'].tolist()
+
+    def submit(self, title, filters, k) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((title, filters, k, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.max_wait, self.flush)
+        return future
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        self.n_batches += 1
+        self.n_requests += len(batch)
+        if self.reloader is not None and self.reloader.engine is not self.engine:
+            self.set_engine(self.reloader.engine)
+
+        # Filtros vão por linha: só pedidos com k diferentes viram chamadas separadas
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[2], []).append(item)
+        for k, items in groups.items():
+            try:
+                self._resolve(items, k)
+            except Exception as e:
+                for *_, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _resolve(self, items, k):
+        engine = self.engine
+        start = time.perf_counter()
+        rows = engine.rows_for_titles([item[0] for item in items])
+        # Sem o título exato: mesma resolução do app (caixa, pontuação, erro de digitação) pelo TitleIndex
+        for i in np.flatnonzero(rows < 0):
+            row = engine.title_index.resolve(items[i][0])
+            rows[i] = -1 if row is None else row
+        known = np.flatnonzero(rows >= 0)
+        lookup_done = time.perf_counter()
+        rec_indices, rec_similarities = engine.recommend_indices(rows[known], [items[i][1] for i in known], k)
+        filter_done = time.perf_counter()
+
+        seed_pos, rank = np.nonzero(rec_indices >= 0)
+        seed_rows = rows[known][seed_pos]
+        rec_rows = rec_indices[seed_pos, rank]
+        explanation = engine.explain(seed_rows, rec_rows)
+        common_tags = explanation['explain_common_tags'].tolist()
+        genre_match = explanation['explain_genre_match'].tolist()
+        dev_match = explanation['explain_dev_match'].tolist()
+        pub_match = explanation['explain_pub_match'].tolist()
+        scores = rec_similarities[seed_pos, rank].tolist()
+
+        results = [[] for _ in known]
+        for i, (pos, rec) in enumerate(zip(seed_pos.tolist(), rec_rows.tolist())):
+            results[pos].append({
+                'cd_game': self.cd_game[rec], 'nm_game': self.nm_game[rec], 'match_score': scores[i],
+                'common_tags': common_tags[i], 'genre_match': genre_match[i],
+                'dev_match': dev_match[i], 'pub_match': pub_match[i],
+            })
+
+        # Uma linha por lote: cada pedido do lote esperou as três fases inteiras
+        metrics.observe_request('api_recommend', {
+            'lookup': lookup_done - start, 'filter': filter_done - lookup_done,
+            'explain': time.perf_counter() - filter_done,
+        }, n=len(items), k=k)
+
+        known_pos = {int(p): j for j, p in enumerate(known)}
+        for i, (title, _, _, future) in enumerate(items):
+            if future.done():
+                continue
+            if i in known_pos:
+                future.set_result((HTTPStatus.OK, {'title': title, 'resolved_title': self.nm_game[rows[i]],
+                                                   'recommendations': results[known_pos[i]]}))
+            else:
+                future.set_result((HTTPStatus.NOT_FOUND, {'error': f"jogo não encontrado: {title}"}))
+
+
+def parse_request_params(method, target, body) -> tuple:
+    """Lê (título, filtros, k) da query string (GET) ou do corpo JSON (POST)."""
+    if method == 'POST':
+        params = json.loads(body or b'{}')
+        filters = params.get('filters')
+    else:
+        query = {key: values[0] for key, values in parse_qs(urlsplit(target).query).items()}
+        params = query
+        keys = ('max_age', 'min_score', 'os_bits')
+        filters = {key: query[key] for key in keys if key in query} or None
+    title = params.get('title')
+    if not title:
+        raise ValueError("parâmetro 'title' é obrigatório")
+    k = int(params.get('k', 5))
+    if not 1 <= k <= MAX_K:
+        raise ValueError(f"k deve estar entre 1 e {MAX_K}")
+    if filters is not None:
+        normalize_filters(filters)  # valida os tipos antes de entrar no lote
+    return title, filters, k
+
+
+def parse_library_params(method, target, body) -> tuple:
+    """Lê (appids, pesos, filtros, k) de /library: JSON {"appids": [...], "weights": [...]} ou ?appids=1,2,3."""
+    if method == 'POST':
+        params = json.loads(body or b'{}')
+        appids = params.get('appids') or []
+        weights = params.get('weights')
+        filters = params.get('filters')
+    else:
+        params = {key: values[0] for key, values in parse_qs(urlsplit(target).query).items()}
+        appids = [token for token in params.get('appids', '').split(',') if token.strip()]
+        weights = None
+        keys = ('max_age', 'min_score', 'os_bits')
+        filters = {key: params[key] for key in keys if key in params} or None
+    appids = [int(appid) for appid in appids]
+    if not appids:
+        raise ValueError("parâmetro 'appids' é obrigatório")
+    if len(appids) > MAX_LIBRARY:
+        raise ValueError(f"no máximo {MAX_LIBRARY} appids por biblioteca")
+    if weights is not None and len(weights) != len(appids):
+        raise ValueError("'weights' deve ter um peso por appid")
+    k = int(params.get('k', 10))
+    if not 1 <= k <= MAX_K:
+        raise ValueError(f"k deve estar entre 1 e {MAX_K}")
+    if filters is not None:
+        normalize_filters(filters)
+    return appids, weights, filters, k
+
+
+def library_response(engine, appids, weights, filters, k) -> dict:
+    """Corpo de /library (roda numa thread do executor, fora do event loop)."""
+    recommendations = engine.recommend_library(appids, filters=filters, k=k, weights=weights)
+    columns = {'cd_game': 'cd_game', 'nm_game': 'nm_game', 'match_score': 'match_score',
+               'seed': 'explain_seed', 'common_tags': 'explain_common_tags',
+               'genre_match': 'explain_genre_match', 'dev_match': 'explain_dev_match',
+               'pub_match': 'explain_pub_match'}
+    values = [recommendations[column].tolist() for column in columns.values()]
+    records = [dict(zip(columns, row)) for row in zip(*values)]
+    return {'n_library': len(appids), 'recommendations': records}
+
+
+class RecommendationServer:
+    """Servidor HTTP/1.1 mínimo (asyncio, keep-alive) com as rotas /health, /recommend e /library."""
+
+    def __init__(self, engine, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, reloader=None):
+        self.batcher = MicroBatcher(engine, max_batch=max_batch, max_wait_ms=max_wait_ms, reloader=reloader)
+        self.started_at = time.time()
+
+    @property
+    def engine(self):
+        return self.batcher.engine
+
+    async def route(self, method, target, body):
+        path = urlsplit(target).path
+        if path == '/health':
+            return HTTPStatus.OK, {
+                'status': 'ok',
+                'model_version': self.engine.version,
+                'n_games': int(self.engine.n_games),
+                'uptime_s': round(time.time() - self.started_at, 1),
+                'requests': self.batcher.n_requests,
+                'batches': self.batcher.n_batches,
+                'avg_batch_size': round(self.batcher.n_requests / max(self.batcher.n_batches, 1), 2),
+            }
+        if path == '/metrics':
+            # Snapshot no formato texto do Prometheus (etapas e latência por fase)
+            return HTTPStatus.OK, metrics.prometheus_text()
+        if path == '/recommend':
+            if method not in ('GET', 'POST'):
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'use GET ou POST'}
+            try:
+                title, filters, k = parse_request_params(method, target, body)
+            except (ValueError, TypeError, KeyError) as e:
+                return HTTPStatus.BAD_REQUEST, {'error': str(e)}
+            return await self.batcher.submit(title, filters, k)
+        if path == '/library':
+            if method not in ('GET', 'POST'):
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'use GET ou POST'}
+            try:
+                appids, weights, filters, k = parse_library_params(method, target, body)
+            except (ValueError, TypeError, KeyError) as e:
+                return HTTPStatus.BAD_REQUEST, {'error': str(e)}
+            # Um único produto matriz-vetor por biblioteca, fora do micro-batching. Roda no executor:
+            # uma biblioteca grande não segura os lotes de /recommend que estão no event loop
+            loop = asyncio.get_running_loop()
+            try:
+                payload = await loop.run_in_executor(
+                    None, functools.partial(library_response, self.engine, appids, weights, filters, k))
+            except KeyError as e:
+                return HTTPStatus.NOT_FOUND, {'error': e.args[0]}
+            return HTTPStatus.OK, payload
+        return HTTPStatus.NOT_FOUND, {'error': f"rota desconhecida: {path}"}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+
+                try:
+                    status, payload = await self.route(method, target, body)
+                except Exception as e:
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+
+                if isinstance(payload, str):
+                    data, content_type = payload.encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+                else:
+                    data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                    content_type = 'application/json; charset=utf-8'
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        print(f"🌐 Servindo {self.engine.n_games} jogos em http://{host}:{port} (rotas: /health, /metrics, /recommend, /library)")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API JSON de recomendações (asyncio, micro-batching)")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help="Maior lote por chamada ao engine.")
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS,
+                        help="Espera máxima para formar um lote (ms).")
+    parser.add_argument('--no-reload', action='store_true', help="Não recarrega o modelo quando o bundle muda.")
+    parser.add_argument('--metrics-dir', default=METRICS_DIR,
+                        help="Pasta das métricas por requisição (JSON lines); '' desliga a gravação.")
+    args = parser.parse_args()
+    if args.metrics_dir:
+        metrics.configure(args.metrics_dir)
+
+    reloader = HotReloader(RecommendationEngine.from_models_dir, args.models_dir)
+    if not args.no_reload:
+        reloader.start()
+    server = RecommendationServer(reloader.engine, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms,
+                                  reloader=reloader)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n👋 Servidor encerrado.")
@@ -0,0 +1,269 @@
+import os
+import time
+import argparse
+import multiprocessing
+from functools import reduce
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, HashingVectorizer
+from sklearn.preprocessing import normalize
+
+# Campos da "sopa" e o peso de cada um. Antes o peso era dado duplicando o texto
+# (gêneros 2x, tags 3x); agora ele multiplica as contagens de cada campo na vetorização.
+FIELD_WEIGHTS = {
+    'ds_genres': 2,
+    'ds_tags': 3,
+    'ds_developer': 1,
+    'ds_publisher': 1,
+    'ds_short_description': 1,
+}
+
+# Abaixo disso o custo de subir o pool de processos é maior que o ganho
+PARALLEL_MIN_ROWS = 20000
+
+# Espaço de features com hashing (treino out-of-core): largura fixa, sem vocabulário em memória
+DEFAULT_N_FEATURES = 2 ** 20
+
+
+def field_texts(df, fields=FIELD_WEIGHTS) -> dict:
+    """Texto de cada campo como coluna de strings ('' quando vazio/nulo), sem apply por linha."""
+    return {field: df[field].where(df[field].notna() & (df[field] != ''), '').astype(str) for field in fields}
+
+
+def build_soup(df, weights=FIELD_WEIGHTS):
+    """
+    Sopa de features vetorizada (operações por coluna). Com os pesos padrão o texto é
+    idêntico ao do create_soup antigo: cada campo repetido `peso` vezes, separado por espaço.
+    """
+    texts = field_texts(df, weights)
+    parts = [texts[field] for field, weight in weights.items() for _ in range(weight)]
+    return reduce(lambda a, b: a + ' ' + b, parts)
+
+
+def _count_fields(args):
+    """
+    Contagens por campo de um bloco de linhas. Sem vocabulário, aprende o do bloco
+    (fit); com vocabulário, só conta os termos dele (transform). Roda nos workers.
+    """
+    texts, params, vocabulary = args
+    n_rows = len(texts[0])
+    stacked = [text for field in texts for text in field]
+    vectorizer = CountVectorizer(vocabulary=vocabulary, **params)
+    try:
+        counts = vectorizer.fit_transform(stacked) if vocabulary is None else vectorizer.transform(stacked)
+    except ValueError:
+        # Bloco sem nenhum termo (ex.: só stop words)
+        return np.array([], dtype=object), [sp.csr_matrix((n_rows, 0), dtype=np.int64)] * len(texts)
+    terms = np.array(vectorizer.get_feature_names_out(), dtype=object) if vocabulary is None else None
+    return terms, [counts[i * n_rows:(i + 1) * n_rows] for i in range(len(texts))]
+
+
+class FieldTfidfVectorizer:
+    """
+    TF-IDF com peso por campo, no lugar de duplicar texto na sopa.
+    Cada campo é tokenizado separadamente (vocabulário compartilhado) e a contagem
+    final é a soma ponderada das contagens dos campos; o IDF e o min_df usam a
+    presença do termo no jogo, como o TfidfVectorizer sobre a sopa. Bigramas não
+    atravessam a fronteira entre campos. Tokenização em paralelo com n_jobs.
+    """
+
+    def __init__(self, field_weights=FIELD_WEIGHTS, stop_words='english', min_df=5, ngram_range=(1, 2),
+                 n_jobs=1, parallel_min_rows=PARALLEL_MIN_ROWS):
+        self.field_weights = dict(field_weights)
+        self.stop_words = stop_words
+        self.min_df = min_df
+        self.ngram_range = ngram_range
+        self.n_jobs = n_jobs
+        self.parallel_min_rows = parallel_min_rows
+
+    def get_params(self, deep=False):
+        return {'field_weights': self.field_weights, 'stop_words': self.stop_words, 'min_df': self.min_df,
+                'ngram_range': self.ngram_range, 'n_jobs': self.n_jobs}
+
+    def _count_params(self):
+        return {'stop_words': self.stop_words, 'ngram_range': self.ngram_range}
+
+    def _map_chunks(self, df, vocabulary):
+        """Divide as linhas em blocos e conta cada um (em processos quando o catálogo é grande)."""
+        texts = field_texts(df, self.field_weights)
+        n_rows = len(df)
+        n_jobs = os.cpu_count() if self.n_jobs in (None, -1) else max(1, self.n_jobs)
+        if n_rows < self.parallel_min_rows:
+            n_jobs = 1
+        bounds = np.linspace(0, n_rows, n_jobs + 1).astype(int)
+        chunks = [([texts[field].iloc[start:stop].tolist() for field in self.field_weights],
+                   self._count_params(), vocabulary)
+                  for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+        if len(chunks) <= 1:
+            return [_count_fields(chunk) for chunk in chunks]
+        with multiprocessing.Pool(len(chunks)) as pool:
+            return pool.map(_count_fields, chunks, chunksize=1)
+
+    def _weighted(self, field_counts):
+        weights = list(self.field_weights.values())
+        return sum(weight * counts.astype(np.float64) for weight, counts in zip(weights, field_counts)).tocsr()
+
+    def fit_transform(self, df):
+        results = self._map_chunks(df, vocabulary=None)
+
+        if len(results) == 1:
+            terms, field_counts = results[0]
+        else:
+            # Vocabulário global = união dos vocabulários dos blocos; colunas de cada bloco remapeadas
+            terms = np.array(sorted(set().union(*(chunk_terms for chunk_terms, _ in results))), dtype=object)
+            term_id = {term: i for i, term in enumerate(terms)}
+            remapped = []
+            for chunk_terms, counts in results:
+                column_of = np.fromiter((term_id[t] for t in chunk_terms), dtype=np.int64, count=len(chunk_terms))
+                remapped.append([sp.csr_matrix((m.data, column_of[m.indices], m.indptr), shape=(m.shape[0], len(terms)))
+                                 for m in counts])
+            field_counts = [sp.vstack([counts[i] for counts in remapped]).tocsr()
+                            for i in range(len(self.field_weights))]
+
+        weighted = self._weighted(field_counts)
+        weighted.sum_duplicates()
+        # min_df sobre os jogos (presença em qualquer campo), como na sopa
+        doc_freq = np.bincount(weighted.indices, minlength=len(terms))
+        keep = np.flatnonzero(doc_freq >= self.min_df)
+        weighted = weighted[:, keep]
+        self.vocabulary_ = {term: i for i, term in enumerate(terms[keep])}
+
+        self.tfidf_ = TfidfTransformer(norm='l2', use_idf=True, smooth_idf=True)
+        return self.tfidf_.fit_transform(weighted)
+
+    def fit(self, df):
+        self.fit_transform(df)
+        return self
+
+    def transform(self, df):
+        results = self._map_chunks(df, vocabulary=self.vocabulary_)
+        field_counts = [sp.vstack([counts[i] for _, counts in results]).tocsr() for i in range(len(self.field_weights))]
+        return self.tfidf_.transform(self._weighted(field_counts))
+
+    def get_feature_names_out(self):
+        return np.array(sorted(self.vocabulary_, key=self.vocabulary_.get), dtype=object)
+
+
+class HashedFieldTfidfVectorizer:
+    """
+    Versão out-of-core do FieldTfidfVectorizer: os termos vão para um espaço de
+    largura fixa (hashing), então cada bloco de linhas é vetorizado sozinho.
+    A frequência de documento é acumulada bloco a bloco (partial_fit_transform);
+    no fim, finalize() aplica min_df, IDF e normalização L2 nas contagens.
+    Só as contagens esparsas ficam em memória, nunca o texto bruto.
+    """
+
+    def __init__(self, field_weights=FIELD_WEIGHTS, stop_words='english', min_df=5, ngram_range=(1, 2),
+                 n_features=DEFAULT_N_FEATURES):
+        self.field_weights = dict(field_weights)
+        self.stop_words = stop_words
+        self.min_df = min_df
+        self.ngram_range = ngram_range
+        self.n_features = n_features
+        self.doc_freq_ = np.zeros(n_features, dtype=np.int64)
+        self.n_docs_ = 0
+
+    def get_params(self, deep=False):
+        return {'field_weights': self.field_weights, 'stop_words': self.stop_words, 'min_df': self.min_df,
+                'ngram_range': self.ngram_range, 'n_features': self.n_features}
+
+    def _counts(self, df):
+        """Contagens ponderadas por campo de um bloco, no espaço com hashing (float32)."""
+        hasher = HashingVectorizer(n_features=self.n_features, stop_words=self.stop_words,
+                                   ngram_range=self.ngram_range, alternate_sign=False, norm=None)
+        texts = field_texts(df, self.field_weights)
+        counts = sum(weight * hasher.transform(texts[field]) for field, weight in self.field_weights.items())
+        counts = sp.csr_matrix(counts, dtype=np.float32)
+        counts.sum_duplicates()
+        return counts
+
+    def partial_fit_transform(self, df):
+        """Contagens de um bloco + acumula a frequência de documento (presença por jogo)."""
+        counts = self._counts(df)
+        self.doc_freq_ += np.bincount(counts.indices, minlength=self.n_features)
+        self.n_docs_ += counts.shape[0]
+        return counts
+
+    def finalize(self, count_blocks):
+        """min_df + IDF (mesma fórmula do TfidfTransformer com smooth_idf) + L2 sobre os blocos de contagens."""
+        self.kept_buckets_ = np.flatnonzero(self.doc_freq_ >= self.min_df)
+        self.idf_ = (np.log((1 + self.n_docs_) / (1 + self.doc_freq_[self.kept_buckets_])) + 1).astype(np.float32)
+        # A frequência por bucket só é necessária durante o treino
+        self.doc_freq_ = None
+        return sp.vstack([self._weigh(block) for block in count_blocks]).tocsr()
+
+    def _weigh(self, counts):
+        column_of = np.searchsorted(self.kept_buckets_, counts.indices)
+        column_of = np.minimum(column_of, max(len(self.kept_buckets_) - 1, 0))
+        valid = (self.kept_buckets_[column_of] == counts.indices) if len(self.kept_buckets_) else \
+            np.zeros(len(counts.indices), dtype=bool)
+        # Remove as entradas de buckets cortados pelo min_df e reindexa as colunas
+        row_of = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+        matrix = sp.csr_matrix((counts.data[valid] * self.idf_[column_of[valid]], (row_of[valid], column_of[valid])),
+                               shape=(counts.shape[0], len(self.kept_buckets_)), dtype=np.float32)
+        return normalize(matrix, norm='l2', copy=False)
+
+    def transform(self, df):
+        return self._weigh(self._counts(df))
+
+
+def vectorize(vectorizer, df):
+    """TF-IDF de linhas novas com o vetorizador salvo (também os antigos, treinados sobre a sopa)."""
+    if isinstance(vectorizer, (FieldTfidfVectorizer, HashedFieldTfidfVectorizer)):
+        return vectorizer.transform(df)
+    return vectorizer.transform(build_soup(df))
+
+
+def compare_soup_methods(df, n_jobs=-1):
+    """
+    Tempo da etapa sopa + TF-IDF: antes (apply por linha + TfidfVectorizer com texto
+    duplicado) e depois (sopa vetorizada + pesos por campo, com e sem pool de processos).
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from model_training import create_soup
+
+    results = {}
+    start = time.perf_counter()
+    legacy_soup = df.apply(create_soup, axis=1)
+    results['soup_apply_s'] = time.perf_counter() - start
+    start = time.perf_counter()
+    legacy = TfidfVectorizer(stop_words='english', min_df=5, ngram_range=(1, 2)).fit_transform(legacy_soup)
+    results['tfidf_soup_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    soup = build_soup(df)
+    results['soup_vectorized_s'] = time.perf_counter() - start
+    results['soup_identical'] = bool((soup == legacy_soup).all())
+
+    for label, jobs in [('serial', 1), ('pool', n_jobs)]:
+        start = time.perf_counter()
+        matrix = FieldTfidfVectorizer(n_jobs=jobs, parallel_min_rows=0).fit_transform(df)
+        results[f'tfidf_fields_{label}_s'] = time.perf_counter() - start
+
+    results['terms_soup'] = legacy.shape[1]
+    results['terms_fields'] = matrix.shape[1]
+
+    before = results['soup_apply_s'] + results['tfidf_soup_s']
+    after = results['soup_vectorized_s'] + min(results['tfidf_fields_serial_s'], results['tfidf_fields_pool_s'])
+    print(f"Jogos: {len(df)} | termos: {results['terms_soup']} (sopa duplicada) -> {results['terms_fields']} (pesos por campo)")
+    print(f"{'ETAPA':<36} | {'TEMPO (s)':>9}")
+    print("-" * 50)
+    print(f"{'sopa: apply por linha':<36} | {results['soup_apply_s']:>9.3f}")
+    print(f"{'sopa: vetorizada':<36} | {results['soup_vectorized_s']:>9.3f}")
+    print(f"{'TF-IDF: sopa duplicada':<36} | {results['tfidf_soup_s']:>9.3f}")
+    print(f"{'TF-IDF: pesos por campo (serial)':<36} | {results['tfidf_fields_serial_s']:>9.3f}")
+    print(f"{'TF-IDF: pesos por campo (pool)':<36} | {results['tfidf_fields_pool_s']:>9.3f}")
+    print(f"⏱️ Etapa sopa + TF-IDF: {before:.2f}s -> {after:.2f}s | sopa idêntica à antiga: {results['soup_identical']}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara a sopa por linha com a vetorizada (pesos por campo)")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="Processos da tokenização em paralelo.")
+    args = parser.parse_args()
+
+    from model_training import engine, MIN_RECOMMENDATIONS
+    games = pd.read_sql(f"SELECT * FROM game WHERE vl_recommendations >= {MIN_RECOMMENDATIONS}", engine)
+    games = games.drop_duplicates(subset='nm_game', keep='first').reset_index(drop=True)
+    compare_soup_methods(games, n_jobs=args.n_jobs)
@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+from artifacts import MODELS_DIR
+
+# Meta de prontidão de uma réplica nova: imports do engine + carga do bundle (o que a API e o app precisam
+# antes de responder). O import do próprio Streamlit (~400 ms) é medido à parte e não entra na meta
+READY_TARGET_S = 1.0
+
+# Módulos do caminho de serving (o que a API e o app importam antes de carregar o modelo)
+SERVING_IMPORTS = ['recommender', 'filters', 'model_bundle']
+# Framework do app: importado depois do engine, para não levar na conta dele o numpy/pandas que o engine já trouxe
+FRAMEWORK_IMPORTS = ['streamlit']
+# Não deveriam ser importados quando os modelos já existem
+HEAVY_MODULES = ['sklearn', 'sqlalchemy', 'model_training', 'etl_steam', 'db_setup',
+                 # Matrizes esparsas (tags, TF-IDF) são montadas no primeiro uso
+                 'scipy']
+
+_PROBE = """
+import sys, json, time
+start = time.perf_counter()
+for name in {imports!r}:
+    __import__(name)
+import_s = time.perf_counter() - start
+from recommender import RecommendationEngine
+engine = RecommendationEngine.from_models_dir({models_dir!r})
+heavy_loaded = [m for m in {heavy!r} if m in sys.modules]
+start = time.perf_counter()
+for name in {framework!r}:
+    __import__(name)
+print(json.dumps({{
+    'import_s': import_s,
+    'framework_s': time.perf_counter() - start,
+    'load_times': engine.load_times,
+    'heavy_loaded': heavy_loaded,
+}}))
+"""
+
+
+def parse_importtime(stderr, top=10):
+    """Tempo acumulado (s) dos pacotes de primeiro nível a partir da saída do `python -X importtime`."""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nível 0 = um único espaço antes do nome: o pacote importado diretamente
+        name = name.rstrip()
+        if not name.startswith('  '):
+            name = name.strip()
+            totals[name] = totals.get(name, 0) + int(cumulative) / 1e6
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def startup_report(models_dir=MODELS_DIR, imports=SERVING_IMPORTS, framework=FRAMEWORK_IMPORTS):
+    """
+    Mede, num processo novo (como uma réplica subindo), o tempo de import de cada módulo
+    do caminho de serving, o tempo de carga de cada artefato e, à parte, o import do framework do app.
+    """
+    code = _PROBE.format(imports=list(imports), models_dir=models_dir, heavy=HEAVY_MODULES,
+                         framework=list(framework))
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                                     os.environ.get('PYTHONPATH')]))}
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          capture_output=True, text=True, env=env, check=True)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['modules'] = [(name, seconds) for name, seconds in parse_importtime(proc.stderr) if name not in framework]
+    result['load_s'] = sum(result['load_times'].values())
+    result['ready_s'] = result['import_s'] + result['load_s']
+    return result
+
+
+def print_startup_report(result):
+    print(f"📦 Imports do caminho de serving: {result['import_s'] * 1000:.0f} ms")
+    for name, seconds in result['modules']:
+        print(f"   {name:<30} {seconds * 1000:>8.1f} ms")
+    print(f"💾 Artefatos: {result['load_s'] * 1000:.0f} ms")
+    for name, seconds in result['load_times'].items():
+        print(f"   {name:<30} {seconds * 1000:>8.1f} ms")
+    if result['heavy_loaded']:
+        print(f"⚠️ Módulos de ETL/treino importados no serving: {', '.join(result['heavy_loaded'])}")
+    status = "✅" if result['ready_s'] < READY_TARGET_S else "⚠️"
+    print(f"{status} Engine pronto em {result['ready_s'] * 1000:.0f} ms (meta: < {READY_TARGET_S * 1000:.0f} ms)")
+    print(f"ℹ️  + import do framework do app (streamlit): {result['framework_s'] * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Relatório de tempo de inicialização do app (imports + artefatos)")
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--json', action='store_true', help="Imprime o resultado em JSON.")
+    args = parser.parse_args()
+
+    result = startup_report(args.models_dir)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_startup_report(result)
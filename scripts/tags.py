@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+
+def parse_tags(tag_string) -> set:
+    """Transforma a string de tags ('{Tag Name: 1234, ...}' ou 'a, b') em um set limpo."""
+    if tag_string is None or pd.isna(tag_string) or str(tag_string).strip() == "":
+        return set()
+
+    s = str(tag_string).replace("{", "").replace("}", "")
+    tags = set()
+    for item in s.split(","):
+        tag = item.split(":")[0].strip().lower()
+        if tag and tag != "nan":
+            tags.add(tag)
+    return tags
+
+
+def build_tag_matrix(tag_series):
+    """
+    Vocabulário de tags (ordenado alfabeticamente) + matriz CSR jogos x tags (uint8).
+    Como o vocabulário é ordenado, IDs ordenados = tags em ordem alfabética.
+    O parsing das strings acontece só aqui, no treino.
+    """
+    import scipy.sparse as sp
+    parsed = [parse_tags(t) for t in tag_series]
+    vocab = np.array(sorted(set().union(*parsed)), dtype=str)
+    tag_id = {tag: i for i, tag in enumerate(vocab)}
+
+    indptr = np.zeros(len(parsed) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(tags) for tags in parsed])
+    indices = np.fromiter((tag_id[t] for tags in parsed for t in sorted(tags)), dtype=np.int32, count=indptr[-1])
+    data = np.ones(len(indices), dtype=np.uint8)
+
+    matrix = sp.csr_matrix((data, indices, indptr), shape=(len(parsed), len(vocab)))
+    return vocab, matrix
+
+
+def common_tags(tag_matrix, vocab, a, b, k=5) -> list[str]:
+    """Tags em comum entre os jogos a e b (ordem alfabética), via interseção de IDs."""
+    ids_a = tag_matrix.indices[tag_matrix.indptr[a]:tag_matrix.indptr[a + 1]]
+    ids_b = tag_matrix.indices[tag_matrix.indptr[b]:tag_matrix.indptr[b + 1]]
+    common = np.intersect1d(ids_a, ids_b, assume_unique=True)[:k]
+    return vocab[common].tolist()
+
+
+def tag_jaccard(tag_matrix, rows_a, rows_b) -> np.ndarray:
+    """
+    Jaccard das tags para cada par (rows_a[i], rows_b[i]), vetorizado.
+    Jogo de origem sem tags -> 0, como no cálculo original.
+    """
+    rows_a = np.asarray(rows_a)
+    rows_b = np.asarray(rows_b)
+    sizes = np.diff(tag_matrix.indptr)
+    intersection = np.asarray(tag_matrix[rows_a].multiply(tag_matrix[rows_b]).sum(axis=1)).ravel()
+    union = sizes[rows_a] + sizes[rows_b] - intersection
+
+    jaccard = np.zeros(len(rows_a), dtype=np.float64)
+    valid = (sizes[rows_a] > 0) & (union > 0)
+    jaccard[valid] = intersection[valid] / union[valid]
+    return jaccard
+
+
+def tag_overlap_at_k(tag_matrix, knn_indices, k=5, rows=None) -> np.ndarray:
+    """Tags@k (média do Jaccard com os k primeiros vizinhos) para várias linhas de uma vez."""
+    rows = np.arange(knn_indices.shape[0]) if rows is None else np.asarray(rows)
+    neighbors = np.asarray(knn_indices[rows, 1:1 + k])
+    scores = np.column_stack([tag_jaccard(tag_matrix, rows, neighbors[:, j]) for j in range(neighbors.shape[1])])
+    return scores.mean(axis=1)
@@ -0,0 +1,149 @@
+import re
+import time
+import unicodedata
+import numpy as np
+
+# Nota mínima (Dice de trigramas) para um resultado aproximado entrar na lista
+MIN_FUZZY_SCORE = 0.3
+# Nota mínima para resolver um título digitado errado em um jogo do catálogo
+MIN_RESOLVE_SCORE = 0.5
+
+# Faixas de pontuação: exato > prefixo > aproximado (Dice fica entre 0 e 1)
+EXACT_SCORE = 3.0
+PREFIX_SCORE = 2.0
+
+_NON_ALNUM = re.compile(r'[\W_]+')
+# Símbolos que o NFKD transformaria em letras ('™' -> 'TM')
+_SYMBOLS = str.maketrans('', '', '™®©℠')
+
+
+def normalize_title(title) -> str:
+    """Minúsculas, sem acentos e com pontuação virando espaço: 'Counter-Strike™ 2' -> 'counter strike 2'."""
+    text = unicodedata.normalize('NFKD', str(title).translate(_SYMBOLS))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    return _NON_ALNUM.sub(' ', text).strip()
+
+
+def trigrams(normalized: str) -> set:
+    """Trigramas de caracteres com borda (' el', 'eld', ...), base da busca aproximada."""
+    padded = f" {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """
+    Índice de títulos para o typeahead: prefixo sobre os títulos normalizados
+    ordenados (busca binária) + lista invertida de trigramas para a busca aproximada.
+    Empates são decididos pela popularidade (vl_recommendations).
+    """
+
+    def __init__(self, normalized, popularity, gram_vocab, gram_indptr, gram_rows, gram_counts,
+                 sorted_order=None, tiebreak=None):
+        self.normalized = normalized
+        self.popularity = popularity
+        self.gram_vocab = gram_vocab
+        self.gram_indptr = gram_indptr
+        self.gram_rows = gram_rows
+        self.gram_counts = gram_counts
+        # Ordenação e desempate vêm prontos do arquivo salvo: nada é ordenado na subida do app
+        if sorted_order is None:
+            sorted_order = np.argsort(normalized, kind='stable')
+        if tiebreak is None:
+            # Desempate por popularidade somado à nota: < 1e-6, menor que a diferença entre duas notas Dice
+            popularity_rank = np.argsort(np.argsort(popularity, kind='stable'), kind='stable')
+            tiebreak = popularity_rank / max(len(popularity), 1) * 1e-6
+        self.sorted_order = sorted_order
+        self.sorted_titles = normalized[sorted_order]
+        self.tiebreak = tiebreak
+
+    @classmethod
+    def build(cls, titles, popularity):
+        normalized = [normalize_title(t) for t in titles]
+        grams_per_title = [trigrams(t) for t in normalized]
+
+        gram_vocab = np.array(sorted(set().union(*grams_per_title)), dtype=str)
+        gram_id = {g: i for i, g in enumerate(gram_vocab)}
+        gram_of = np.fromiter((gram_id[g] for grams in grams_per_title for g in grams), dtype=np.int64)
+        row_of = np.repeat(np.arange(len(normalized), dtype=np.int32), [len(grams) for grams in grams_per_title])
+
+        # Lista invertida em formato CSR: trigrama -> linhas que o contêm
+        order = np.argsort(gram_of, kind='stable')
+        gram_rows = row_of[order]
+        gram_indptr = np.concatenate([[0], np.cumsum(np.bincount(gram_of, minlength=len(gram_vocab)))])
+
+        popularity = np.nan_to_num(np.asarray(popularity, dtype=np.float64))
+        gram_counts = np.array([len(grams) for grams in grams_per_title], dtype=np.int32)
+        return cls(np.array(normalized, dtype=str), popularity, gram_vocab, gram_indptr, gram_rows, gram_counts)
+
+    def to_arrays(self) -> dict:
+        return {'normalized': self.normalized, 'popularity': self.popularity, 'gram_vocab': self.gram_vocab,
+                'gram_indptr': self.gram_indptr, 'gram_rows': self.gram_rows, 'gram_counts': self.gram_counts,
+                'sorted_order': self.sorted_order, 'tiebreak': self.tiebreak}
+
+    def _prefix_range(self, query):
+        lo = np.searchsorted(self.sorted_titles, query, side='left')
+        hi = np.searchsorted(self.sorted_titles, query + '\U0010ffff', side='left')
+        return lo, hi
+
+    def _fuzzy(self, query):
+        """Linhas com trigramas em comum com a consulta e a nota Dice de cada uma."""
+        grams = np.array(sorted(trigrams(query)), dtype=str)
+        if len(self.gram_vocab) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        # Só os trigramas que existem no vocabulário
+        pos = np.minimum(np.searchsorted(self.gram_vocab, grams), len(self.gram_vocab) - 1)
+        pos = pos[self.gram_vocab[pos] == grams]
+        if len(pos) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        # Contagem de trigramas em comum por linha (bincount: sem ordenação)
+        postings = np.concatenate([self.gram_rows[self.gram_indptr[p]:self.gram_indptr[p + 1]] for p in pos])
+        common = np.bincount(postings, minlength=len(self.normalized))
+        rows = np.flatnonzero(common)
+        dice = 2 * common[rows] / (len(grams) + self.gram_counts[rows])
+        return rows, dice
+
+    def search(self, query, limit=10):
+        """
+        Até `limit` linhas do catálogo que combinam com o texto digitado, com a nota de cada uma:
+        título exato (3), prefixo (2) ou aproximado por trigramas (Dice, 0 a 1).
+        """
+        normalized = normalize_title(query)
+        if not normalized:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        lo, hi = self._prefix_range(normalized)
+        prefix_rows = self.sorted_order[lo:hi]
+        prefix_scores = np.where(self.sorted_titles[lo:hi] == normalized, EXACT_SCORE, PREFIX_SCORE)
+
+        fuzzy_rows, fuzzy_scores = self._fuzzy(normalized)
+        in_prefix = np.zeros(len(self.normalized), dtype=bool)
+        in_prefix[prefix_rows] = True
+        keep = (fuzzy_scores >= MIN_FUZZY_SCORE) & ~in_prefix[fuzzy_rows]
+        rows = np.concatenate([prefix_rows, fuzzy_rows[keep]])
+        scores = np.concatenate([prefix_scores, fuzzy_scores[keep]])
+
+        # Maior nota primeiro; empate -> mais popular. Seleção parcial: só os `limit` melhores são ordenados
+        key = scores + self.tiebreak[rows]
+        if len(key) > limit:
+            top = np.argpartition(-key, limit - 1)[:limit]
+        else:
+            top = np.arange(len(key))
+        top = top[np.argsort(-key[top], kind='stable')]
+        return rows[top], scores[top]
+
+    def resolve(self, query, min_score=MIN_RESOLVE_SCORE):
+        """Melhor linha para um título (mesmo com erro de digitação) ou None."""
+        rows, scores = self.search(query, limit=1)
+        if len(rows) == 0 or scores[0] < min_score:
+            return None
+        return int(rows[0])
+
+
+def benchmark_title_search(index, queries, repeat=3):
+    """Latência média (ms) do typeahead para uma lista de consultas."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            index.search(query)
+    return (time.perf_counter() - start) / (repeat * len(queries)) * 1000
@@ -0,0 +1,51 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from recommender import RecommendationEngine
+from filters import OS_ALL
+
+
+def small_engine():
+    """Catálogo de 5 jogos com vizinhos fixos; notas 10, 90, 20, 80, 95 (só o filtro de nota importa)."""
+    titles = ['A', 'B', 'C', 'D', 'E']
+    knn_indices = np.array([
+        [0, 1, 2, 3, 4],
+        [1, 2, 0, 3, 4],
+        [2, 3, 4, 0, 1],
+        [3, 4, 0, 1, 2],
+        [4, 0, 1, 2, 3],
+    ], dtype=np.int32)
+    knn_similarities = np.array([[1.0, 0.9, 0.8, 0.7, 0.6]] * 5, dtype=np.float32)
+    filter_columns = {
+        'age': np.zeros(5, dtype=np.uint8),
+        'positive_ratio': np.array([10, 90, 20, 80, 95], dtype=np.float32),
+        'os': np.full(5, OS_ALL, dtype=np.uint8),
+    }
+    df_games = pd.DataFrame({'cd_game': np.arange(100, 105), 'nm_game': titles})
+    indices_map = pd.Series(np.arange(5), index=titles)
+    return RecommendationEngine(knn_indices, knn_similarities, filter_columns, None, df_games, indices_map)
+
+
+def test_recommend_many_keeps_filters_paired_with_known_titles():
+    engine = small_engine()
+    strict = {'min_score': 85}
+    result = engine.recommend_many(['nope', 'A', 'C'], filters=[{'min_score': 100}, None, strict], k=2, explain=False)
+
+    # 'nope' sai junto com o seu filtro: A fica sem filtro e C recebe o strict
+    expected = engine.recommend_many(['A', 'C'], filters=[None, strict], k=2, explain=False)
+    pd.testing.assert_frame_equal(result, expected)
+    assert result.loc[result['seed_nm_game'] == 'A', 'nm_game'].tolist() == ['B', 'C']
+    assert result.loc[result['seed_nm_game'] == 'C', 'nm_game'].tolist() == ['E', 'B']
+
+
+def test_filter_count_must_match():
+    engine = small_engine()
+    with pytest.raises(ValueError):
+        engine.recommend_indices([0, 1], filters=[None])
+    with pytest.raises(ValueError):
+        engine.recommend_many(['A', 'B'], filters=[None, None, None])